@@ -0,0 +1,350 @@
+"""Cross-engine benchmark suite.
+
+Runs the naive matcher, py_fdr, the fdr, fdr-minified, ac and dfc binaries and
+fdr-minified's in-process binding (fdr_native) on the same workloads, with
+warmup runs and repetitions, and writes one tab-separated table: MB/s, matches,
+compile time and peak RSS per engine and workload.
+
+Every engine runs as a subprocess through its usual CLI (--patterns,
+--rulesets, --out). Scan time and matches are read from the results.txt each
+engine writes (the sum of its per-ruleset time_ms), so all engines are timed
+the same way: without process start, pattern loading and compilation. Compile
+time is parsed from the engine's "Compilation time:" line. Peak RSS is the
+child's maxrss (not available on Windows).
+
+Usage:
+    python scripts/benchmark.py --out output/benchmark
+    python scripts/benchmark.py --engines py_fdr fdr --workloads lowercase abcd --repeats 5
+"""
+
+import os
+import random
+import re
+import statistics
+import string
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from fdr_native import find_library
+from run import find_executable
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ENGINES = ["naive", "py_fdr", "fdr", "fdr-minified", "fdr_native", "ac", "dfc"]
+BINARY_ENGINES = ["fdr", "fdr-minified", "ac", "dfc"]
+COLUMNS = ["workload", "engine", "patterns", "rulesets", "bytes", "runs", "compile_ms", "scan_ms",
+           "mb_s", "mb_s_min", "mb_s_max", "matches", "peak_rss_mb", "status"]
+COMPILE_TIME = re.compile(r"Compilation time:\s+([\d.]+)\s*ms")
+MATCH = re.compile(r"\((\d+),(\d+)\)")
+
+# Snort-derived inputs: patterns extracted from the rules (`config.py --extract-patterns`)
+# and the rulesets text used by the other runners
+SNORT_PATTERNS = REPO_ROOT / "patterns.txt"
+SNORT_RULESETS = REPO_ROOT / "dataset" / "rulesets.txt"
+HTTP_TEMPLATES = [
+    "GET /{path} HTTP/1.1\\r\\nHost: {host}\\r\\nUser-Agent: {agent}\\r\\nAccept: */*\\r\\n",
+    "POST /{path}?id={token} HTTP/1.1\\r\\nHost: {host}\\r\\nContent-Type: application/x-www-form-urlencoded\\r\\n",
+    "HTTP/1.1 200 OK\\r\\nServer: {agent}\\r\\nContent-Length: {token}\\r\\nSet-Cookie: sid={token}\\r\\n",
+]
+
+
+def random_text(rng: random.Random, length: int, alphabet: str) -> str:
+    return "".join(rng.choices(alphabet, k=length))
+
+
+def write_lines(path: Path, lines: List[Union[str, bytes]]):
+    """Write one line per item; a str is encoded to UTF-8, bytes are written as they are."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as fh:
+        for line in lines:
+            fh.write((line.encode("utf-8") if isinstance(line, str) else line) + b"\n")
+
+
+def generate_workloads(work_dir: Path, names: List[str], scale: float = 1.0, seed: int = 1234) -> Dict[str, dict]:
+    """Write the patterns and rulesets files of the standard workloads.
+
+    Args:
+        work_dir: Directory the workload files are written to (one folder per workload).
+        names: Workloads to prepare (keys of WORKLOADS).
+        scale: Multiplier for the number of rulesets.
+        seed: Seed of the generators, so every run benchmarks the same bytes.
+
+    Returns:
+        Dict of workload name to {"patterns": path, "rulesets": path} or {"skipped": reason}.
+    """
+    workloads = {}
+    for name in names:
+        rng = random.Random(f"{seed}:{name}")
+        workloads[name] = WORKLOADS[name](rng, work_dir / name, scale)
+    return workloads
+
+
+def lowercase_workload(rng: random.Random, out: Path, scale: float) -> dict:
+    """1000 lowercase patterns of 2 to 8 bytes on lowercase text with spaces."""
+    patterns = sorted({random_text(rng, rng.randint(2, 8), string.ascii_lowercase) for _ in range(1000)})
+    rulesets = [random_text(rng, 1000, string.ascii_lowercase + " ") for _ in range(int(2000 * scale))]
+    return write_workload(out, patterns, rulesets)
+
+
+def abcd_workload(rng: random.Random, out: Path, scale: float) -> dict:
+    """1000 8-byte patterns over a-d on a-d text (the py_fdr experiments' setting): many candidates."""
+    patterns = sorted({random_text(rng, 8, "abcd") for _ in range(1000)})
+    rulesets = [random_text(rng, 1000, "abcd") for _ in range(int(1000 * scale))]
+    return write_workload(out, patterns, rulesets)
+
+
+def long_literals_workload(rng: random.Random, out: Path, scale: float) -> dict:
+    """500 patterns of 9 to 32 bytes, a tenth of them planted in the text."""
+    alphabet = string.ascii_letters + string.digits
+    patterns = sorted({random_text(rng, rng.randint(9, 32), alphabet) for _ in range(500)})
+    rulesets = []
+    for _ in range(int(2000 * scale)):
+        line = random_text(rng, 1000, alphabet)
+        pos = rng.randrange(len(line))
+        rulesets.append(line[:pos] + rng.choice(patterns[:50]) + line[pos:])
+    return write_workload(out, patterns, rulesets)
+
+
+def flood_workload(rng: random.Random, out: Path, scale: float) -> dict:
+    """Lowercase patterns on lines dominated by long runs: repeated units and x86 NOP sleds (0x90 bytes)."""
+    patterns = sorted({random_text(rng, rng.randint(2, 8), string.ascii_lowercase) for _ in range(1000)} | {"aaaa", "abab"})
+    rulesets = []
+    for _ in range(int(2000 * scale)):
+        unit = rng.choice([b"a", b"ab", b"\x90", b"abcd"])
+        rulesets.append(random_text(rng, 100, string.ascii_lowercase).encode() + unit * (800 // len(unit))
+                        + random_text(rng, 100, string.ascii_lowercase).encode())
+    return write_workload(out, patterns, rulesets)
+
+
+def snort_http_workload(rng: random.Random, out: Path, scale: float) -> dict:
+    """Snort content patterns on synthetic HTTP traffic with some of the patterns planted in it."""
+    if not SNORT_PATTERNS.exists():
+        return {"skipped": f"no {SNORT_PATTERNS.name} (run config.py --rulesets --extract-patterns)"}
+    patterns = [line.rstrip("\r\n") for line in SNORT_PATTERNS.open(encoding="utf-8", errors="replace")]
+    patterns = [pat for pat in patterns if pat and not pat.startswith("#")]
+    tokens = string.ascii_lowercase + string.digits
+    # Patterns with Snort hex blocks decode to bytes (often CR/LF) that cannot be planted in a line
+    plantable = [pat for pat in patterns if "|" not in pat]
+    rulesets = []
+    for _ in range(int(2000 * scale)):
+        line = rng.choice(HTTP_TEMPLATES).format(
+            path="/".join(random_text(rng, rng.randint(3, 10), tokens) for _ in range(rng.randint(1, 4))),
+            host=random_text(rng, 8, string.ascii_lowercase) + ".com",
+            agent=rng.choice(["Mozilla/5.0", "curl/8.0", "python-requests/2.31"]),
+            token=random_text(rng, 16, tokens))
+        if plantable and rng.random() < 0.3:
+            pos = rng.randrange(len(line))
+            line = line[:pos] + rng.choice(plantable) + line[pos:]
+        rulesets.append(line)
+    return write_workload(out, patterns, rulesets)
+
+
+def snort_rulesets_workload(rng: random.Random, out: Path, scale: float) -> dict:
+    """Snort content patterns on the repository's rulesets text."""
+    if not SNORT_PATTERNS.exists() or not SNORT_RULESETS.exists():
+        return {"skipped": f"needs {SNORT_PATTERNS.name} and dataset/{SNORT_RULESETS.name}"}
+    return {"patterns": str(SNORT_PATTERNS), "rulesets": str(SNORT_RULESETS)}
+
+
+def write_workload(out: Path, patterns: List[str], rulesets: List[Union[str, bytes]]) -> dict:
+    write_lines(out / "patterns.txt", patterns)
+    write_lines(out / "rulesets.txt", rulesets)
+    return {"patterns": str(out / "patterns.txt"), "rulesets": str(out / "rulesets.txt")}
+
+
+WORKLOADS = {
+    "lowercase": lowercase_workload,
+    "abcd": abcd_workload,
+    "long_literals": long_literals_workload,
+    "flood": flood_workload,
+    "snort_http": snort_http_workload,
+    "snort_rulesets": snort_rulesets_workload,
+}
+
+
+def engine_command(engine: str, patterns_file: str, rulesets_file: str, out_dir: str) -> Optional[List[str]]:
+    """The command line that runs `engine`, or None if its binary is not built."""
+    if engine == "naive":
+        code = "import sys; from naive import naive_match; naive_match(sys.argv[1], sys.argv[2], sys.argv[3])"
+        return [sys.executable, "-c", code, rulesets_file, patterns_file, out_dir]
+    if engine == "py_fdr":
+        # The batched NumPy kernel, compiled from scratch every run
+        return [sys.executable, "-m", "py_fdr.main", "--patterns", patterns_file, "--rulesets", rulesets_file,
+                "--out", out_dir, "--batch_size", "64", "--no_cache"]
+    if engine == "fdr_native":
+        # The fdr-minified engine in process through its shared library
+        if not find_library().exists():
+            return None
+        return [sys.executable, "fdr_native.py", "--patterns", patterns_file, "--rulesets", rulesets_file, "--out", out_dir]
+    exe_path = find_executable(engine)
+    if not exe_path.exists():
+        return None
+    return [str(exe_path), "--patterns", patterns_file, "--rulesets", rulesets_file, "--out", out_dir]
+
+
+def engine_cwd(engine: str) -> Path:
+    if engine == "naive":
+        return REPO_ROOT / "src" / "naive"
+    if engine == "py_fdr":
+        return REPO_ROOT / "src"
+    if engine == "fdr_native":
+        return REPO_ROOT / "scripts"
+    return REPO_ROOT
+
+
+def run_once(cmd: List[str], cwd: Path, out_dir: Path) -> dict:
+    """Run one engine process and read its results.
+
+    Returns:
+        Dict with compile_ms, scan_ms, matches, rulesets, peak_rss_mb (None if unknown)
+        and status ("ok" or an error).
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # The Python engines import the modules shared by the matchers (src/common) from src
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT / "src"), env.get("PYTHONPATH")]))
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                            errors="replace")
+    output = proc.stdout.read()
+    peak_rss_mb = None
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_rss_mb = usage.ru_maxrss / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+    else:
+        proc.wait()
+    if proc.returncode != 0:
+        last = output.strip().splitlines()[-1:] or [""]
+        return {"status": f"exit {proc.returncode}: {last[0][:80]}"}
+
+    compile_ms = COMPILE_TIME.search(output)
+    scan_ms = 0.0
+    matches = 0
+    rulesets = 0
+    with (out_dir / "results.txt").open(encoding="utf-8") as fh:
+        next(fh, None)
+        for line in fh:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 3:
+                continue
+            rulesets += 1
+            matches += len(MATCH.findall(fields[1]))
+            scan_ms += float(fields[2])
+    return {
+        "compile_ms": float(compile_ms.group(1)) if compile_ms else 0.0,
+        "scan_ms": scan_ms,
+        "matches": matches,
+        "rulesets": rulesets,
+        "peak_rss_mb": peak_rss_mb,
+        "status": "ok",
+    }
+
+
+def ruleset_bytes(rulesets_file: str) -> int:
+    """Bytes the matchers scan: every line without its terminator."""
+    with open(rulesets_file, "rb") as fh:
+        return sum(len(line.rstrip(b"\r\n")) for line in fh)
+
+
+def count_patterns(patterns_file: str) -> int:
+    with open(patterns_file, "rb") as fh:
+        return sum(1 for line in fh if line.strip() and not line.startswith(b"#"))
+
+
+def benchmark(engines: List[str], workloads: Dict[str, dict], out_dir: Path, warmups: int = 1, repeats: int = 3) -> List[dict]:
+    """Run every engine on every workload: `warmups` discarded runs, then `repeats` timed ones.
+
+    The table reports the median run (by scan time) and the MB/s range over the repeats.
+    Engines must agree on the number of matches; a disagreement is flagged in the status.
+    """
+    rows = []
+    for name, workload in workloads.items():
+        if "skipped" in workload:
+            rows.extend({"workload": name, "engine": engine, "status": "skipped: " + workload["skipped"]} for engine in engines)
+            continue
+        total_bytes = ruleset_bytes(workload["rulesets"])
+        n_patterns = count_patterns(workload["patterns"])
+        reference = None
+        for engine in engines:
+            row = {"workload": name, "engine": engine, "patterns": n_patterns, "bytes": total_bytes}
+            run_dir = out_dir / "runs" / name / engine
+            cmd = engine_command(engine, workload["patterns"], workload["rulesets"], str(run_dir))
+            if cmd is None:
+                missing = find_library() if engine == "fdr_native" else find_executable(engine)
+                row["status"] = f"skipped: {missing} not built"
+                rows.append(row)
+                continue
+            print(f"  {name:<15} {engine:<13}", end="", flush=True)
+            runs = []
+            for i in range(warmups + repeats):
+                result = run_once(cmd, engine_cwd(engine), run_dir)
+                if result["status"] != "ok":
+                    runs = [result]
+                    break
+                if i >= warmups:
+                    runs.append(result)
+
+            if runs[0]["status"] != "ok":
+                row["status"] = runs[0]["status"]
+            else:
+                runs.sort(key=lambda r: r["scan_ms"])
+                median = runs[len(runs) // 2]
+                rates = [total_bytes / 1024.0 / 1024.0 / (r["scan_ms"] / 1000.0) if r["scan_ms"] else 0.0 for r in runs]
+                rss = [r["peak_rss_mb"] for r in runs if r["peak_rss_mb"] is not None]
+                row.update({
+                    "rulesets": median["rulesets"],
+                    "runs": len(runs),
+                    "compile_ms": statistics.median(r["compile_ms"] for r in runs),
+                    "scan_ms": median["scan_ms"],
+                    "mb_s": rates[len(runs) // 2],
+                    "mb_s_min": min(rates),
+                    "mb_s_max": max(rates),
+                    "matches": median["matches"],
+                    "peak_rss_mb": max(rss) if rss else None,
+                    "status": "ok",
+                })
+                if reference is None:
+                    reference = (engine, median["matches"])
+                elif median["matches"] != reference[1]:
+                    row["status"] = f"ok, matches differ from {reference[0]} ({reference[1]})"
+            print(f" {row.get('mb_s', 0.0):10.2f} MB/s  {row['status']}")
+            rows.append(row)
+    return rows
+
+
+def write_table(rows: List[dict], path: Path):
+    """Write the results as tab-separated values with a header line."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as fh:
+        fh.write("\t".join(COLUMNS) + "\n")
+        for row in rows:
+            values = []
+            for column in COLUMNS:
+                value = row.get(column)
+                values.append("" if value is None else f"{value:.3f}" if isinstance(value, float) else str(value))
+            fh.write("\t".join(values) + "\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark all string matchers on the same workloads")
+    parser.add_argument("--engines", nargs="+", default=ENGINES, choices=ENGINES, help="Engines to run")
+    parser.add_argument("--workloads", nargs="+", default=list(WORKLOADS), choices=list(WORKLOADS), help="Workloads to run")
+    parser.add_argument("--out", default=str(REPO_ROOT / "output" / "benchmark"), help="Output directory")
+    parser.add_argument("--warmups", type=int, default=1, help="Discarded runs per engine and workload")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per engine and workload")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the number of generated rulesets")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed of the workload generators")
+    args = parser.parse_args()
+
+    out_dir = Path(args.out).resolve()
+    print("Generating workloads in", out_dir / "workloads")
+    workloads = generate_workloads(out_dir / "workloads", args.workloads, scale=args.scale, seed=args.seed)
+    print(f"Running {len(args.engines)} engines on {len(workloads)} workloads ({args.warmups} warmup, {args.repeats} timed runs each)")
+    rows = benchmark(args.engines, workloads, out_dir, warmups=args.warmups, repeats=args.repeats)
+    table = out_dir / "benchmark.tsv"
+    write_table(rows, table)
+    print("Wrote", table)
@@ -5,6 +5,8 @@ import tarfile
 import re
 from pathlib import Path
 
+from common.snort_content import decode_content
+
 
 # Snort Rulesets URLs
 ET_OPEN_URL = "https://rules.emergingthreats.net/open/snort-2.9.0/emerging.rules.tar.gz"
@@ -67,6 +69,11 @@ def download_raw(base_dir="../../dataset"):
     return True
 
 
+def content_bytes(content: str) -> bytes:
+    """Bytes matched by a Snort content string, with its `|..|` hex blocks decoded."""
+    return decode_content(content.encode("utf-8"))
+
+
 def extract(base_dir="../../dataset", output_file="patterns.txt", max_patterns=None):
     """Extract string patterns from Snort rules for testing.
     
@@ -107,10 +114,12 @@ def extract(base_dir="../../dataset", output_file="patterns.txt", max_patterns=N
                     # Find all content matches in the line
                     matches = content_pattern.findall(line)
                     for match in matches:
-                        # Skip patterns with hex content (|XX|) for simplicity
-                        if '|' not in match and len(match) > 2:
-                            # Trim leading/trailing whitespace from extracted patterns
-                            patterns.add(match.strip())
+                        # Trim leading/trailing whitespace from extracted patterns.
+                        # Hex content (|0d 0a|) is kept in Snort syntax, which keeps every pattern on
+                        # one line; each matcher's loader decodes it (src/common/snort_content.*).
+                        pattern = match.strip()
+                        if len(content_bytes(pattern)) > 2:
+                            patterns.add(pattern)
         except Exception as e:
             print(f"Warning: Could not read {rules_file}: {e}")
     
@@ -126,14 +135,14 @@ def extract(base_dir="../../dataset", output_file="patterns.txt", max_patterns=N
     print(f"\nExtracted {len(pattern_list)} unique patterns")
     print(f"Patterns saved to: {output_path}")
     
-    # Print some statistics
-    lengths = [len(p) for p in pattern_list]
+    # Print some statistics (lengths in bytes)
+    lengths = [len(content_bytes(p)) for p in pattern_list]
     if lengths:
         print(f"Pattern length: min={min(lengths)}, max={max(lengths)}, avg={sum(lengths)//len(lengths)}")
     
     # Filter and save short patterns (<=8 bytes for FDR)
     # Ensure short patterns are trimmed as well
-    short_patterns = [p for p in sorted(patterns) if len(p.strip()) <= 8]
+    short_patterns = [p for p in sorted(patterns) if len(content_bytes(p)) <= 8]
     short_output_path = base_path / "short_patterns.txt"
     with open(short_output_path, 'w', encoding='utf-8') as f:
         for pattern in short_patterns:
@@ -142,7 +151,7 @@ def extract(base_dir="../../dataset", output_file="patterns.txt", max_patterns=N
     print(f"\nFiltered {len(short_patterns)} patterns (<=8 bytes)")
     print(f"Short patterns saved to: {short_output_path}")
     if short_patterns:
-        short_lengths = [len(p) for p in short_patterns]
+        short_lengths = [len(content_bytes(p)) for p in short_patterns]
         print(f"Short pattern length: min={min(short_lengths)}, max={max(short_lengths)}, avg={sum(short_lengths)//len(short_lengths)}")
     
     # Combine all rulesets into a single file (no comments)
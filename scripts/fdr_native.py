@@ -0,0 +1,272 @@
+"""In-process binding to the native fdr-minified engine.
+
+Loads the fdr_native shared library (src/fdr-minified, CMake target
+`fdr_native`) through ctypes. A pattern set is compiled once, and every
+`scan` passes the caller's buffer to the engine without copying it and without
+starting a process or going through a text results.txt. Matches come back in
+py_fdr's form: (position, pattern_index) pairs, sorted by position then
+pattern index.
+
+Build the library with:
+    cmake -B build -S . && cmake --build build --target fdr_native    (in src/fdr-minified)
+
+Usage:
+    from fdr_native import NativeFDR
+
+    with NativeFDR([b"GET", b"HTTP/1.1"]) as matcher:
+        matcher.scan(b"GET / HTTP/1.1")  # [(0, 0), (6, 1)]
+
+    PYTHONPATH=src python scripts/fdr_native.py --patterns patterns.txt --rulesets rulesets.txt --out output/fdr_native
+"""
+
+import ctypes
+import sys
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+LIBRARY_DIR = REPO_ROOT / "src" / "fdr-minified" / "build"
+MAX_PATTERN_BYTES = 8
+ERROR_BYTES = 256
+
+Buffer = Union[bytes, bytearray, memoryview, str]
+
+_library: Optional[ctypes.CDLL] = None
+
+
+def library_name() -> str:
+    if sys.platform == "win32":
+        return "fdr_native.dll"
+    if sys.platform == "darwin":
+        return "libfdr_native.dylib"
+    return "libfdr_native.so"
+
+
+def find_library() -> Path:
+    """Path of the fdr_native shared library in the fdr-minified build directory.
+
+    Returns the last candidate when none exists.
+    """
+    name = library_name()
+    if sys.platform == "win32":
+        candidates = [LIBRARY_DIR / "Debug" / name, LIBRARY_DIR / "Release" / name, LIBRARY_DIR / name]
+    else:
+        candidates = [LIBRARY_DIR / name]
+    for lib_path in candidates:
+        if lib_path.exists():
+            return lib_path
+    return candidates[-1]
+
+
+def load_library(path: Optional[Union[str, Path]] = None) -> ctypes.CDLL:
+    """Load the shared library (once) and declare the signatures of fdr_native.h.
+
+    Args:
+        path: Library to load; defaults to `find_library()`.
+
+    Raises:
+        OSError: If the library is not built or cannot be loaded.
+    """
+    global _library
+    if _library is not None and path is None:
+        return _library
+
+    lib_path = Path(path) if path is not None else find_library()
+    if not lib_path.exists():
+        raise OSError(f"fdr_native library not found: {lib_path} (build the fdr_native target of src/fdr-minified)")
+    lib = ctypes.CDLL(str(lib_path))
+
+    lib.fdr_native_compile.argtypes = [ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_size_t),
+                                       ctypes.c_size_t, ctypes.c_char_p, ctypes.c_size_t]
+    lib.fdr_native_compile.restype = ctypes.c_void_p
+    lib.fdr_native_scan.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_size_t)]
+    lib.fdr_native_scan.restype = ctypes.c_int
+    lib.fdr_native_matches.argtypes = [ctypes.c_void_p]
+    lib.fdr_native_matches.restype = ctypes.POINTER(ctypes.c_uint32)
+    lib.fdr_native_pattern_count.argtypes = [ctypes.c_void_p]
+    lib.fdr_native_pattern_count.restype = ctypes.c_size_t
+    lib.fdr_native_free.argtypes = [ctypes.c_void_p]
+    lib.fdr_native_free.restype = None
+
+    if path is None:
+        _library = lib
+    return lib
+
+
+def buffer_pointer(data: Buffer):
+    """A pointer to `data`'s bytes for a ctypes call, its length in bytes, and the
+    object that must stay referenced until the call returns.
+
+    `bytes` are passed as they are, writable buffers (bytearray, mmap, writable
+    memoryview) through `from_buffer`, and other read-only buffers (memoryview
+    slices, ACCESS_READ mmaps) through a NumPy view of their memory, so none of
+    them is copied. A `str` is encoded to UTF-8.
+
+    Raises:
+        TypeError: If `data` is not a C-contiguous buffer.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if isinstance(data, bytes):
+        return data, len(data), data
+    view = memoryview(data)
+    if not view.c_contiguous:
+        raise TypeError("FDR scans need a C-contiguous buffer")
+    view = view.cast("B")
+    if not len(view):
+        return None, 0, view
+    if isinstance(view.obj, bytes) and len(view) == len(view.obj):
+        return view.obj, len(view), view.obj
+    if not view.readonly:
+        array = (ctypes.c_char * len(view)).from_buffer(view)
+        return array, len(view), array
+    # ctypes only wraps writable buffers; the array keeps the view (and its exporter) alive
+    array = np.frombuffer(view, dtype=np.uint8)
+    return ctypes.c_void_p(array.ctypes.data), len(view), array
+
+
+class NativeFDR:
+    """A pattern set compiled by the native FDR engine.
+
+    The engine is built once in `__init__`; `scan` can then be called any number
+    of times. ctypes releases the GIL during the native calls, but one matcher must
+    not be scanned from two threads at once (its scratch and match buffers are
+    shared); use one matcher per thread.
+    """
+
+    def __init__(self, patterns: Sequence[Union[bytes, str]], library: Optional[ctypes.CDLL] = None):
+        """Compile `patterns`; pattern i is reported as pattern_index i.
+
+        Args:
+            patterns: Patterns of 1 to 8 bytes (bytes, or str encoded to UTF-8).
+            library: Loaded fdr_native library; defaults to `load_library()`.
+
+        Raises:
+            ValueError: If a pattern is empty or longer than 8 bytes, or the engine
+                cannot be compiled.
+        """
+        self._handle = None
+        self._lib = library or load_library()
+        encoded = [p.encode("utf-8") if isinstance(p, str) else bytes(p) for p in patterns]
+        for i, pattern in enumerate(encoded):
+            if not 0 < len(pattern) <= MAX_PATTERN_BYTES:
+                raise ValueError(f"Pattern {i} has {len(pattern)} bytes; FDR patterns must be 1 to {MAX_PATTERN_BYTES} bytes")
+
+        count = len(encoded)
+        pattern_ptrs = (ctypes.c_char_p * count)(*encoded)
+        lengths = (ctypes.c_size_t * count)(*(len(p) for p in encoded))
+        error = ctypes.create_string_buffer(ERROR_BYTES)
+        handle = self._lib.fdr_native_compile(pattern_ptrs, lengths, count, error, ERROR_BYTES)
+        if not handle:
+            raise ValueError(error.value.decode("utf-8", errors="replace") or "Failed to compile the FDR engine")
+        self._handle = handle
+
+    def scan(self, buffer: Buffer) -> List[Tuple[int, int]]:
+        """Scan one buffer in place.
+
+        Returns:
+            List of (position, pattern_index), position being the byte offset where
+            the match starts, sorted by position then pattern index.
+        """
+        if self._handle is None:
+            raise ValueError("Scan of a closed matcher")
+        # `owner` keeps the scanned memory referenced until the native call returns
+        ptr, length, owner = buffer_pointer(buffer)
+        count = ctypes.c_size_t(0)
+        if self._lib.fdr_native_scan(self._handle, ptr, length, ctypes.byref(count)) != 0:
+            raise RuntimeError("FDR engine reported an error")
+        if not count.value:
+            return []
+        flat = self._lib.fdr_native_matches(self._handle)[:2 * count.value]
+        return list(zip(flat[0::2], flat[1::2]))
+
+    def __len__(self) -> int:
+        return self._lib.fdr_native_pattern_count(self._handle) if self._handle is not None else 0
+
+    def close(self):
+        """Free the native engine; the matcher cannot scan afterwards."""
+        if self._handle is not None:
+            self._lib.fdr_native_free(self._handle)
+            self._handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+def run(patterns_file: str, rulesets_file: str, output_dir: str) -> int:
+    """The fdr-minified executable's run, in process: the same filtering, output
+    lines and results.txt (one ruleset per line of `rulesets_file`).
+
+    Returns:
+        Number of matches.
+    """
+    import time
+
+    from common.snort_content import decode_content
+
+    with open(patterns_file, "rb") as fh:
+        patterns = [line.rstrip(b"\r\n") for line in fh]
+    patterns = [decode_content(p) for p in patterns if p and not p.startswith(b"#")]
+    valid = [p for p in patterns if len(p) <= MAX_PATTERN_BYTES]
+    print(f"Loaded {len(patterns)} patterns")
+    if len(valid) < len(patterns):
+        print(f"Filtered out {len(patterns) - len(valid)} patterns exceeding {MAX_PATTERN_BYTES}-byte limit")
+    print(f"Using {len(valid)} valid patterns")
+
+    start = time.perf_counter()
+    matcher = NativeFDR(valid)
+    compile_ms = (time.perf_counter() - start) * 1000.0
+
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    total_matches = 0
+    total_bytes = 0
+    scan_ms = 0.0
+    with open(rulesets_file, "rb") as fh, (out_dir / "results.txt").open("w", encoding="utf-8") as out:
+        out.write("ruleset_index\tmatches\ttime_ms\n")
+        index = 0
+        for line in fh:
+            line = line.rstrip(b"\r\n")
+            if not line or line.startswith(b"#"):
+                continue
+            start = time.perf_counter()
+            matches = matcher.scan(line)
+            time_ms = (time.perf_counter() - start) * 1000.0
+            scan_ms += time_ms
+            total_matches += len(matches)
+            total_bytes += len(line)
+            out.write(f"{index}\t[{','.join(f'({pos},{idx})' for pos, idx in matches)}]\t{time_ms:.6f}\n")
+            index += 1
+    matcher.close()
+
+    print(f"  Total matches found:  {total_matches}")
+    print(f"  Bytes scanned:        {total_bytes}")
+    print(f"  Compilation time:     {compile_ms:.3f} ms")
+    print(f"  Scan time:            {scan_ms:.3f} ms")
+    if scan_ms > 0:
+        print(f"  Throughput:           {total_bytes / 1024.0 / 1024.0 / (scan_ms / 1000.0):.6f} MB/s")
+    return total_matches
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the native FDR engine in process")
+    parser.add_argument("--patterns", required=True, help="Patterns file")
+    parser.add_argument("--rulesets", required=True, help="Rulesets file")
+    parser.add_argument("--out", required=True, help="Output directory for results")
+    args = parser.parse_args()
+
+    try:
+        run(args.patterns, args.rulesets, args.out)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
@@ -1,9 +1,43 @@
 """Run matchers."""
 
+import struct
 import sys
 import subprocess
+import tempfile
 from pathlib import Path
-from typing import Literal, Optional
+from typing import List, Literal, Optional, Tuple, Union
+
+# Server protocol of the matchers' --server mode (see src/common/matcher_server.h): u32
+# length-prefixed messages with little-endian fields
+MESSAGE_LENGTH = struct.Struct("<I")
+READY = struct.Struct("<Id")            # pattern count, compile time in ms
+RESPONSE_HEADER = struct.Struct("<Id")  # match count, scan time in ms
+
+
+def find_executable(matcher_name: str) -> Path:
+    """Path of a matcher's executable under src/<matcher_name>.
+
+    Prefers an executable placed directly inside the matcher folder (e.g.
+    src/fdr/fdr or src/fdr/fdr.exe), then the CMake build output, named after
+    the matcher (OUTPUT_NAME), then the `<name>_main` target name (fdr-minified
+    builds its target as `fdr_main`). Returns the last candidate when none
+    exists.
+    """
+    repo_root = Path(__file__).resolve().parent.parent
+    matcher_dir = repo_root / "src" / matcher_name
+    target = "fdr_main" if matcher_name == "fdr-minified" else f"{matcher_name}_main"
+
+    if sys.platform == "win32":
+        candidates = [matcher_dir / "build" / "Debug" / f"{matcher_name}.exe",
+                      matcher_dir / "build" / "Release" / f"{matcher_name}.exe",
+                      matcher_dir / "build" / "Release" / f"{target}.exe"]
+    else:
+        candidates = [matcher_dir / matcher_name, matcher_dir / "build" / matcher_name,
+                      matcher_dir / "build" / target]
+    for exe_path in candidates:
+        if exe_path.exists():
+            return exe_path
+    return candidates[-1]
 
 
 def run_matcher(matcher_name: Literal["fdr", "dfc", "ac"], 
@@ -24,20 +58,8 @@ def run_matcher(matcher_name: Literal["fdr", "dfc", "ac"],
     print(f"{'=' * 70}\n")
     
     repo_root = Path(__file__).resolve().parent.parent
-    matcher_dir = repo_root / "src" / matcher_name
+    exe_path = find_executable(matcher_name)
 
-    # Prefer an executable placed directly inside the matcher folder
-    # e.g. src/fdr/fdr.exe or src/fdr/fdr
-    if sys.platform == "win32":
-        exe_path = matcher_dir / "build" / "Debug" / f"{matcher_name}.exe"
-        if not exe_path.exists():
-            print("Not found", exe_path)
-            exe_path = matcher_dir / "build" / "Release" / f"{matcher_name}.exe"
-    else:
-        exe_path = matcher_dir / matcher_name
-        if not exe_path.exists():
-            exe_path = matcher_dir / "build" / f"{matcher_name}_main"
-    
     if not exe_path.exists():
         print(f"ERROR: Executable not found: {exe_path}")
         return False
@@ -63,3 +85,94 @@ def run_matcher(matcher_name: Literal["fdr", "dfc", "ac"],
         print(result.stderr)
 
     return result.returncode == 0
+
+
+class MatcherServer:
+    """A matcher executable in `--server` mode: patterns are loaded and compiled once,
+    then every `scan` sends one buffer over stdin and reads its matches from stdout.
+
+    Usage:
+        with MatcherServer("fdr", "patterns.txt") as server:
+            for text in texts:
+                matches = server.scan(text)  # [(position, pattern_index), ...]
+    """
+
+    def __init__(self, matcher_name: Literal["fdr", "dfc", "ac"], patterns_file, exe_path: Optional[Path] = None):
+        """Start the server and wait until the patterns are compiled.
+
+        Args:
+            matcher_name: Name of the matcher (fdr, dfc, ac)
+            patterns_file: Path to patterns file
+            exe_path: Executable to run; defaults to `find_executable(matcher_name)`
+
+        Raises:
+            FileNotFoundError: If the executable is not built.
+            RuntimeError: If the server exits before it is ready.
+        """
+        self.proc = None
+        exe_path = Path(exe_path) if exe_path is not None else find_executable(matcher_name)
+        if not exe_path.exists():
+            raise FileNotFoundError(f"Executable not found: {exe_path}")
+
+        # The server logs to stderr; a file keeps a full pipe from blocking it
+        self.log = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen([str(exe_path), "--patterns", str(patterns_file), "--server"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.log)
+        try:
+            self.pattern_count, self.compile_ms = READY.unpack(self._read_message())
+        except RuntimeError:
+            self.close()
+            raise
+        self.last_time_ms = 0.0
+
+    def _read_exact(self, n: int) -> bytes:
+        data = self.proc.stdout.read(n)
+        if len(data) != n:
+            self.proc.wait()
+            self.log.seek(0)
+            log = self.log.read().decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"Matcher server exited with code {self.proc.returncode}: {log[-500:]}")
+        return data
+
+    def _read_message(self) -> bytes:
+        (length,) = MESSAGE_LENGTH.unpack(self._read_exact(MESSAGE_LENGTH.size))
+        return self._read_exact(length)
+
+    def scan(self, data: Union[bytes, bytearray, memoryview, str]) -> List[Tuple[int, int]]:
+        """Scan one buffer (str is encoded to UTF-8).
+
+        Returns:
+            List of (position, pattern_index), sorted by position then pattern index.
+            The server's scan time of the buffer is kept in `last_time_ms`.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        data = memoryview(data).cast("B")
+        self.proc.stdin.write(MESSAGE_LENGTH.pack(len(data)))
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+        response = self._read_message()
+        count, self.last_time_ms = RESPONSE_HEADER.unpack_from(response)
+        values = struct.unpack_from(f"<{2 * count}I", response, RESPONSE_HEADER.size)
+        return list(zip(values[0::2], values[1::2]))
+
+    def close(self):
+        """Close stdin, which ends the server, and wait for it to exit."""
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            # The server has exited already
+            pass
+        self.proc.wait()
+        self.proc.stdout.close()
+        self.log.close()
+        self.proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,98 @@
+"""Tests of the scripts; run from scripts/ with `python -m unittest test`."""
+
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from run import MatcherServer, find_executable
+
+# A stand-in for a matcher executable in --server mode: it speaks the protocol of
+# src/common/matcher_server.h with a naive search, and reports fixed timings
+FAKE_SERVER = """#!{python}
+import struct, sys
+args = sys.argv[1:]
+if "--fail" in args:
+    sys.stderr.write("cannot compile the patterns\\n")
+    sys.exit(3)
+patterns = open(args[args.index("--patterns") + 1], "rb").read().split(b"\\n")
+patterns = [pat for pat in patterns if pat]
+
+def write(payload):
+    sys.stdout.buffer.write(struct.pack("<I", len(payload)) + payload)
+    sys.stdout.buffer.flush()
+
+write(struct.pack("<Id", len(patterns), 1.5))
+while True:
+    header = sys.stdin.buffer.read(4)
+    if len(header) < 4:
+        break
+    text = sys.stdin.buffer.read(struct.unpack("<I", header)[0])
+    matches = sorted((pos, idx) for idx, pat in enumerate(patterns)
+                     for pos in range(len(text) - len(pat) + 1) if text.startswith(pat, pos))
+    write(struct.pack("<Id", len(matches), 0.25) + b"".join(struct.pack("<II", *m) for m in matches))
+"""
+
+
+class TestMatcherServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patterns = Path(self.tmp.name) / "patterns.txt"
+        self.patterns.write_bytes(b"ab\nb\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fake_server(self, *extra_args) -> Path:
+        path = Path(self.tmp.name) / "fake_server"
+        body = FAKE_SERVER.format(python=sys.executable)
+        if extra_args:
+            body = body.replace("args = sys.argv[1:]", f"args = sys.argv[1:] + {list(extra_args)!r}")
+        path.write_text(body)
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+        return path
+
+    @unittest.skipIf(sys.platform == "win32", "the fake server is a script run through its shebang")
+    def test_framing(self):
+        with MatcherServer("ac", self.patterns, exe_path=self.fake_server()) as server:
+            self.assertEqual((server.pattern_count, server.compile_ms), (2, 1.5))
+            self.assertEqual(server.scan(b"abab"), [(0, 0), (1, 1), (2, 0), (3, 1)])
+            self.assertEqual(server.last_time_ms, 0.25)
+            self.assertEqual(server.scan(b""), [])
+            self.assertEqual(server.scan("xab"), [(1, 0), (2, 1)])
+            # A buffer of wider items is sent as its bytes
+            self.assertEqual(server.scan(memoryview(b"bbab").cast("H")), [(0, 1), (1, 1), (2, 0), (3, 1)])
+            # Responses stay in step over many requests
+            for n in range(1, 50):
+                self.assertEqual(len(server.scan(b"ab" * n)), 2 * n)
+            proc = server.proc
+        self.assertIsNone(server.proc)
+        self.assertEqual(proc.returncode, 0)
+
+    @unittest.skipIf(sys.platform == "win32", "the fake server is a script run through its shebang")
+    def test_exit_before_ready(self):
+        with self.assertRaisesRegex(RuntimeError, "code 3: cannot compile the patterns"):
+            MatcherServer("ac", self.patterns, exe_path=self.fake_server("--fail"))
+
+    def test_missing_executable(self):
+        with self.assertRaises(FileNotFoundError):
+            MatcherServer("ac", self.patterns, exe_path=Path(self.tmp.name) / "missing")
+
+    def test_built_matchers(self):
+        # Round trip through every matcher that is built; the patterns use a Snort hex block
+        self.patterns.write_bytes(b"GET\nab|7c|c\nc\n")
+        built = [name for name in ("fdr", "dfc", "ac") if find_executable(name).exists()]
+        if not built:
+            self.skipTest("no matcher executable is built")
+        for name in built:
+            with self.subTest(matcher=name), MatcherServer(name, self.patterns) as server:
+                self.assertEqual(server.pattern_count, 3)
+                self.assertEqual(server.scan(b"GET ab|c"), [(0, 0), (4, 1), (7, 2)])
+                self.assertEqual(server.scan(b""), [])
+                self.assertEqual(server.scan(b"cc"), [(0, 2), (1, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
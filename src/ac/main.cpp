@@ -5,6 +5,8 @@
  * - Loading patterns from a file
  * - Scanning rulesets line by line
  * - Performance measurement
+ * - A server mode (--server) that loads the patterns once and scans the
+ *   buffers sent on stdin (protocol in common/matcher_server.h)
  */
 
 #include <iostream>
@@ -18,6 +20,9 @@
 #include <filesystem>
 #include <algorithm>
 
+#include "common/matcher_server.h"
+#include "common/snort_content.h"
+
 using namespace std;
 namespace fs = std::filesystem;
 
@@ -28,7 +33,7 @@ struct RulesetResult {
     double time_ms;
 };
 
-// Load patterns from file
+// Load patterns from file, decoding their Snort hex blocks
 vector<string> loadPatterns(const string &filename) {
     vector<string> patterns;
     ifstream file(filename);
@@ -41,7 +46,7 @@ vector<string> loadPatterns(const string &filename) {
     string line;
     while (getline(file, line)) {
         if (!line.empty() && line[0] != '#') {
-            patterns.push_back(line);
+            patterns.push_back(decodeContent(line));
         }
     }
     
@@ -115,12 +120,11 @@ size_t scanRulesetsFile(const string &filepath, const vector<string> &patterns,
 }
 
 int main(int argc, char *argv[]) {
-    cout << "=== AC String Matcher Application ===" << endl << endl;
-    
     // Parse command line arguments
     string patterns_file;
     string rulesets_file;
     string output_dir;
+    bool server = false;
     
     for (int i = 1; i < argc; i++) {
         string arg = argv[i];
@@ -130,19 +134,28 @@ int main(int argc, char *argv[]) {
             rulesets_file = argv[++i];
         } else if (arg == "--out" && i + 1 < argc) {
             output_dir = argv[++i];
+        } else if (arg == "--server") {
+            server = true;
         } else if (arg == "--help") {
             cout << "Usage: " << argv[0] << " --patterns <file> --rulesets <file> --out <dir>" << endl;
+            cout << "       " << argv[0] << " --patterns <file> --server" << endl;
             cout << "Required arguments:" << endl;
             cout << "  --patterns <file>       Patterns file" << endl;
             cout << "  --rulesets <file>       Rulesets file" << endl;
             cout << "  --out <dir>             Output directory for results" << endl;
+            cout << "  --server                Scan the buffers sent on stdin instead of a rulesets file" << endl;
             cout << "  --help                  Show this help message" << endl;
             return 0;
         }
     }
     
+    if (server) {
+        enterServerMode();
+    }
+    cout << "=== AC String Matcher Application ===" << endl << endl;
+    
     // Validate required arguments
-    if (patterns_file.empty() || rulesets_file.empty() || output_dir.empty()) {
+    if (patterns_file.empty() || (!server && (rulesets_file.empty() || output_dir.empty()))) {
         cerr << "ERROR: Missing required arguments!" << endl;
         cerr << "Usage: " << argv[0] << " --patterns <file> --rulesets <file> --out <dir>" << endl;
         cerr << "Use --help for more information" << endl;
@@ -151,7 +164,9 @@ int main(int argc, char *argv[]) {
     
     // Create output directory if it doesn't exist
     try {
-        fs::create_directories(output_dir);
+        if (!server) {
+            fs::create_directories(output_dir);
+        }
     } catch (const fs::filesystem_error &e) {
         cerr << "ERROR: Cannot create output directory: " << e.what() << endl;
         return 1;
@@ -177,6 +192,12 @@ int main(int argc, char *argv[]) {
     cout << "SUCCESS: AC engine compiled in " << compile_time << " ms" << endl;
     cout << endl;
     
+    if (server) {
+        cout << "Serving scan requests on stdin" << endl;
+        return serveScanRequests(patterns.size(), (double)compile_time,
+                                 [&](const string &text) { return searchPatterns(text, patterns); });
+    }
+    
     // Step 3: Scan rulesets
     cout << "Scanning rulesets from: " << rulesets_file << endl;
     
@@ -0,0 +1,94 @@
+/*
+ * Server mode (--server) shared by the fdr, dfc and ac matchers: the patterns
+ * are compiled once, then every buffer sent on stdin is scanned and its
+ * matches are written to stdout. scripts/run.py (MatcherServer) is the client.
+ *
+ * Protocol. Every message is a u32 byte length followed by that many bytes;
+ * numbers are in host byte order (little-endian on x86).
+ *   ready    (server -> client, once): u32 pattern count, f64 compile time in ms
+ *   request  (client -> server):       the bytes to scan
+ *   response (server -> client):       u32 match count, f64 scan time in ms, then
+ *                                      u32 position and u32 pattern_index per match
+ * The server answers every request in order and exits when stdin is closed.
+ */
+
+#ifndef STRING_MATCHERS_MATCHER_SERVER_H
+#define STRING_MATCHERS_MATCHER_SERVER_H
+
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <iostream>
+#include <string>
+#include <utility>
+#include <vector>
+
+#ifdef _WIN32
+#include <fcntl.h>
+#include <io.h>
+#endif
+
+// Prepare the standard streams for the protocol: stdout carries only messages,
+// so the log written to cout goes to stderr
+inline void enterServerMode() {
+    std::cout.rdbuf(std::cerr.rdbuf());
+#ifdef _WIN32
+    _setmode(_fileno(stdin), _O_BINARY);
+    _setmode(_fileno(stdout), _O_BINARY);
+#endif
+}
+
+// Read one message from stdin; false at end of input
+inline bool readMessage(std::string &payload) {
+    uint32_t length;
+    if (fread(&length, sizeof(length), 1, stdin) != 1) {
+        return false;
+    }
+    payload.resize(length);
+    return length == 0 || fread(&payload[0], 1, length, stdin) == length;
+}
+
+// Write one message to stdout
+inline void writeMessage(const std::string &payload) {
+    uint32_t length = (uint32_t)payload.size();
+    fwrite(&length, sizeof(length), 1, stdout);
+    fwrite(payload.data(), 1, payload.size(), stdout);
+    fflush(stdout);
+}
+
+template <typename T>
+inline void appendValue(std::string &payload, T value) {
+    payload.append(reinterpret_cast<const char *>(&value), sizeof(value));
+}
+
+// Send the ready message, then answer scan requests until stdin is closed.
+// `scan` returns the sorted (position, pattern_index) matches of one buffer;
+// the scan time of a response is the time spent in it.
+template <typename Scan>
+int serveScanRequests(size_t pattern_count, double compile_ms, Scan scan) {
+    std::string message;
+    appendValue(message, (uint32_t)pattern_count);
+    appendValue(message, compile_ms);
+    writeMessage(message);
+
+    std::string text;
+    while (readMessage(text)) {
+        auto start = std::chrono::high_resolution_clock::now();
+        auto matches = scan(text);
+        auto end = std::chrono::high_resolution_clock::now();
+
+        double time_ms = std::chrono::duration_cast<std::chrono::microseconds>(end - start).count() / 1000.0;
+
+        message.clear();
+        appendValue(message, (uint32_t)matches.size());
+        appendValue(message, time_ms);
+        for (const auto &match : matches) {
+            appendValue(message, (uint32_t)match.first);
+            appendValue(message, (uint32_t)match.second);
+        }
+        writeMessage(message);
+    }
+    return 0;
+}
+
+#endif // STRING_MATCHERS_MATCHER_SERVER_H
@@ -0,0 +1,61 @@
+/*
+ * Snort `content` syntax of the patterns files, shared by the matchers.
+ *
+ * Patterns are stored one per line as Snort writes them: raw bytes are kept in
+ * `|..|` hex blocks (e.g. `GET|0d 0a|`). decodeContent() replaces every
+ * well-formed hex block by the bytes it encodes and keeps everything else as
+ * is, exactly like decode_content() in snort_content.py.
+ */
+
+#ifndef STRING_MATCHERS_SNORT_CONTENT_H
+#define STRING_MATCHERS_SNORT_CONTENT_H
+
+#include <cctype>
+#include <string>
+
+inline int hexDigitValue(char c) {
+    if (c >= '0' && c <= '9') return c - '0';
+    if (c >= 'a' && c <= 'f') return c - 'a' + 10;
+    if (c >= 'A' && c <= 'F') return c - 'A' + 10;
+    return -1;
+}
+
+// Decode the hex block whose opening '|' is at `start`: appends its bytes to
+// `out` and returns the position after the closing '|', or 0 if it is malformed
+inline size_t decodeHexBlock(const std::string &content, size_t start, std::string &out) {
+    std::string bytes;
+    size_t pos = start + 1;
+    for (;;) {
+        size_t digits = pos;
+        while (digits < content.size() && isspace((unsigned char)content[digits])) digits++;
+        if (digits + 1 >= content.size() || hexDigitValue(content[digits]) < 0 || hexDigitValue(content[digits + 1]) < 0) {
+            break;
+        }
+        bytes.push_back((char)(hexDigitValue(content[digits]) * 16 + hexDigitValue(content[digits + 1])));
+        pos = digits + 2;
+    }
+    while (pos < content.size() && isspace((unsigned char)content[pos])) pos++;
+    if (bytes.empty() || pos >= content.size() || content[pos] != '|') {
+        return 0;
+    }
+    out += bytes;
+    return pos + 1;
+}
+
+// Decode a pattern written in Snort content syntax
+inline std::string decodeContent(const std::string &content) {
+    std::string out;
+    out.reserve(content.size());
+    size_t i = 0;
+    while (i < content.size()) {
+        size_t next = content[i] == '|' ? decodeHexBlock(content, i, out) : 0;
+        if (next) {
+            i = next;
+        } else {
+            out.push_back(content[i++]);
+        }
+    }
+    return out;
+}
+
+#endif // STRING_MATCHERS_SNORT_CONTENT_H
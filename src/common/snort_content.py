@@ -0,0 +1,23 @@
+"""
+Snort `content` syntax of the patterns files.
+
+Patterns are stored one per line as Snort writes them: raw bytes are kept in
+`|..|` hex blocks (e.g. `GET|0d 0a|`), which also keeps a pattern that contains
+a line break on one line. Every loader decodes the hex blocks before matching;
+snort_content.h is the same decoding for the C++ matchers.
+"""
+
+import re
+
+
+# A Snort hex block inside content, e.g. the `|0d 0a|` in `GET|0d 0a|`
+HEX_BLOCK = re.compile(rb'\|((?:\s*[0-9A-Fa-f]{2})+)\s*\|')
+
+
+def decode_content(content: bytes) -> bytes:
+    """
+    Decode a pattern written in Snort `content` syntax: every `|..|` hex block
+    (e.g. `|0d 0a|`) is replaced by the bytes it encodes, everything else is kept
+    as is. Patterns without a well-formed hex block are returned unchanged.
+    """
+    return HEX_BLOCK.sub(lambda m: bytes.fromhex(m.group(1).decode('ascii')), content)
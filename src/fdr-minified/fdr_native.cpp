@@ -0,0 +1,171 @@
+/*
+ * FDR String Matcher - C API of the shared library (fdr_native)
+ *
+ * The compile and scan steps of main.cpp behind the functions of
+ * fdr_native.h: the engine is built once per handle and every scan reuses it
+ * and the handle's scratch and match buffers.
+ */
+
+#include <algorithm>
+#include <cstdio>
+#include <cstring>
+#include <exception>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "fdr_native.h"
+
+#include "fdr/fdr.h"
+#include "fdr/fdr_compile.h"
+#include "hwlm/hwlm.h"
+#include "hwlm/hwlm_literal.h"
+#include "hwlm/hwlm_build.h"
+#include "ue2common.h"
+#include "grey.h"
+#include "scratch.h"
+#include "util/target_info.h"
+
+using namespace std;
+using namespace ue2;
+
+// The scratch handed to fdrExec. The engine only uses the hs_scratch part;
+// the match callback gets its handle back from the rest, so scans need no
+// global state and separate handles can scan on separate threads.
+struct ScanScratch {
+    struct hs_scratch scratch; // must stay the first member
+    fdr_native_t *matcher;
+};
+
+struct fdr_native {
+    bytecode_ptr<FDR> engine;
+    vector<u32> lengths;                 // pattern lengths, by pattern_index
+    vector<pair<u32, u32>> hits;         // (pattern_id, inclusive end) of the current scan
+    vector<u32> matches;                 // (position, pattern_index) of the last scan, flattened
+    ScanScratch scan_scratch;
+
+    fdr_native() : engine(nullptr) {}
+};
+
+static
+void setError(char *error, size_t error_len, const string &message) {
+    if (error && error_len > 0) {
+        snprintf(error, error_len, "%s", message.c_str());
+    }
+}
+
+// Match callback: records the match in the scanning handle
+static
+hwlmcb_rv_t matchCallback(size_t end, u32 id, struct hs_scratch *scratch) {
+    fdr_native_t *matcher = reinterpret_cast<ScanScratch *>(scratch)->matcher;
+    matcher->hits.push_back(make_pair(id, (u32)end));
+    return HWLM_CONTINUE_MATCHING;
+}
+
+extern "C" {
+
+fdr_native_t *fdr_native_compile(const char *const *patterns,
+                                 const size_t *lengths, size_t count,
+                                 char *error, size_t error_len) {
+    if (count == 0) {
+        setError(error, error_len, "No patterns to compile");
+        return nullptr;
+    }
+
+    vector<hwlmLiteral> literals;
+    vector<u32> pattern_lengths;
+    for (size_t i = 0; i < count; i++) {
+        // FDR's 8-byte limit; main.cpp filters longer patterns out, here the
+        // caller's pattern indexes must stay valid, so they are refused
+        if (lengths[i] == 0 || lengths[i] > 8) {
+            setError(error, error_len,
+                     "Pattern " + to_string(i) + " has " + to_string(lengths[i]) +
+                     " bytes; FDR patterns must be 1 to 8 bytes");
+            return nullptr;
+        }
+        literals.emplace_back(string(patterns[i], lengths[i]), false, (u32)i);
+        pattern_lengths.push_back((u32)lengths[i]);
+    }
+
+    try {
+        Grey grey;
+        target_t target = get_current_target();
+
+        auto proto = fdrBuildProto(1, literals, false, target, grey);
+        if (!proto) {
+            setError(error, error_len, "Failed to build FDR prototype");
+            return nullptr;
+        }
+
+        auto engine = fdrBuildTable(*proto, grey);
+        if (!engine) {
+            setError(error, error_len, "Failed to build FDR engine");
+            return nullptr;
+        }
+
+        fdr_native_t *matcher = new fdr_native_t();
+        matcher->engine = move(engine);
+        matcher->lengths = move(pattern_lengths);
+        memset(&matcher->scan_scratch.scratch, 0, sizeof(matcher->scan_scratch.scratch));
+        matcher->scan_scratch.matcher = matcher;
+        return matcher;
+    } catch (const exception &e) {
+        setError(error, error_len, e.what());
+        return nullptr;
+    }
+}
+
+int fdr_native_scan(fdr_native_t *matcher, const uint8_t *buf, size_t len,
+                    size_t *match_count) {
+    matcher->hits.clear();
+    matcher->matches.clear();
+    if (match_count) {
+        *match_count = 0;
+    }
+    if (len == 0) {
+        return 0;
+    }
+
+    hwlm_group_t groups = ~0ULL;
+    hwlm_error_t result = fdrExec(matcher->engine.get(), buf, len, 0,
+                                  matchCallback,
+                                  &matcher->scan_scratch.scratch, groups);
+    if (result != HWLM_SUCCESS) {
+        return -1;
+    }
+
+    // FDR reports the inclusive end position; convert to start positions and
+    // order by start position then pattern id, as main.cpp does
+    vector<pair<u32, u32>> ordered;
+    ordered.reserve(matcher->hits.size());
+    for (const auto &hit : matcher->hits) {
+        u32 pattern_id = hit.first;
+        u32 start_pos = hit.second - matcher->lengths[pattern_id] + 1;
+        ordered.push_back({start_pos, pattern_id});
+    }
+    sort(ordered.begin(), ordered.end());
+
+    matcher->matches.reserve(2 * ordered.size());
+    for (const auto &match : ordered) {
+        matcher->matches.push_back(match.first);
+        matcher->matches.push_back(match.second);
+    }
+    if (match_count) {
+        *match_count = ordered.size();
+    }
+    return 0;
+}
+
+const uint32_t *fdr_native_matches(const fdr_native_t *matcher) {
+    return matcher->matches.data();
+}
+
+size_t fdr_native_pattern_count(const fdr_native_t *matcher) {
+    return matcher->lengths.size();
+}
+
+void fdr_native_free(fdr_native_t *matcher) {
+    delete matcher;
+}
+
+} // extern "C"
@@ -0,0 +1,67 @@
+/*
+ * FDR String Matcher - C API of the shared library (fdr_native)
+ *
+ * Compiles a pattern set once and scans buffers in process, so callers such
+ * as scripts/fdr_native.py (ctypes) skip process start, pattern loading and
+ * the text results.txt of the fdr-minified executable.
+ *
+ * Matches are reported like main.cpp and py_fdr: (position, pattern_index)
+ * pairs, position being the byte offset where the match starts, sorted by
+ * position then pattern index.
+ */
+
+#ifndef FDR_NATIVE_H
+#define FDR_NATIVE_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+#if defined(_WIN32)
+#define FDR_NATIVE_API __declspec(dllexport)
+#else
+#define FDR_NATIVE_API __attribute__((visibility("default")))
+#endif
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+typedef struct fdr_native fdr_native_t;
+
+/*
+ * Compile `count` patterns (pattern i is `lengths[i]` bytes at `patterns[i]`,
+ * not NUL-terminated; its pattern_index is i). Patterns must be 1 to 8 bytes,
+ * FDR's literal limit. Returns NULL on error and writes a message to `error`
+ * (at most `error_len` bytes, NUL-terminated) when it is not NULL.
+ */
+FDR_NATIVE_API fdr_native_t *fdr_native_compile(const char *const *patterns,
+                                                const size_t *lengths,
+                                                size_t count, char *error,
+                                                size_t error_len);
+
+/*
+ * Scan `len` bytes at `buf`. The buffer is read in place, never copied.
+ * Returns 0 and stores the number of matches in `match_count`, or -1 when the
+ * engine reported an error. The matches stay valid until the next scan or
+ * free of the same handle; a handle must not be scanned from two threads at
+ * once.
+ */
+FDR_NATIVE_API int fdr_native_scan(fdr_native_t *matcher, const uint8_t *buf,
+                                   size_t len, size_t *match_count);
+
+/*
+ * The matches of the last scan: 2 * match_count values, the position and the
+ * pattern_index of each match.
+ */
+FDR_NATIVE_API const uint32_t *fdr_native_matches(const fdr_native_t *matcher);
+
+/* Number of compiled patterns. */
+FDR_NATIVE_API size_t fdr_native_pattern_count(const fdr_native_t *matcher);
+
+FDR_NATIVE_API void fdr_native_free(fdr_native_t *matcher);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // FDR_NATIVE_H
@@ -27,6 +27,7 @@
 #include "grey.h"
 #include "util/target_info.h"
 #include "hs.h"
+#include "common/snort_content.h"
 
 using namespace std;
 using namespace ue2;
@@ -57,7 +58,7 @@ hwlmcb_rv_t matchCallback(size_t end, u32 id, struct hs_scratch *scratch) {
     return HWLM_CONTINUE_MATCHING;
 }
 
-// Load patterns from file
+// Load patterns from file, decoding their Snort hex blocks
 vector<string> loadPatterns(const string &filename, size_t max_patterns = 0) {
     vector<string> patterns;
     ifstream file(filename);
@@ -70,7 +71,7 @@ vector<string> loadPatterns(const string &filename, size_t max_patterns = 0) {
     string line;
     while (getline(file, line)) {
         if (!line.empty() && line[0] != '#') {
-            patterns.push_back(line);
+            patterns.push_back(decodeContent(line));
             if (max_patterns > 0 && patterns.size() >= max_patterns) {
                 break;
             }
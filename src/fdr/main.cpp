@@ -5,6 +5,8 @@
  * - Loading patterns from a file
  * - Scanning multiple ruleset files
  * - Performance measurement
+ * - A server mode (--server) that compiles the patterns once and scans the
+ *   buffers sent on stdin (protocol in common/matcher_server.h)
  */
 
 #include <iostream>
@@ -27,6 +29,8 @@
 #include "grey.h"
 #include "util/target_info.h"
 #include "hs.h"
+#include "common/matcher_server.h"
+#include "common/snort_content.h"
 
 using namespace std;
 using namespace ue2;
@@ -57,7 +61,7 @@ hwlmcb_rv_t matchCallback(size_t end, u32 id, struct hs_scratch *scratch) {
     return HWLM_CONTINUE_MATCHING;
 }
 
-// Load patterns from file
+// Load patterns from file, decoding their Snort hex blocks
 vector<string> loadPatterns(const string &filename, size_t max_patterns = 0) {
     vector<string> patterns;
     ifstream file(filename);
@@ -70,7 +74,7 @@ vector<string> loadPatterns(const string &filename, size_t max_patterns = 0) {
     string line;
     while (getline(file, line)) {
         if (!line.empty() && line[0] != '#') {
-            patterns.push_back(line);
+            patterns.push_back(decodeContent(line));
             if (max_patterns > 0 && patterns.size() >= max_patterns) {
                 break;
             }
@@ -118,6 +122,23 @@ size_t scanRuleset(const string &ruleset, const FDR *fdr_engine, struct hs_scrat
     return g_mctx->matches.size() - before_count;
 }
 
+// Matches recorded since `before_count`, as sorted (position, pattern_index) pairs
+vector<pair<u32, u32>> collectMatches(size_t before_count, const vector<string> &patterns) {
+    vector<pair<u32, u32>> matches;
+    for (size_t i = before_count; i < g_mctx->matches.size(); i++) {
+        // FDR callback returns inclusive end position (position of last character)
+        // Convert to start position: inclusive_end - pattern_length + 1
+        u32 pattern_id = g_mctx->matches[i].first;
+        u32 inclusive_end_pos = g_mctx->matches[i].second;
+        u32 start_pos = inclusive_end_pos - patterns[pattern_id].length() + 1;
+        matches.push_back({start_pos, pattern_id});
+    }
+
+    // Ensure a consistent ordering: sort by start position then pattern id
+    sort(matches.begin(), matches.end());
+    return matches;
+}
+
 // Scan all rulesets from file (one ruleset per line)
 size_t scanRulesetsFile(const string &filepath, const FDR *fdr_engine, struct hs_scratch *scratch,
                         const vector<string> &patterns, vector<RulesetResult> *results = nullptr) {
@@ -152,17 +173,7 @@ size_t scanRulesetsFile(const string &filepath, const FDR *fdr_engine, struct hs
             result.time_ms = time_ms;
             
             // Extract matches for this specific ruleset
-            for (size_t i = before_count; i < g_mctx->matches.size(); i++) {
-                // FDR callback returns inclusive end position (position of last character)
-                // Convert to start position: inclusive_end - pattern_length + 1
-                u32 pattern_id = g_mctx->matches[i].first;
-                u32 inclusive_end_pos = g_mctx->matches[i].second;
-                u32 start_pos = inclusive_end_pos - patterns[pattern_id].length() + 1;
-                result.matches.push_back({start_pos, pattern_id});
-            }
-
-            // Ensure a consistent ordering: sort by start position then pattern id
-            sort(result.matches.begin(), result.matches.end());
+            result.matches = collectMatches(before_count, patterns);
             
             results->push_back(result);
         }
@@ -180,12 +191,11 @@ size_t scanRulesetsFile(const string &filepath, const FDR *fdr_engine, struct hs
 }
 
 int main(int argc, char *argv[]) {
-    cout << "=== FDR String Matcher Application ===" << endl << endl;
-    
     // Parse command line arguments
     string patterns_file;
     string rulesets_file;
     string output_dir;
+    bool server = false;
     
     for (int i = 1; i < argc; i++) {
         string arg = argv[i];
@@ -195,19 +205,28 @@ int main(int argc, char *argv[]) {
             rulesets_file = argv[++i];
         } else if (arg == "--out" && i + 1 < argc) {
             output_dir = argv[++i];
+        } else if (arg == "--server") {
+            server = true;
         } else if (arg == "--help") {
             cout << "Usage: " << argv[0] << " --patterns <file> --rulesets <file> --out <dir>" << endl;
+            cout << "       " << argv[0] << " --patterns <file> --server" << endl;
             cout << "Required arguments:" << endl;
             cout << "  --patterns <file>       Patterns file" << endl;
             cout << "  --rulesets <file>       Rulesets file" << endl;
             cout << "  --out <dir>             Output directory for results" << endl;
+            cout << "  --server                Scan the buffers sent on stdin instead of a rulesets file" << endl;
             cout << "  --help                  Show this help message" << endl;
             return 0;
         }
     }
     
+    if (server) {
+        enterServerMode();
+    }
+    cout << "=== FDR String Matcher Application ===" << endl << endl;
+    
     // Validate required arguments
-    if (patterns_file.empty() || rulesets_file.empty() || output_dir.empty()) {
+    if (patterns_file.empty() || (!server && (rulesets_file.empty() || output_dir.empty()))) {
         cerr << "ERROR: Missing required arguments!" << endl;
         cerr << "Usage: " << argv[0] << " --patterns <file> --rulesets <file> --out <dir>" << endl;
         cerr << "Use --help for more information" << endl;
@@ -216,7 +235,9 @@ int main(int argc, char *argv[]) {
     
     // Create output directory if it doesn't exist
     try {
-        fs::create_directories(output_dir);
+        if (!server) {
+            fs::create_directories(output_dir);
+        }
     } catch (const fs::filesystem_error &e) {
         cerr << "ERROR: Cannot create output directory: " << e.what() << endl;
         return 1;
@@ -300,6 +321,20 @@ int main(int argc, char *argv[]) {
             return 1;
         }
         
+        if (server) {
+            cout << "Serving scan requests on stdin" << endl;
+            MatchContext mctx;
+            g_mctx = &mctx;
+            int status = serveScanRequests(pattern_strings.size(), (double)compile_time, [&](const string &text) {
+                // Only the matches of the current request are kept
+                g_mctx->matches.clear();
+                scanRuleset(text, fdr.get(), scratch);
+                return collectMatches(0, pattern_strings);
+            });
+            free(scratch);
+            return status;
+        }
+        
         // Step 4: Scan rulesets
         cout << "Scanning rulesets from: " << rulesets_file << endl;
         
@@ -1,6 +1,10 @@
 import os
+import re
 import time
 
+from common.snort_content import decode_content
+from py_fdr.RulesetReader import RulesetReader
+
 
 def naive_match(rulesets_file: str, patterns_file: str, output_dir: str, max_tests: int = 0):
     """Scan `rulesets_file` using naive matching against `patterns_file` and
@@ -13,29 +17,29 @@ def naive_match(rulesets_file: str, patterns_file: str, output_dir: str, max_tes
         output_dir (str): Directory where `metadata.txt` and `results.txt` will be written.
         max_tests (int): Optional limit on number of rulesets to process (0 = all).
     """
-    # Load patterns (skip empty and comment lines)
+    # Load patterns as bytes (skip empty and comment lines), decoding Snort hex blocks
     patterns = []
-    with open(patterns_file, 'r', encoding='utf-8') as pf:
+    with open(patterns_file, 'rb') as pf:
         for line in pf:
-            line = line.rstrip('\n')
-            if not line or line.startswith('#'):
+            line = line.rstrip(b'\r\n')
+            if not line or line.startswith(b'#'):
                 continue
-            patterns.append(line)
+            patterns.append(decode_content(line))
 
     results = []
     processed = 0
     total_matches = 0
 
-    # Scan rulesets (each line is a ruleset / text to search)
-    with open(rulesets_file, 'r', encoding='utf-8') as rf:
-        for idx, raw in enumerate(rf):
-            line = raw.rstrip('\n')
-            if not line or line.startswith('#'):
-                continue
+    # Scan rulesets (each line is a ruleset / text to search) in place through py_fdr's
+    # RulesetReader; the searches run on the memory map between the line's offsets
+    with RulesetReader(rulesets_file) as reader:
+        for idx, line in reader.iter_rulesets():
+            line_start = int(reader.offsets[idx])
+            line_end = line_start + len(line)
 
             processed += 1
             start = time.perf_counter()
-            matches = naive_match_all(line, patterns)
+            matches = naive_match_all(reader.mm, patterns, line_start, line_end)
             end = time.perf_counter()
 
             time_ms = (end - start) * 1000.0
@@ -92,47 +96,54 @@ def naive_match(rulesets_file: str, patterns_file: str, output_dir: str, max_tes
     print(f"  Written: {results_path} ({len(results)} rows)")
 
 
-def naive_match_all(text: str, patterns: list[str]):
+def naive_match_all(text, patterns: list, begin: int = 0, end: int | None = None):
     """Naive string match for multiple patterns.
     Args:
-        text (str): The text to search within.
-        patterns (list[str]): The patterns to search for.
+        text (str or bytes-like): The text to search within.
+        patterns (list): The patterns to search for, of the same kind as `text`.
+            Positions are byte offsets when `text` is bytes-like.
+        begin, end: Only search `text[begin:end]`, without slicing it; positions are relative to `begin`.
     Returns:
         list[tuple[int,int]]: A list of (position, pattern_index) tuples where each pattern occurs in text.
     """
     all_matches = []
     for pattern_index, pattern in enumerate(patterns):
-        matches = naive_match_single(text, pattern)
+        matches = naive_match_single(text, pattern, begin, end)
         for position in matches:
             all_matches.append((position, pattern_index))
     return all_matches
 
-def naive_match_single(text: str, pattern: str):
+def naive_match_single(text, pattern, begin: int = 0, end: int | None = None):
     """Naive string match, actually not naive because it uses str.find.
     Args:
-        text (str): The text to search within.
-        pattern (str): The pattern to search for.
+        text (str, bytes, bytearray, mmap or memoryview): The text to search within.
+        pattern (str or bytes): The pattern to search for.
+        begin, end: Only search `text[begin:end]`, without slicing it; positions are relative to `begin`.
 
     Returns:
         list[int]: List of starting indices where `pattern` occurs in `text`.
     """
     matches = []
-    n = len(text)
+    n = len(text) if end is None else end
     m = len(pattern)
 
     if m == 0:
-        return list(range(n + 1))
+        return list(range(n - begin + 1))
+
+    if isinstance(text, memoryview):
+        # memoryview has no find(); re scans the buffer in place, the lookahead keeps overlapping matches
+        return [match.start() for match in re.finditer(b'(?=' + re.escape(bytes(pattern)) + b')', text[begin:n])]
 
     # Use first character to find candidate start positions quickly.
-    first = pattern[0]
-    start = 0
-    i = text.find(first, start)
+    first = pattern[:1]
+    start = begin
+    i = text.find(first, start, n)
 
     while i != -1:
         # Ensure remaining length is sufficient, then compare slice (fast C-level)
         if i + m <= n and text[i:i + m] == pattern:
-            matches.append(i)
+            matches.append(i - begin)
         start = i + 1
-        i = text.find(first, start)
+        i = text.find(first, start, n)
 
     return matches
\ No newline at end of file
@@ -0,0 +1,97 @@
+import time
+
+from typing import List
+
+from .FDR import FDR
+from .FDRCompiler import FDRCompiler, patternKey
+from .utils import as_bytes
+
+DEFAULT_DOMAIN_BITS = tuple(range(8, 16))
+DEFAULT_STRATEGIES = (1, 2, 3)
+DEFAULT_REPEATS = 3
+
+
+class Autotuner:
+  """
+    Pick `domain_bits` and the bucket strategy for a pattern set by measurement.
+
+    Every candidate configuration is compiled and timed on a sample of the target corpus with
+    `FDR.exec_many` (best of `repeats` runs). Besides the scan time, each candidate records its
+    confirm rate (bucket candidates per byte) and its false-positive rate (share of candidates
+    that confirmed no pattern). The fastest configuration is kept; `results` holds the whole table.
+    Engines are compiled with stride 1: the strided modes are slower in this engine (see README).
+  """
+  def __init__(self, domain_bits=DEFAULT_DOMAIN_BITS, strategies=DEFAULT_STRATEGIES, repeats: int = DEFAULT_REPEATS):
+    """
+      Args:
+          domain_bits: Candidate super-character widths.
+          strategies: Candidate bucket strategies (see `FDRCompiler.compile`). Strategy 2 is
+            skipped when the pattern keys do not all have the same length.
+          repeats (int): Timed runs per candidate; the fastest one counts.
+    """
+    self.domain_bits = tuple(domain_bits)
+    self.strategies = tuple(strategies)
+    self.repeats = repeats
+    self.results = []
+    self.best = None
+
+  def tune(self, patterns, sample: List, nocase=False) -> FDRCompiler:
+    """Compile and time every candidate configuration.
+      Args:
+          patterns: Patterns to compile (bytes-like or str).
+          nocase (bool | List[bool]): Caseless flags of the patterns (see `FDRCompiler`).
+          sample (List): Payloads of the target corpus to time the candidates on.
+      Returns:
+          FDRCompiler: The compiled engine of the fastest configuration; `self.best` is its row
+          of `self.results`.
+    """
+    self.results = []
+    self.best = None
+    best_compiler = None
+    sample_bytes = sum(len(text) for text in sample)
+    key_lengths = {len(patternKey(bytes(as_bytes(pat)))) for pat in patterns}
+    configs = [(strategy, domain_bits) for strategy in self.strategies for domain_bits in self.domain_bits
+               if strategy != 2 or len(key_lengths) <= 1]
+    for strategy, domain_bits in configs:
+      compiler = FDRCompiler(patterns, nocase=nocase)
+      start = time.perf_counter()
+      compiler.compile(domain_bits=domain_bits, strategy=strategy)
+      compile_ms = (time.perf_counter() - start) * 1000.0
+
+      row = {'domain_bits': domain_bits, 'strategy': strategy, 'compile_ms': compile_ms}
+      row.update(self.measure(FDR(compiler), sample, sample_bytes))
+      self.results.append(row)
+      if self.best is None or row['scan_ms'] < self.best['scan_ms']:
+        self.best = row
+        best_compiler = compiler
+    return best_compiler
+
+  def measure(self, fdr_engine: FDR, sample: List, sample_bytes: int) -> dict:
+    """Scan time (best of `repeats`), confirm rate and false-positive rate of one engine on the sample."""
+    scan_ms = None
+    for _ in range(self.repeats):
+      fdr_engine.reset_counters()
+      start = time.perf_counter()
+      matches = fdr_engine.exec_many(sample)
+      elapsed = (time.perf_counter() - start) * 1000.0
+      scan_ms = elapsed if scan_ms is None else min(scan_ms, elapsed)
+
+    # Only the kernel's candidates count: the matches inside floods are generated without any
+    candidates = fdr_engine.candidates
+    confirmed = fdr_engine.confirmed
+    return {
+      'scan_ms': scan_ms,
+      'throughput_mb_s': (sample_bytes / 1024.0 / 1024.0) / (scan_ms / 1000.0) if scan_ms else 0.0,
+      'confirm_rate': fdr_engine.confirm_rate(),
+      'false_positive_rate': (candidates - confirmed) / candidates if candidates else 0.0,
+      'matches': len(matches),
+    }
+
+  def write(self, path: str):
+    """Write the results table as tab-separated values, the chosen configuration marked with '*'."""
+    columns = ['domain_bits', 'strategy', 'compile_ms', 'scan_ms', 'throughput_mb_s', 'confirm_rate', 'false_positive_rate', 'matches']
+    with open(path, 'w', encoding='utf-8') as fh:
+      fh.write('\t'.join(columns + ['chosen']) + '\n')
+      for row in self.results:
+        values = [f"{row[c]:.6f}" if isinstance(row[c], float) else str(row[c]) for c in columns]
+        fh.write('\t'.join(values + ['*' if row is self.best else '']) + '\n')
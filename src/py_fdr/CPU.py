@@ -1,23 +1,52 @@
 from typing import Dict, List
 from .Register import Register
 
+# Estimated cycles per counted operation (reciprocal throughputs, Skylake / Ice Lake class cores)
+# for the architectures in docs/FDR.MD. Hyperscan's FDR runs the same 128-bit shift-or loop on
+# its AVX2 and AVX512 targets, so they share vector costs; the AVX512VBMI engine shifts, ANDs and
+# ORs four positions per 512-bit instruction, so its vector operations cost a quarter.
+# 'confirms' is the average cost of one bucket candidate in the confirm stage (hash lookup,
+# compare and a likely branch miss). The figures are estimates to rank pattern sets and
+# configurations, not to replace a measurement on the target machine.
+COST_TABLES: Dict[str, Dict[str, float]] = {
+    'AVX2': {'andn': 0.25, 'loads': 0.5, 'ands': 0.33, 'ors': 0.33, 'lshifts': 1.0, 'rshifts': 1.0, 'confirms': 25.0},
+    'AVX512': {'andn': 0.25, 'loads': 0.5, 'ands': 0.33, 'ors': 0.33, 'lshifts': 1.0, 'rshifts': 1.0, 'confirms': 25.0},
+    'AVX512VBMI': {'andn': 0.25, 'loads': 0.5, 'ands': 0.083, 'ors': 0.083, 'lshifts': 0.25, 'rshifts': 0.25, 'confirms': 25.0},
+}
+DEFAULT_GHZ = 3.0
+
 
 class CPU:
     """Simple CPU abstraction that holds counters and primitive
     operations used by the Python FDR implementation.
+
+    `FDR.exec` runs its register operations through these primitives, and
+    `FDR.exec_many` adds the counts the same operations would have. With the
+    per-architecture COST_TABLES the counts become estimated cycles per byte.
     """
     def __init__(self):
         self.counters = {
             'andn': 0,
             'shifts': 0,
             'ors': 0,
+            'ands': 0,
             'lshifts': 0,
-            'rshifts': 0
+            'rshifts': 0,
+            'loads': 0,
+            'confirms': 0,
         }
+        self.scanned_bytes = 0
 
     def reset(self):
         for k in self.counters:
             self.counters[k] = 0
+        self.scanned_bytes = 0
+
+    def count(self, op: str, n: int = 1):
+        """Count `n` operations that ran outside the primitives below (e.g. in the NumPy kernel)."""
+        self.counters[op] += n
+        if op in ('lshifts', 'rshifts'):
+            self.counters['shifts'] += n
 
     def andn(self, a: Register, b: Register) -> Register:
         self.counters['andn'] += 1
@@ -25,16 +54,43 @@ class CPU:
 
     def lshift(self, val: Register, count: int) -> Register:
         self.counters['lshifts'] += 1
+        self.counters['shifts'] += 1
         return val << count
 
     def rshift(self, val: Register, count: int) -> Register:
         self.counters['rshifts'] += 1
+        self.counters['shifts'] += 1
         return val >> count
 
     def or128(self, a: Register, b: Register) -> Register:
         self.counters['ors'] += 1
         return a | b
-    
+
+    def and128(self, a: Register, b: Register) -> Register:
+        self.counters['ands'] += 1
+        return a & b
+
     def load128(self, val: int) -> Register:
+        self.counters['loads'] += 1
         return Register(val, length=128)
 
+    def cycles(self, arch: str) -> float:
+        """Estimated cycles of the counted operations on `arch` (a key of COST_TABLES)."""
+        if arch not in COST_TABLES:
+            raise ValueError('Unknown architecture {}; expected one of {}'.format(arch, ', '.join(COST_TABLES)))
+        costs = COST_TABLES[arch]
+        return sum(costs[op] * n for op, n in self.counters.items() if op in costs)
+
+    def cycles_per_byte(self, arch: str) -> float:
+        return self.cycles(arch) / self.scanned_bytes if self.scanned_bytes else 0.0
+
+    def estimate(self, ghz: float = DEFAULT_GHZ, archs: List[str] | None = None) -> Dict[str, Dict[str, float]]:
+        """Estimated cycles per byte and native throughput (MB/s at `ghz`) for every architecture."""
+        estimates = {}
+        for arch in archs or COST_TABLES:
+            cpb = self.cycles_per_byte(arch)
+            estimates[arch] = {
+                'cycles_per_byte': cpb,
+                'throughput_mb_s': ghz * 1e9 / cpb / 1024.0 / 1024.0 if cpb else 0.0,
+            }
+        return estimates
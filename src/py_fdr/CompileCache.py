@@ -0,0 +1,97 @@
+import hashlib
+import os
+import struct
+
+from typing import List
+
+from .FDRCompiler import ENGINE_VERSION, FDRCompiler
+
+DEFAULT_CACHE_DIR = os.environ.get('PY_FDR_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'py_fdr'))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class CompileCache:
+  """
+    Content-addressed on-disk cache of compiled FDR engines.
+
+    Entries are engine files (see `FDRCompiler.save`) named by a hash of the pattern list and
+    the compile parameters. The least recently used entries are evicted once the directory
+    grows beyond `max_bytes`; a hit refreshes the entry's modification time.
+  """
+  def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+    """Open (and create) a cache directory.
+      Args:
+          cache_dir (str): Directory holding the cached engines.
+          max_bytes (int): Size limit of the directory; 0 disables eviction.
+    """
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    os.makedirs(cache_dir, exist_ok=True)
+
+  def key(self, patterns: List[bytes], domain_bits: int, strategy: int, stride: int = 1, nocase: List[bool] | None = None) -> str:
+    """Hash of the engine format version, the compile parameters and the (ordered) patterns
+    with their nocase flags."""
+    h = hashlib.sha256()
+    h.update(struct.pack('<IIII', ENGINE_VERSION, domain_bits, strategy, stride))
+    for i, pat in enumerate(patterns):
+      h.update(struct.pack('<IB', len(pat), bool(nocase and nocase[i])))
+      h.update(pat)
+    return h.hexdigest()
+
+  def path(self, key: str) -> str:
+    return os.path.join(self.cache_dir, key + '.fdr')
+
+  def get(self, key: str) -> FDRCompiler | None:
+    """Load the engine cached under `key`, or None on a miss."""
+    path = self.path(key)
+    try:
+      compiler = FDRCompiler.load(path)
+      os.utime(path)
+    except (OSError, ValueError):
+      self.misses += 1
+      return None
+    self.hits += 1
+    return compiler
+
+  def put(self, key: str, compiler: FDRCompiler):
+    """Store a compiled engine under `key`, then evict least recently used entries over the size limit."""
+    compiler.save(self.path(key))
+    self.evict(keep=key)
+
+  def evict(self, keep: str | None = None):
+    if not self.max_bytes:
+      return
+    entries = []
+    for name in os.listdir(self.cache_dir):
+      if not name.endswith('.fdr'):
+        continue
+      st = os.stat(os.path.join(self.cache_dir, name))
+      entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+      if total <= self.max_bytes:
+        break
+      if keep is not None and name == keep + '.fdr':
+        continue
+      try:
+        os.remove(os.path.join(self.cache_dir, name))
+      except OSError:
+        continue
+      total -= size
+      self.evictions += 1
+
+  def stats(self) -> dict:
+    """Hit/miss counters of this instance and the current size of the cache directory."""
+    sizes = [os.path.getsize(os.path.join(self.cache_dir, name)) for name in os.listdir(self.cache_dir) if name.endswith('.fdr')]
+    lookups = self.hits + self.misses
+    return {
+      'hits': self.hits,
+      'misses': self.misses,
+      'hit_rate': self.hits / lookups if lookups else 0.0,
+      'evictions': self.evictions,
+      'entries': len(sizes),
+      'bytes': sum(sizes),
+    }
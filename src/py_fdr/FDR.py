@@ -1,36 +1,108 @@
 # A minimal implementation to ensure correctness. No CPU yet.
 import os
+import tempfile
 import time
 
-from typing import List
+from typing import List, Tuple
+
+import numpy as np
+
+from .CPU import CPU
 from .Register import Register
-from .FDRCompiler import FDRCompiler, getSuperChar
-from .utils import LOG
+from .Profiler import Profiler
+from .FDRCompiler import KEY_BYTES, FDRCompiler, buildBitCounts, getSuperCharIndex, maskKeys, paddingBits, patternKey
+from .CompileCache import CompileCache
+from .RulesetReader import RulesetReader
+from .Tracer import TRACE_DEBUG, TRACE_INFO, TRACE_STEP, Tracer
+from .utils import as_bytes, load_patterns
 import multiprocessing
 
 ITER_BYTES = 8
+LOW_64_BITS = (1 << 64) - 1
+# needs_rebalance: share of removed pattern slots, and bucket size relative to the mean, that make a recompile worthwhile
+REBALANCE_REMOVED_SHARE = 0.25
+REBALANCE_BUCKET_SKEW = 2.0
+# Flood detection: runs of one repeated byte, or of a repeated 2- or 4-byte unit, at least this
+# long (and more than twice the longest pattern) are not run through the shift-or kernel
+FLOOD_MIN_BYTES = 256
+FLOOD_PERIODS = (1, 2, 4)
 
 class FDR:
-  def __init__(self, fdr_compiler: FDRCompiler):
+  def __init__(self, fdr_compiler: FDRCompiler, tracer: Tracer | None = None, cpu: CPU | None = None, profiler: Profiler | None = None):
     """Initialize the FDR engine with compiled patterns.
       Args:
           fdr_compiler (FDRCompiler): Compiled FDR patterns and masks.
+          tracer (Tracer): Default tracer of `exec` and `exec_many`; tracing is off without one.
+          cpu (CPU): Instruction counters of the scans (see `CPU.estimate`); a new CPU by default.
+          profiler (Profiler): Per-phase profile of the scans; none by default.
     """
+    self.compiler = fdr_compiler
+    self.tracer = tracer
+    self.cpu = cpu if cpu is not None else CPU()
+    self.profiler = profiler
     self.patterns = fdr_compiler.patterns
-    self.pattern_by_index = {pat: idx for idx, pat in enumerate(self.patterns)}
     self.masks = fdr_compiler.masks
     self.domain_bits = fdr_compiler.domain_bits
+    self.strategy = getattr(fdr_compiler, 'strategy', 1)
+    self.stride = getattr(fdr_compiler, 'stride', 1)
     self.buckets = fdr_compiler.buckets
-
-  def exec(self, text: str, log_file: str | None = None) -> List[int]:
-    # Clear the log file
-    if log_file:
-      # Use LOG to create parent directory and touch the file safely
-      LOG("", log_file=log_file)
+    self.nocase = fdr_compiler.nocase
+    # Confirm tables, one per bucket: candidate bytes -> every pattern index with those bytes.
+    # Literals longer than KEY_BYTES are kept apart, under their key, and verified in full.
+    # Caseless patterns have tables of their own, keyed by their lower-cased bytes.
+    # Removed patterns leave an empty slot in `patterns` so that the other indices stay valid.
+    self.confirm = [{} for _ in range(8)]
+    self.long_confirm = [{} for _ in range(8)]
+    self.nocase_confirm = [{} for _ in range(8)]
+    self.nocase_long_confirm = [{} for _ in range(8)]
+    for b, members in enumerate(fdr_compiler.bucketMembers()):
+      for idx in members:
+        tables, key = self.confirmTables(self.patterns[idx], self.nocase[idx])
+        tables[b].setdefault(key, []).append(idx)
+    self.init_state = np.uint64(self.initState().getValue(type='int') & LOW_64_BITS)
+    # Per-bit pattern counts, built on the first incremental update
+    self.bit_counts = None
+    # Scan counters of exec_many: bytes run through the kernel, bucket candidates looked up in the
+    # confirm tables and those that confirmed a pattern; bytes inside floods, which skip the
+    # kernel, and the matches generated for them are counted apart
+    self.scanned_bytes = 0
+    self.candidates = 0
+    self.confirmed = 0
+    self.flood_bytes = 0
+    self.flood_matches = 0
+    # Flood detection: pattern -> indices, and the matches of each flood unit, built on demand
+    self.flood_detection = True
+    self.flood_patterns = None
+    self.flood_units = {}
+
+  def exec(self, text, log_file: str | None = None, tracer: Tracer | None = None) -> List[Tuple[int, int]]:
+    """Step-by-step register simulation of the FDR scan.
+      Args:
+          text: Payload to scan (bytes-like, or str encoded to UTF-8).
+          log_file (str): Shorthand for a TRACE_STEP tracer flushed to this file after the scan.
+          tracer (Tracer): Records candidates and matches at TRACE_DEBUG and every super-character,
+            mask and st-mask at TRACE_STEP. Defaults to the engine's tracer.
+      Returns:
+          List[Tuple[int, int]]: (position, pattern_index) of every match, in scan order.
+    """
+    text = as_bytes(text)
+    if tracer is None:
+      tracer = Tracer(level=TRACE_STEP, log_file=log_file) if log_file else self.tracer
+    # Decided once per scan, so that a disabled tracer costs no formatting in the loops below
+    traced = tracer is not None and tracer.sample(TRACE_DEBUG)
+    steps = traced and tracer.enabled(TRACE_STEP)
 
     matches = []
+    # Register operations run through the CPU primitives so that they are counted; the two
+    # ANDNs per lookup that take the super-characters out of the input are counted below
+    cpu = self.cpu
+    cpu.scanned_bytes += len(text)
+    domain_mask = (1 << self.domain_bits) - 1
+    lookups = 0
+    prof = self.profiler
+    clock = time.perf_counter
 
-    st_mask = self.initState(log_file=log_file)
+    st_mask = self.initState(tracer=tracer if steps else None)
 
     """
       In actual matching, FDR handles 8 bytes of input at a time.
@@ -39,48 +111,507 @@ class FDR:
     for i in range(0, len(text), ITER_BYTES):
       step+=1
       chunk_len = min(ITER_BYTES, len(text) - i)
-      LOG(f"--- Step {step}: Processing text positions {i} to {i+chunk_len-1} ---", log_file=log_file)
+      if steps:
+        tracer.emit(f"--- Step {step}: Processing text positions {i} to {i+chunk_len-1} ---")
 
 
-      for j in range(chunk_len):
-        super_char = getSuperChar(text, i + j, self.domain_bits)
-
-        super_char_mask = self.masks.get(super_char)
-        LOG(f"Scanning {text[i+j]}, superchar {super_char}, masks\n", super_char_mask, log_file=log_file, indent=2)
-
+      # With a stride above 1, only every stride-th position is looked up
+      for j in range(0, chunk_len, self.stride):
+        if prof is not None:
+          t0 = clock()
+        super_char = getSuperCharIndex(text, i + j, self.domain_bits)
         # We cannot ignore the case that this may be the end of a pattern
-        null_super_char_mask = self.masks.get(getSuperChar(text[i+j], 0, self.domain_bits))
-        super_char_mask = super_char_mask & null_super_char_mask
-        LOG(f"Anded mask:\n", super_char_mask, log_file=log_file, indent=2)
-
-
-        st_mask = st_mask | (super_char_mask << (j * 8))
-
-        LOG("Updated st-mask\n", st_mask, log_file=log_file, indent=2)
+        null_super_char = text[i + j] & domain_mask
+        lookups += 1
+        if prof is not None:
+          t1 = clock()
+
+        super_char_mask = cpu.load128(int(self.masks[super_char]))
+        null_super_char_mask = cpu.load128(int(self.masks[null_super_char]))
+        anded_mask = cpu.and128(super_char_mask, null_super_char_mask)
+        if prof is not None:
+          t2 = clock()
+
+        st_mask = cpu.or128(st_mask, cpu.lshift(anded_mask, j * 8))
+        if prof is not None:
+          t3 = clock()
+          prof.add('super_chars', t1 - t0)
+          prof.add('mask_lookup', t2 - t1)
+          prof.add('shift_or', t3 - t2)
+
+        if steps:
+          tracer.emit(f"Scanning {text[i+j:i+j+1]}, superchar {super_char:0{self.domain_bits}b}, masks\n", super_char_mask, indent=2)
+          tracer.emit(f"Anded mask:\n", anded_mask, indent=2)
+          tracer.emit("Updated st-mask\n", st_mask, indent=2)
 
       # Report matches in lower 64 bits
+      if prof is not None:
+        test_start = clock()
+        confirm_seconds = 0.0
       for b in range(8):
         for p in range(0, chunk_len):
           if st_mask.getBit(p, b) == False:
             match_pos = p + i
-            LOG(f"Found a match ending at {match_pos} for bucket {b}", log_file=log_file, indent=2)
+            cpu.count('confirms')
+            if traced:
+              tracer.emit(f"Found a match ending at {match_pos} for bucket {b}", indent=2)
 
             # Do exact matching
-            match_pos_start = match_pos + 1 - len(self.buckets[b][0])
-            assert match_pos_start >= 0, f"Match position {match_pos_start} out of bounds"
-            sub_text = text[match_pos_start : match_pos + 1]
-            for pat in self.buckets[b]:
-              if sub_text == pat:
-                LOG(f"Found a match starting at {match_pos_start} for '{pat}'", log_file=log_file, indent=2)
-                matches.append((match_pos_start, self.pattern_by_index[pat]))
-      
+            if prof is not None:
+              t0 = clock()
+            found = self.confirmCandidate(text, 0, match_pos, b)
+            if prof is not None:
+              confirm_seconds += clock() - t0
+              prof.candidate(b, bool(found))
+            for match_pos_start, pat_idx in found:
+              if traced:
+                tracer.emit(f"Found a match starting at {match_pos_start} for '{self.patterns[pat_idx]}'", indent=2)
+              matches.append((match_pos_start, pat_idx))
+      if prof is not None:
+        prof.add('bucket_test', clock() - test_start - confirm_seconds)
+        prof.add('confirm', confirm_seconds)
+
+      st_mask = cpu.rshift(st_mask, 64)
+
+    cpu.count('andn', 2 * lookups)
+    if traced and log_file:
+      tracer.flush()
+    return matches
+
 
-      st_mask = st_mask >> 64
+  def exec_vectorized(self, text) -> List[Tuple[int, int]]:
+    """Same result as `exec`, but the super-characters, mask lookups, shift-or and
+    bucket test are computed with NumPy over whole 8-byte blocks. Only the
+    confirm stage runs per candidate in Python.
+    """
+    return [(start, pat_idx) for _, start, pat_idx in self.exec_many([text])]
+
+  def exec_many(self, texts: List) -> List[Tuple[int, int, int]]:
+    """Scan a list of payloads in one pass of the NumPy kernel.
+      The payloads are packed into one buffer where each payload starts on an 8-byte
+      block boundary, and the st-mask is reset to the initial state at the first block
+      of every payload, so no match spans two payloads.
+      Floods (see `findFloods`) are cut out of the payloads first, in the spirit of Hyperscan's
+      flood detection: the kernel only scans their edges, and the matches inside a flood are
+      generated from the matches of its repeated unit.
+      Args:
+          texts (List): Payloads to scan: bytes, bytearray, memoryview, mmap or str
+            (encoded to UTF-8). A single payload is scanned in place without copying.
+      Returns:
+          List of (payload_index, position, pattern_index), where position is the byte
+          offset relative to the payload. Per payload, the order is the same as `exec`,
+          except for payloads with floods, whose matches are sorted by position.
+    """
+    texts = [as_bytes(text) for text in texts]
+    if not self.flood_detection or all(len(text) < FLOOD_MIN_BYTES for text in texts):
+      return self.scanPayloads(texts)
+
+    prof = self.profiler
+    if prof is not None:
+      t0 = time.perf_counter()
+    # Pieces scanned by the kernel: (payload, offset, bytes), and the floods between them
+    pieces = []
+    floods = []
+    margin = max(map(len, self.patterns), default=1)
+    for p, text in enumerate(texts):
+      prev = 0
+      view = memoryview(text) if isinstance(text, (bytes, bytearray)) else text
+      for start, end, period in findFloods(text, 2 * margin + 1):
+        pieces.append((p, prev, view[prev : start + margin]))
+        floods.append((p, start, end, period))
+        prev = end - margin
+      pieces.append((p, prev, view[prev:]))
+    if prof is not None:
+      prof.add('flood', time.perf_counter() - t0)
+    if not floods:
+      return self.scanPayloads(texts)
+
+    matches = [(pieces[k][0], pieces[k][1] + pos, pat_idx) for k, pos, pat_idx in self.scanPayloads([piece for _, _, piece in pieces])]
+    if prof is not None:
+      t0 = time.perf_counter()
+    for p, start, end, period in floods:
+      found = self.floodMatches(texts[p], start, end, period, margin)
+      self.flood_bytes += end - start - 2 * margin
+      self.flood_matches += len(found)
+      matches.extend((p, pos, pat_idx) for pos, pat_idx in found)
+    if prof is not None:
+      prof.add('flood', time.perf_counter() - t0, calls=0)
+
+    flooded = {p for p, _, _, _ in floods}
+    others = [m for m in matches if m[0] not in flooded]
+    return others + sorted(m for m in matches if m[0] in flooded)
+
+  def floodMatches(self, text, start: int, end: int, period: int, margin: int) -> List[Tuple[int, int]]:
+    """Matches inside the flood [start, end) of `text` that are not within `margin` bytes of
+      either edge (the kernel finds those). A pattern that matches at an offset of the repeated
+      unit matches again every `period` bytes.
+    """
+    found = []
+    for residue, pat_idx in self.floodUnit(bytes(text[start : start + period])):
+      length = len(self.patterns[pat_idx])
+      # Positions start + residue + k * period with pos + length > start + margin and pos < end - margin
+      first = start + residue
+      lowest = start + margin - length + 1
+      if first < lowest:
+        first += -(-(lowest - first) // period) * period
+      for pos in range(first, min(end - margin, end - length + 1), period):
+        found.append((pos, pat_idx))
+    return found
+
+  def floodUnit(self, unit: bytes) -> List[Tuple[int, int]]:
+    """(residue, pattern_index) for every pattern that occurs in the endless repetition of
+      `unit`, starting `residue` bytes into it. Cached per unit.
+    """
+    if unit in self.flood_units:
+      return self.flood_units[unit]
+    if self.flood_patterns is None:
+      # Case-sensitive and caseless (lower-cased) patterns
+      self.flood_patterns = ({}, {})
+      for idx, pat in enumerate(self.patterns):
+        if pat:
+          nocase = self.nocase[idx]
+          self.flood_patterns[nocase].setdefault(pat.lower() if nocase else pat, []).append(idx)
+    lengths = sorted({len(pat) for table in self.flood_patterns for pat in table})
+    repeated = unit * (-(-max(lengths, default=1) // len(unit)) + 1)
+    found = []
+    for residue in range(len(unit)):
+      for length in lengths:
+        window = repeated[residue : residue + length]
+        for pat_idx in self.flood_patterns[0].get(window, []) + self.flood_patterns[1].get(window.lower(), []):
+          found.append((residue, pat_idx))
+    self.flood_units[unit] = found
+    return found
+
+  def scanPayloads(self, texts: List) -> List[Tuple[int, int, int]]:
+    """The NumPy kernel of `exec_many`, without flood detection. Emits one TRACE_INFO event per call."""
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    total = int(lengths.sum())
+    if total == 0:
+      return []
+    # Phase boundaries, when profiling
+    prof = self.profiler
+    if prof is not None:
+      marks = [time.perf_counter()]
+
+    # Boundary index: where each payload starts in the joined text and in the block-aligned buffer
+    text_starts = np.cumsum(lengths) - lengths
+    blocks = -(-lengths // ITER_BYTES)
+    block_starts = np.cumsum(blocks) - blocks
+    n_blocks = int(blocks.sum())
+    non_empty = lengths > 0
+
+    buffer = texts[0] if len(texts) == 1 else b''.join(texts)
+    payload_of_char = np.repeat(np.arange(len(texts)), lengths)
+    slots = np.arange(total) - text_starts[payload_of_char] + block_starts[payload_of_char] * ITER_BYTES
+    valid = np.zeros(n_blocks * ITER_BYTES, dtype=bool)
+    valid[slots] = True
+
+    codes = np.zeros(n_blocks * ITER_BYTES + 1, dtype=np.int64)
+    codes[slots] = np.frombuffer(buffer, dtype=np.uint8)
+    # The last character of a payload is followed by a null byte, not by the next payload
+    next_codes = codes[1:].copy()
+    next_codes[slots[(text_starts + lengths - 1)[non_empty]]] = 0
+    if prof is not None:
+      marks.append(time.perf_counter())
+
+    # Super-character of every looked-up position (every stride-th one), and of the character
+    # followed by a null byte
+    stride = self.stride
+    domain_mask = (1 << self.domain_bits) - 1
+    looked_up = codes[:-1:stride]
+    super_chars = (looked_up | (next_codes[::stride] << 8)) & domain_mask
+    null_super_chars = looked_up & domain_mask
+    if prof is not None:
+      marks.append(time.perf_counter())
+
+    char_masks = self.masks[super_chars] & self.masks[null_super_chars]
+    char_masks[~valid[::stride]] = 0
+    char_masks = char_masks.reshape(n_blocks, ITER_BYTES // stride)
+    if prof is not None:
+      marks.append(time.perf_counter())
+
+    # Shift-or per block: the low word is reported, the high word carries into the next block
+    shifts = np.arange(0, ITER_BYTES, stride, dtype=np.uint64) * np.uint64(8)
+    low = np.bitwise_or.reduce(char_masks << shifts, axis=1)
+    high = np.bitwise_or.reduce(char_masks[:, 1:] >> (np.uint64(64) - shifts[1:]), axis=1)
+    carry = np.empty_like(high)
+    carry[1:] = high[:-1]
+    carry[block_starts[non_empty]] = self.init_state
+    st_masks = low | carry
+    if prof is not None:
+      marks.append(time.perf_counter())
+
+    # Bucket test: a zero bit at byte p, bit b means a candidate ending at p for bucket b
+    candidates = ~st_masks.astype('<u8').view(np.uint8)
+    candidates[~valid] = 0
+    ends, buckets = np.nonzero(np.unpackbits(candidates[:, None], axis=1, bitorder='little'))
+    order = np.lexsort((ends, buckets, ends // ITER_BYTES))
+    ends = ends[order]
+    buckets = buckets[order]
+    payloads = np.searchsorted(block_starts * ITER_BYTES, ends, side='right') - 1
+    local_ends = ends - block_starts[payloads] * ITER_BYTES
+    offsets = text_starts[payloads]
+    if prof is not None:
+      marks.append(time.perf_counter())
+
+    self.scanned_bytes += total
+    self.candidates += len(buckets)
+    # The operations `exec` would count for the same scan: per looked-up position two domain
+    # ANDNs, two mask loads, an AND, a shift and an OR; per block the carry shift; per candidate a confirm
+    lookups = int(np.count_nonzero(valid[::stride]))
+    cpu = self.cpu
+    cpu.scanned_bytes += total
+    cpu.count('andn', 2 * lookups)
+    cpu.count('loads', 2 * lookups)
+    cpu.count('ands', lookups)
+    cpu.count('lshifts', lookups)
+    cpu.count('ors', lookups)
+    cpu.count('rshifts', n_blocks)
+    cpu.count('confirms', len(buckets))
 
+    matches = []
+    confirmed = 0
+    confirm = self.confirm
+    nocase_confirm = self.nocase_confirm
+    key_lengths = [self.keyLength(b) for b in range(8)]
+    for p, match_pos, b, offset in zip(payloads.tolist(), local_ends.tolist(), buckets.tolist(), offsets.tolist()):
+      match_pos_start = match_pos + 1 - key_lengths[b]
+      assert match_pos_start >= 0, f"Match position {match_pos_start} out of bounds"
+      found = len(matches)
+      candidate = bytes(buffer[offset + match_pos_start : offset + match_pos + 1])
+      for pat_idx in confirm[b].get(candidate, ()):
+        matches.append((p, match_pos_start, pat_idx))
+      if nocase_confirm[b]:
+        for pat_idx in nocase_confirm[b].get(candidate.lower(), ()):
+          matches.append((p, match_pos_start, pat_idx))
+      if self.long_confirm[b]:
+        for start, pat_idx in self.confirmLong(buffer, offset, match_pos, b):
+          matches.append((p, start, pat_idx))
+      if self.nocase_long_confirm[b]:
+        for start, pat_idx in self.confirmLong(buffer, offset, match_pos, b, nocase=True):
+          matches.append((p, start, pat_idx))
+      if len(matches) > found:
+        confirmed += 1
+      if prof is not None:
+        prof.candidate(b, len(matches) > found)
+
+    self.confirmed += confirmed
+    if prof is not None:
+      marks.append(time.perf_counter())
+      for phase, start, end in zip(('layout', 'super_chars', 'mask_lookup', 'shift_or', 'bucket_test', 'confirm'), marks, marks[1:]):
+        prof.add(phase, end - start)
+    if self.tracer is not None and self.tracer.sample(TRACE_INFO):
+      self.tracer.emit(f"Scanned {len(texts)} payloads, {total} bytes: {len(buckets)} candidates, {len(matches)} matches")
     return matches
 
 
-  def initState(self, log_file: str | None = None):
+  def confirmCandidate(self, text, offset: int, match_pos: int, b: int) -> List[Tuple[int, int]]:
+    """Confirm a candidate of bucket `b` ending at `match_pos` of the payload at `offset` in `text`.
+      Returns:
+          List of (start, pattern_index), start being relative to the payload.
+    """
+    match_pos_start = match_pos + 1 - self.keyLength(b)
+    assert match_pos_start >= 0, f"Match position {match_pos_start} out of bounds"
+    candidate = bytes(text[offset + match_pos_start : offset + match_pos + 1])
+    found = [(match_pos_start, pat_idx) for pat_idx in self.confirm[b].get(candidate, ())]
+    found += [(match_pos_start, pat_idx) for pat_idx in self.nocase_confirm[b].get(candidate.lower(), ())]
+    return found + self.confirmLong(text, offset, match_pos, b) + self.confirmLong(text, offset, match_pos, b, nocase=True)
+
+  def confirmLong(self, text, offset: int, match_pos: int, b: int, nocase: bool = False) -> List[Tuple[int, int]]:
+    """Verify the literals longer than KEY_BYTES whose key ends at `match_pos`: the key is looked
+      up first, then the whole literal is compared if it fits before the end of the key. With
+      `nocase`, the caseless literals are verified, on lower-cased bytes.
+    """
+    found = []
+    key_start = match_pos + 1 - self.keyLength(b)
+    key = bytes(text[offset + key_start : offset + match_pos + 1])
+    tables = self.nocase_long_confirm if nocase else self.long_confirm
+    for pat_idx in tables[b].get(key.lower() if nocase else key, ()):
+      pat = self.patterns[pat_idx]
+      start = match_pos + 1 - len(pat)
+      if start < 0:
+        continue
+      head = bytes(text[offset + start : offset + key_start])
+      if (head.lower() == pat[:-KEY_BYTES].lower()) if nocase else (head == pat[:-KEY_BYTES]):
+        found.append((start, pat_idx))
+    return found
+
+  def confirmTables(self, pat: bytes, nocase: bool = False):
+    """The per-bucket confirm tables that hold `pat`, and its key in them."""
+    if nocase:
+      if len(pat) > KEY_BYTES:
+        return self.nocase_long_confirm, patternKey(pat).lower()
+      return self.nocase_confirm, pat.lower()
+    if len(pat) > KEY_BYTES:
+      return self.long_confirm, patternKey(pat)
+    return self.confirm, pat
+
+  def keyLength(self, b: int) -> int:
+    """Length of the keys of bucket `b` (0 for an empty bucket)."""
+    return len(patternKey(self.buckets[b][0])) if self.buckets[b] else 0
+
+  def patternBits(self, key: bytes, b: int):
+    """The (super-character, mask bit) pairs that `key` clears in bucket `b`."""
+    for pos in range(len(key)):
+      yield getSuperCharIndex(key, pos, self.domain_bits), (len(key) - pos - 1) * 8 + b
+
+  def reset_counters(self):
+    """Reset the scan counters and the CPU instruction counters."""
+    self.scanned_bytes = self.candidates = self.confirmed = 0
+    self.flood_bytes = self.flood_matches = 0
+    self.cpu.reset()
+
+  def confirm_rate(self) -> float:
+    """Confirm lookups (bucket candidates) per byte run through the kernel, over the exec_many
+    calls so far. Flood bytes are not part of it."""
+    return self.candidates / self.scanned_bytes if self.scanned_bytes else 0.0
+
+  def add_patterns(self, patterns, nocase=False) -> List[int]:
+    """Add patterns to the compiled engine, touching only the mask bits, bucket list and
+      confirm entry of each new pattern. A pattern whose key is already compiled only gets its
+      new index added to its confirm entry.
+      The update is atomic: every pattern is validated and given its bucket first, so when one
+      of them is rejected the engine is left unchanged.
+      Args:
+          patterns: Non-empty patterns (bytes-like, or str encoded to UTF-8).
+          nocase (bool | List[bool]): Caseless flag, for all patterns or per pattern.
+      Returns:
+          List[int]: The pattern indices given to the new patterns.
+      Raises:
+          ValueError: If a pattern is empty, shorter than the stride, or fits no bucket.
+    """
+    patterns = list(patterns)
+    flags = [bool(nocase)] * len(patterns) if isinstance(nocase, bool) else [bool(flag) for flag in nocase]
+    if len(flags) != len(patterns):
+      raise ValueError('Got {} nocase flags for {} patterns'.format(len(flags), len(patterns)))
+
+    # Plan: the bucket of every pattern, against the buckets as they will be after the earlier ones
+    planned = [list(bucket) for bucket in self.buckets]
+    planned_keys = {}
+    plan = []
+    for pat, pat_nocase in zip(patterns, flags):
+      pat = bytes(as_bytes(pat))
+      if not pat:
+        raise ValueError('Pattern must not be empty')
+      if len(patternKey(pat)) < self.stride:
+        raise ValueError('Stride {} needs patterns of at least {} bytes'.format(self.stride, self.stride))
+      tables, key = self.confirmTables(pat, pat_nocase)
+      b = next((b for b in range(8) if key in tables[b]), planned_keys.get((id(tables), key)))
+      if b is None:
+        b = self.bucketFor(pat, planned)
+      planned[b].append(pat)
+      planned_keys[(id(tables), key)] = b
+      plan.append((pat, pat_nocase, tables, key, b))
+
+    counts = self.bitCounts()
+    masks = self.writableMasks()
+    indices = []
+    for pat, pat_nocase, tables, key, b in plan:
+      if not self.buckets[b]:
+        masks &= ~np.uint64(paddingBits(len(patternKey(pat)), b))
+      self.buckets[b].append(pat)
+      for mask_key in maskKeys(pat, pat_nocase):
+        for super_char, bit in self.patternBits(mask_key, b):
+          counts[super_char, bit] += 1
+          masks[super_char] &= ~np.uint64(1 << bit)
+        if self.stride > 1 and self.domain_bits > 8 and len(mask_key) < 8:
+          # See clearStrideLeadBits: the padding byte before the pattern must accept its first byte
+          high_mask = (1 << (self.domain_bits - 8)) - 1
+          lead = (np.arange(1 << self.domain_bits) >> 8) == (mask_key[0] & high_mask)
+          masks[lead] &= ~np.uint64(1 << (len(mask_key) * 8 + b))
+
+      idx = len(self.patterns)
+      self.patterns.append(pat)
+      self.nocase.append(pat_nocase)
+      tables[b].setdefault(key, []).append(idx)
+      indices.append(idx)
+
+    self.init_state = np.uint64(self.initState().getValue(type='int') & LOW_64_BITS)
+    self.flood_patterns = None
+    self.flood_units = {}
+    return indices
+
+  def remove_patterns(self, patterns) -> List[int]:
+    """Remove patterns, with all their duplicates (caseless or not), from the compiled engine.
+      A mask bit is set back only when no other pattern of the bucket still clears it. Patterns
+      that are not in the engine are ignored.
+      Returns:
+          List[int]: The pattern indices that were removed; their slots in `patterns` become empty.
+    """
+    counts = self.bitCounts()
+    masks = self.writableMasks()
+    removed = []
+    for pat in patterns:
+      pat = bytes(as_bytes(pat))
+      for pat_nocase in (False, True):
+        tables, key = self.confirmTables(pat, pat_nocase)
+        for b in range(8):
+          pat_ids = [idx for idx in tables[b].get(key, ()) if self.patterns[idx] == pat]
+          if not pat_ids:
+            continue
+          tables[b][key] = [idx for idx in tables[b][key] if idx not in pat_ids]
+          if not tables[b][key]:
+            del tables[b][key]
+          for idx in pat_ids:
+            self.buckets[b].remove(pat)
+            for mask_key in maskKeys(pat, pat_nocase):
+              for super_char, bit in self.patternBits(mask_key, b):
+                counts[super_char, bit] -= 1
+                if counts[super_char, bit] == 0:
+                  masks[super_char] |= np.uint64(1 << bit)
+            self.patterns[idx] = b''
+            self.nocase[idx] = False
+            removed.append(idx)
+          if not self.buckets[b]:
+            masks |= np.uint64(paddingBits(len(patternKey(pat)), b))
+
+    self.init_state = np.uint64(self.initState().getValue(type='int') & LOW_64_BITS)
+    self.flood_patterns = None
+    self.flood_units = {}
+    return removed
+
+  def needs_rebalance(self) -> bool:
+    """Whether a full recompile would be worthwhile after incremental updates: more than a
+      quarter of the pattern slots are removed ones, or (for strategies that spread patterns
+      over buckets) the largest bucket holds more than twice the mean of the non-empty ones.
+    """
+    removed = sum(1 for pat in self.patterns if not pat)
+    if self.patterns and removed > REBALANCE_REMOVED_SHARE * len(self.patterns):
+      return True
+    if self.strategy == 1:
+      return False
+    sizes = [len(bucket) for bucket in self.buckets if bucket]
+    return bool(sizes) and max(sizes) > REBALANCE_BUCKET_SKEW * sum(sizes) / len(sizes)
+
+  def bucketFor(self, pat: bytes, buckets=None) -> int:
+    """Bucket for a new pattern. All keys of a bucket must share one length, so this is the
+      length bucket for strategy 1, and otherwise the smallest bucket of that key length (an
+      empty one counts as the smallest).
+      Args:
+          buckets: Bucket contents to choose from; the engine's buckets by default.
+    """
+    buckets = self.buckets if buckets is None else buckets
+    key_length = len(patternKey(pat))
+    if self.strategy == 1:
+      return key_length - 1
+    candidates = [b for b in range(8) if not buckets[b] or len(patternKey(buckets[b][0])) == key_length]
+    if not candidates:
+      raise ValueError('No bucket can take a pattern of length {}; recompile the engine'.format(key_length))
+    return min(candidates, key=lambda b: len(buckets[b]))
+
+  def bitCounts(self) -> np.ndarray:
+    if self.bit_counts is None:
+      self.bit_counts = buildBitCounts(self.buckets, self.domain_bits, self.compiler.bucketCaseless())
+    return self.bit_counts
+
+  def writableMasks(self) -> np.ndarray:
+    """The mask table, copied first if it is a read-only map of an engine file."""
+    if not self.masks.flags.writeable:
+      self.masks = self.masks.copy()
+      self.compiler.masks = self.masks
+    return self.masks
+
+  def initState(self, tracer: Tracer | None = None):
     st_mask = Register(0, 128)
 
     """
@@ -90,81 +621,133 @@ class FDR:
     for b in range(8):
       if len(self.buckets[b]) == 0:
         continue
-      min_pat_len = len(self.buckets[b][0])
+      min_pat_len = self.keyLength(b)
       for p in range(0, min_pat_len-1):
         st_mask.setBit(True, p, b)
-    LOG("Initial st_mask:\n", st_mask, log_file=log_file)
+    if tracer is not None:
+      tracer.emit("Initial st_mask:\n", st_mask)
     return st_mask
   
 
+def findFloods(text, min_bytes: int) -> List[Tuple[int, int, int]]:
+  """
+  Find floods: runs where the text repeats with a period of FLOOD_PERIODS bytes, at least
+  max(FLOOD_MIN_BYTES, min_bytes) long. Overlapping runs keep the longest (then the shortest period).
+     Returns:
+         Sorted, non-overlapping (start, end, period) triples.
+  """
+  min_bytes = max(FLOOD_MIN_BYTES, min_bytes)
+  if len(text) < min_bytes:
+    return []
+  codes = np.frombuffer(text, dtype=np.uint8)
+  runs = []
+  for period in FLOOD_PERIODS:
+    # same[i]: byte i + period equals byte i; a run of them makes [start, end + period) periodic
+    same = np.concatenate(([0], (codes[period:] == codes[:-period]).view(np.int8), [0]))
+    edges = np.diff(same)
+    for start, end in zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()):
+      if end + period - start >= min_bytes:
+        runs.append((start, end + period, period))
+
+  floods = []
+  for start, end, period in sorted(runs, key=lambda run: (run[0] - run[1], run[2])):
+    if all(end <= s or start >= e for s, e, _ in floods):
+      floods.append((start, end, period))
+  return sorted(floods)
+
+
 # Multiprocessing globals / helpers
 _global_fdr_engine = None
+_global_reader = None
 
-def _worker_init(patterns):
-  """Initializer for worker processes: compile patterns and create an FDR engine."""
-  global _global_fdr_engine
-  fdr_compiler = FDRCompiler(patterns)
-  fdr_compiler.compile()
-  _global_fdr_engine = FDR(fdr_compiler)
+def _worker_init(engine_file, rulesets_file):
+  """Initializer for worker processes: load the compiled engine and map the rulesets file."""
+  global _global_fdr_engine, _global_reader
+  _global_fdr_engine = FDR(FDRCompiler.load(engine_file))
+  _global_reader = RulesetReader(rulesets_file)
 
-def _worker_exec(item):
-  """Worker execution: run the global FDR engine on a single (idx, line).
-  Returns a dict matching the existing results structure.
+def _worker_exec(batch):
+  """Worker execution: run the global FDR engine on a batch of ruleset indices.
+  Returns a list of dicts matching the existing results structure.
+  """
+  results = scan_batch(_global_fdr_engine, [(idx, _global_reader[idx]) for idx in batch])
+  for r in results:
+    r['matched_count'] = len(r['matches'])
+  return results
+
+def scan_batch(fdr_engine: FDR, batch: List[Tuple[int, bytes]]) -> List[dict]:
+  """Scan (ruleset_index, line) items with a single `exec_many` call.
+  The batch time is split across the lines in proportion to their length.
   """
-  idx, line = item
   start = time.perf_counter()
-  matches = _global_fdr_engine.exec(line)
+  found = fdr_engine.exec_many([line for _, line in batch])
   end = time.perf_counter()
 
-  time_ms = (end - start) * 1000.0
-  matches = matches or []
-  matches.sort()
-  return {'ruleset_index': idx, 'matches': matches, 'time_ms': time_ms, 'matched_count': len(matches)}
+  per_line = [[] for _ in batch]
+  for payload, match_pos, pat_idx in found:
+    per_line[payload].append((match_pos, pat_idx))
+
+  batch_ms = (end - start) * 1000.0
+  batch_bytes = sum(len(line) for _, line in batch) or 1
+  results = []
+  for (idx, line), matches in zip(batch, per_line):
+    matches.sort()
+    results.append({'ruleset_index': idx, 'matches': matches, 'time_ms': batch_ms * len(line) / batch_bytes})
+  return results
   
 
-def fdr_match(rulesets_file: str, patterns_file: str, output_file: str, max_patterns: int = 0, max_tests: int = 0):
+def fdr_match(rulesets_file: str, patterns_file: str, output_file: str, max_patterns: int = 0, max_tests: int = 0, batch_size: int = 64, use_cache: bool = True):
   # Load patterns from the patterns file (skip blank lines and comments)
-  patterns = []
-  with open(patterns_file, 'r', encoding='utf-8') as pf:
-    for idx, raw in enumerate(pf):
-      if max_patterns and idx >= max_patterns:
-        break
-      line = raw.rstrip('\n')
-      if not line or line.startswith('#'):
-        continue
-      patterns.append(line)
+  patterns = load_patterns(patterns_file, max_patterns=max_patterns)
 
   fdr_compiler = FDRCompiler(patterns)
-  fdr_compiler.compile()
+  fdr_compiler.compile(cache=CompileCache() if use_cache else None)
+
+  # Workers load the compiled engine instead of compiling the patterns again
+  engine_fd, engine_file = tempfile.mkstemp(suffix='.fdr')
+  os.close(engine_fd)
+  fdr_compiler.save(engine_file)
 
   results = []
   processed = 0
   total_matches = 0
 
-  # Read and collect ruleset lines first (preserve file index)
-  items = []
-  with open(rulesets_file, 'r', encoding='utf-8') as rf:
-    for idx, raw in enumerate(rf):
-      line = raw.rstrip('\n')
-      if not line or line.startswith('#'):
-        continue
-      items.append((idx, line))
-      if max_tests and len(items) >= max_tests:
+  # Index the rulesets file once (saved next to it); workers map it and read their batches by index
+  reader = RulesetReader(rulesets_file)
+  n_lines = len(reader)
+
+  def batches():
+    batch = []
+    count = 0
+    for idx, _ in reader.iter_rulesets():
+      batch.append(idx)
+      count += 1
+      if len(batch) >= batch_size or (max_tests and count >= max_tests):
+        yield batch
+        batch = []
+      if max_tests and count >= max_tests:
         break
+    if batch:
+      yield batch
 
-  print(f"Detected {multiprocessing.cpu_count()} CPU cores. Run with {min(int(multiprocessing.cpu_count()/2), len(items))} workers.")
+  # One worker per two CPUs, at least one
+  num_workers = max(1, int(multiprocessing.cpu_count()/2))
+  print(f"Detected {multiprocessing.cpu_count()} CPU cores. Run with {num_workers} workers.")
 
-  if items:
-    # Start a pool of workers (one per CPU or fewer if fewer items)
-    num_workers = min(int(multiprocessing.cpu_count()/2), len(items))
+  if n_lines:
+    # Start a pool of workers
     ctx = multiprocessing.get_context('spawn') if os.name == 'nt' else multiprocessing.get_context()
-    with ctx.Pool(processes=num_workers, initializer=_worker_init, initargs=(patterns,)) as pool:
-      for res in pool.imap_unordered(_worker_exec, items):
-        results.append({'ruleset_index': res['ruleset_index'], 'matches': res['matches'], 'time_ms': res['time_ms']})
-        processed += 1
-        total_matches += res.get('matched_count', 0)
-        if processed % 100 == 0:
-          print(f"  Scanned {processed} rulesets...")
+    with ctx.Pool(processes=num_workers, initializer=_worker_init, initargs=(engine_file, rulesets_file)) as pool:
+      for batch_results in pool.imap_unordered(_worker_exec, batches()):
+        for res in batch_results:
+          results.append({'ruleset_index': res['ruleset_index'], 'matches': res['matches'], 'time_ms': res['time_ms']})
+          total_matches += res.get('matched_count', 0)
+        if (processed + len(batch_results)) // 100 > processed // 100:
+          print(f"  Scanned {processed + len(batch_results)} rulesets...")
+        processed += len(batch_results)
+
+  reader.close()
+  os.remove(engine_file)
 
   # Ensure results are ordered by ruleset_index like before
   results.sort(key=lambda r: r['ruleset_index'])
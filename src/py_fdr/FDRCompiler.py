@@ -1,101 +1,458 @@
-from typing import Dict, List
-from .Register import Register
-from .utils import LOG
+import mmap
+import os
+import struct
+import tempfile
+
+from typing import List
+
+import numpy as np
+
+from .Tracer import TRACE_DEBUG, TRACE_INFO, Tracer
+from .utils import as_bytes
+
+# Masks only use the lower 64 bits of the 128-bit registers, so they are stored as uint64 words
+MASK_WORD_BITS = 64
+# Longer literals are prefiltered on their last KEY_BYTES bytes and verified in full in the confirm stage
+KEY_BYTES = 8
+
+# Compiled engine file: header, then the mask table, bucket sizes, bucket members (pattern
+# indices), pattern lengths and the concatenated pattern bytes, all little-endian. The header
+# is 8-byte aligned so the mask table can be used in place from a memory map. One nocase flag
+# byte per pattern follows the pattern lengths.
+ENGINE_MAGIC = b'PYFDR\x00\x00\x00'
+ENGINE_VERSION = 1
+ENGINE_HEADER = struct.Struct('<8sIIIIIIQ')  # magic, version, domain_bits, strategy, n_patterns, n_members, stride, blob_len
+# Strides supported by the engine, as in Hyperscan's FDR: the masks are looked up at every stride-th byte
+STRIDES = (1, 2, 4)
 
 """
   Assigns patterns to buckets and builds masks.
 """
 class FDRCompiler:
-    def __init__(self, patterns):
+    def __init__(self, patterns, nocase=False):
         """Initialize the FDR compiler with patterns.
           Args:
-              patterns (List[str]): List of patterns to compile.
+              patterns (List[bytes | str]): List of patterns to compile. Any bytes-like
+                pattern is accepted; str patterns are encoded to UTF-8.
+              nocase (bool | List[bool]): Whether the patterns match ASCII letters in either
+                case, for all patterns or per pattern (Snort's `nocase`).
         """
-        self.patterns = patterns
+        self.patterns = [bytes(as_bytes(pat)) for pat in patterns]
+        self.nocase = [bool(nocase)] * len(self.patterns) if isinstance(nocase, bool) else [bool(flag) for flag in nocase]
+        if len(self.nocase) != len(self.patterns):
+          raise ValueError('Got {} nocase flags for {} patterns'.format(len(self.nocase), len(self.patterns)))
 
-    def compile(self, domain_bits=9, strategy=1, log_file: str | None = None):
+    def compile(self, domain_bits=9, strategy=1, log_file: str | None = None, cache=None, stride=1, tracer: Tracer | None = None):
         """ 
           Compile the patterns into buckets and masks.
             domain_bits (int): Number of bits for the domain.
             strategy (int): Strategy for pattern assignment.
               1 - by length (default)
               2 - all patterns have the same length, assigned uniformly
+              3 - cost model: patterns of every length spread over the 8 buckets so that the
+                  expected number of confirm lookups per byte is lowest
+            cache (CompileCache): Optional compile cache; the engine is loaded from it when the
+              same patterns were compiled with the same parameters before. Not used when tracing.
+            stride (int): 1, 2 or 4. The engine looks the masks up at every stride-th byte only;
+              like Hyperscan, the shortest pattern key must be at least `stride` bytes. Strides
+              above 1 raise the confirm rate and are slower in this engine (see README); 1 is
+              the recommended setting.
+            tracer (Tracer): Records a summary at TRACE_INFO and every mask bit at TRACE_DEBUG.
+            log_file (str): Shorthand for a TRACE_DEBUG tracer flushed to this file.
         """
+        if stride not in STRIDES:
+          raise ValueError('Unsupported stride: {}'.format(stride))
+        if stride > 1 and min((len(patternKey(pat)) for pat in self.patterns), default=stride) < stride:
+          raise ValueError('Stride {} needs patterns of at least {} bytes'.format(stride, stride))
+
+        if tracer is None and log_file:
+          tracer = Tracer(level=TRACE_DEBUG, log_file=log_file)
+        traced = tracer is not None and tracer.sample(TRACE_INFO)
+
+        if cache is not None and not traced:
+          key = cache.key(self.patterns, domain_bits, strategy, stride, self.nocase)
+          cached = cache.get(key)
+          if cached is not None:
+            self.__dict__.update(cached.__dict__)
+            return
+          self.compile(domain_bits=domain_bits, strategy=strategy, stride=stride)
+          cache.put(key, self)
+          return
+
         self.domain_bits = domain_bits
+        self.strategy = strategy
+        self.stride = stride
         if strategy == 1:
           self.buckets = assignPatternsToBucketsByLength(self.patterns)
         elif strategy == 2:
           self.buckets = assignPatternsToBucketsUniformly(self.patterns)
+        elif strategy == 3:
+          self.buckets = assignPatternsToBucketsByCost(self.patterns, domain_bits)
         else:
           raise ValueError('Unsupported strategy: {}'.format(strategy))
-        self.masks = buildMasks(self.buckets, self.domain_bits, log_file=log_file)
+        caseless = self.bucketCaseless()
+        self.masks = buildMasks(self.buckets, self.domain_bits, caseless=caseless, tracer=tracer if traced and tracer.enabled(TRACE_DEBUG) else None)
+        if stride > 1:
+          clearStrideLeadBits(self.masks, self.buckets, self.domain_bits, caseless=caseless)
+
+        if traced:
+          tracer.emit("Compiled FDR with {} patterns into buckets and masks".format(len(self.patterns)))
+          if log_file:
+            tracer.flush()
+
+    def save(self, path: str):
+        """
+          Write the compiled engine (mask table, buckets, patterns and compile parameters)
+          to `path` in the versioned binary format read by `load`. The file is written under a
+          unique temporary name in the same directory and renamed into place, so concurrent
+          writers of the same path never share a partial file.
+        """
+        members = [idx for bucket in self.bucketMembers() for idx in bucket]
+
+        blob = b''.join(self.patterns)
+        header = ENGINE_HEADER.pack(ENGINE_MAGIC, ENGINE_VERSION, self.domain_bits, self.strategy,
+                                    len(self.patterns), len(members), self.stride, len(blob))
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+        try:
+          with os.fdopen(fd, 'wb') as fh:
+            fh.write(header)
+            fh.write(np.asarray(self.masks, dtype='<u8').tobytes())
+            fh.write(np.array([len(bucket) for bucket in self.buckets], dtype='<u4').tobytes())
+            fh.write(np.array(members, dtype='<u4').tobytes())
+            fh.write(np.fromiter(map(len, self.patterns), dtype='<u4', count=len(self.patterns)).tobytes())
+            fh.write(np.array(self.nocase, dtype=np.uint8).tobytes())
+            fh.write(blob)
+          os.replace(tmp_path, path)
+        except BaseException:
+          try:
+            os.remove(tmp_path)
+          except OSError:
+            pass
+          raise
+
+    def bucketMembers(self) -> List[List[int]]:
+        """The pattern indices of every bucket; duplicated patterns take their indices in order."""
+        indices = {}
+        for idx, pat in enumerate(self.patterns):
+          indices.setdefault(pat, []).append(idx)
+        taken = {pat: 0 for pat in indices}
+        members = []
+        for bucket in self.buckets:
+          members.append([])
+          for pat in bucket:
+            members[-1].append(indices[pat][taken[pat]])
+            taken[pat] += 1
+        return members
+
+    def bucketCaseless(self) -> List[List[bool]] | None:
+        """The nocase flag of every bucket member (in `bucketMembers` order), or None when no
+        pattern is caseless."""
+        if not any(self.nocase):
+          return None
+        return [[self.nocase[idx] for idx in members] for members in self.bucketMembers()]
+
+    @classmethod
+    def load(cls, path: str) -> 'FDRCompiler':
+        """
+          Load a compiled engine written by `save`. The mask table is used in place from a
+          read-only memory map of the file.
+        """
+        with open(path, 'rb') as fh:
+          mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(mm) < ENGINE_HEADER.size:
+          raise ValueError('Not a compiled FDR engine: {}'.format(path))
+        magic, version, domain_bits, strategy, n_patterns, n_members, stride, blob_len = ENGINE_HEADER.unpack_from(mm, 0)
+        if magic != ENGINE_MAGIC:
+          raise ValueError('Not a compiled FDR engine: {}'.format(path))
+        if version != ENGINE_VERSION:
+          raise ValueError('Unsupported FDR engine version {} in {}'.format(version, path))
 
-        LOG("Compiled FDR with {} patterns into buckets and masks".format(len(self.patterns)), log_file=log_file)
+        offset = ENGINE_HEADER.size
+        masks = np.frombuffer(mm, dtype='<u8', count=1 << domain_bits, offset=offset)
+        offset += masks.nbytes
+        bucket_sizes = np.frombuffer(mm, dtype='<u4', count=8, offset=offset).tolist()
+        offset += 8 * 4
+        members = np.frombuffer(mm, dtype='<u4', count=n_members, offset=offset).tolist()
+        offset += n_members * 4
+        lengths = np.frombuffer(mm, dtype='<u4', count=n_patterns, offset=offset)
+        offset += n_patterns * 4
+        nocase = np.frombuffer(mm, dtype=np.uint8, count=n_patterns, offset=offset).astype(bool).tolist()
+        offset += n_patterns
+        blob = mm[offset : offset + blob_len]
 
+        ends = np.cumsum(lengths).tolist()
+        starts = [0] + ends[:-1]
+        compiler = cls.__new__(cls)
+        compiler.patterns = [blob[start:end] for start, end in zip(starts, ends)]
+        compiler.nocase = nocase
+        compiler.domain_bits = domain_bits
+        compiler.strategy = strategy
+        compiler.stride = stride
+        compiler.masks = masks
+        compiler.buckets = []
+        first = 0
+        for size in bucket_sizes:
+          compiler.buckets.append([compiler.patterns[idx] for idx in members[first : first + size]])
+          first += size
+        return compiler
+
+
+def patternKey(pat: bytes) -> bytes:
+    """The bytes of a pattern that the masks are built from: the pattern itself, or the last
+    KEY_BYTES bytes of a longer literal."""
+    return pat[-KEY_BYTES:]
+
+def caseVariants(key: bytes) -> List[bytes]:
+    """
+    Keys whose super-characters, together, cover every case variant of a caseless key: all lower
+    case, all upper case, and the two alternations of them. Every pair of adjacent bytes thus shows
+    up in all four case combinations, which is all a 2-byte super-character can see.
+    """
+    lower, upper = key.lower(), key.upper()
+    alternations = [bytes((lower, upper)[(i + first) % 2][i] for i in range(len(key))) for first in (0, 1)]
+    return list(dict.fromkeys([lower, upper] + alternations))
+
+def maskKeys(pat: bytes, nocase: bool = False) -> List[bytes]:
+    """The keys whose super-characters a pattern clears in its bucket's masks."""
+    key = patternKey(pat)
+    return caseVariants(key) if nocase else [key]
 
 def assignPatternsToBucketsByLength(patterns):
-    buckets: List[List[str]] = [[] for _ in range(8)]
+    buckets: List[List[bytes]] = [[] for _ in range(8)]
     for pat in patterns:
-        assert 1 <= len(pat) <= 8, 'Pattern length must be between 1 and 8'
-        buckets[len(pat)-1].append(pat)
+        assert len(pat) >= 1, 'Pattern must not be empty'
+        buckets[len(patternKey(pat))-1].append(pat)
     return buckets
 
 def assignPatternsToBucketsUniformly(patterns):
-    buckets: List[List[str]] = [[] for _ in range(8)]
+    buckets: List[List[bytes]] = [[] for _ in range(8)]
     for idx, pat in enumerate(patterns):
         buckets[idx % 8].append(pat)
     return buckets
 
-def buildMasks(buckets, domain_bits, log_file: str | None = None):
-    masks : Dict[int, Register] = {}
-    for c in range(0, 2**domain_bits):
-      # Set the lower 64 bits to all ones, upper 64 bits to zeros so that the upper 64 bits of st-mask are not affected
-      masks[Register(c, domain_bits).getValue()] = Register(-1, 128) >> 64
+def assignPatternsToBucketsByCost(patterns, domain_bits: int):
+    """
+    Spread patterns over the 8 buckets with a false-positive cost model, in the spirit of
+    Hyperscan's FDR compiler. A bucket keeps a single key length (the confirm stage relies
+    on it), so every length gets at least one bucket and the spare buckets go, one at a time,
+    to the length whose cost drops the most. Within a length, patterns are sorted by their
+    reversed bytes so that buckets hold patterns sharing suffixes, and cut into equal parts.
+
+    The cost is the expected number of confirm lookups per byte. Bucket occupancy is not part
+    of it: a lookup in a bucket's hash table costs the same for 10 or 10,000 patterns, so a
+    split only pays when the parts fire less often in total than the whole. Patterns that
+    cover nearly every super-character at every position (8-byte literals over 'abcd') would
+    make each part fire at almost every byte, and stay in one bucket.
+    """
+    groups = {}
+    for pat in patterns:
+        assert len(pat) >= 1, 'Pattern must not be empty'
+        groups.setdefault(len(patternKey(pat)), []).append(pat)
+    groups = {length: sorted(pats, key=lambda pat: pat[::-1]) for length, pats in sorted(groups.items())}
+
+    # The input is assumed to draw its super-characters from those the patterns use
+    keys = [patternKey(pat) for pat in patterns]
+    alphabet = max(1, len(np.unique(patternSuperChars(keys, domain_bits)[0]))) if keys else 1
+    costs = {}
+    def groupCost(length, k):
+        if (length, k) not in costs:
+          costs[length, k] = sum(bucketCost(part, domain_bits, alphabet) for part in splitGroup(groups[length], k))
+        return costs[length, k]
+
+    shares = {length: 1 for length in groups}
+    while sum(shares.values()) < 8:
+        gains = {length: groupCost(length, k) - groupCost(length, k + 1)
+                 for length, k in shares.items() if k < len(groups[length])}
+        if not gains or max(gains.values()) <= 0:
+          break
+        shares[max(gains, key=gains.get)] += 1
+
+    buckets: List[List[bytes]] = [[] for _ in range(8)]
+    b = 0
+    for length, pats in groups.items():
+        for part in splitGroup(pats, shares[length]):
+          buckets[b] = part
+          b += 1
+    return buckets
+
+def splitGroup(pats: List[bytes], k: int) -> List[List[bytes]]:
+    """Cut a sorted list of patterns into k contiguous parts of (almost) equal size."""
+    bounds = [len(pats) * i // k for i in range(k + 1)]
+    return [pats[bounds[i] : bounds[i + 1]] for i in range(k)]
+
+def bucketCost(pats: List[bytes], domain_bits: int, alphabet: int) -> float:
+    """
+    Expected confirm lookups per input byte for one bucket: the chance that the bucket fires at
+    a byte, taken as the product over positions of the share of the `alphabet` super-characters
+    the bucket accepts there. A lookup in the bucket's confirm table does not depend on its size.
+    """
+    if not pats:
+        return 0.0
+    keys = [patternKey(pat) for pat in pats]
+    super_chars, _, _ = patternSuperChars(keys, domain_bits)
+    fire = 1.0
+    for pos in range(min(map(len, keys))):
+        fire *= min(1.0, len(np.unique(super_chars[:, pos])) / alphabet)
+    return fire
+
+def buildMasks(buckets, domain_bits, caseless=None, tracer: Tracer | None = None) -> np.ndarray:
+    """
+    Build the super-character masks as a flat uint64 array of 2^domain_bits words,
+    indexed by the integer super-character (see `getSuperCharIndex`). `caseless` holds the
+    nocase flag of every bucket member (see `FDRCompiler.bucketCaseless`), or None if none is.
+    Every cleared mask bit is emitted to `tracer` when one is given.
+    """
+    # Set all 64 bits to ones; the upper 64 bits of a 128-bit mask are implicitly zero so that the upper 64 bits of st-mask are not affected
+    all_ones = (1 << MASK_WORD_BITS) - 1
 
-      """
+    """
       If the byte position of a sh-mask exceeds the longest pattern of a certain bucket (called ‘padding byte’), we encode the bucket id in the padding byte. This ensures matching correctness by carrying a match at a lower input byte along in the shift process.
 
-      """
+    """
     for b in range(8):
        if len(buckets[b]) == 0:
          continue
-       
-       pat_length = len(buckets[b][0])
 
-       for c in masks.keys():
-          # Set the bit of the positions larger than the pattern length
-          for p in range(pat_length, 8):
-            masks[c].setBit(False, p, b)
+       # Clear the bit of the positions larger than the pattern length
+       all_ones &= ~paddingBits(len(patternKey(buckets[b][0])), b)
 
-    # Set bits according to super-characters in patterns
-    for b in range(8):
-      for pat in buckets[b]:
-        for pos in range(len(pat)):
-            char_pos_from_right = len(pat) - pos - 1
-            super_char = getSuperChar(pat, pos, domain_bits)
-            masks[super_char].setBit(False, char_pos_from_right, b)
-            LOG(f"Pattern '{pat}', char '{pat[pos]}', super-char '{super_char}', pos '{char_pos_from_right}', bucket '{b}', bit set {char_pos_from_right}", log_file=log_file)
+    masks = np.full(1 << domain_bits, all_ones, dtype=np.uint64)
+
+    # Clear bits according to super-characters in patterns, for all patterns at once
+    super_chars, clear_bits = bucketSuperCharBits(buckets, domain_bits, caseless)
+    for bit in np.unique(clear_bits).tolist():
+      masks[super_chars[clear_bits == bit]] &= ~np.uint64(1 << bit)
+
+    if tracer is not None:
+      for b in range(8):
+        for i, pat in enumerate(buckets[b]):
+          for key in maskKeys(pat, bool(caseless and caseless[b][i])):
+            for pos in range(len(key)):
+                char_pos_from_right = len(key) - pos - 1
+                super_char = getSuperCharIndex(key, pos, domain_bits)
+                tracer.emit(f"Pattern '{pat}', char '{key[pos:pos+1]}', super-char '{super_char:0{domain_bits}b}', pos '{char_pos_from_right}', bucket '{b}', bit set {char_pos_from_right}")
 
     return masks
-    
-def getSuperChar(text: str, pos: int, domain_bits: int) -> str:
+
+def clearStrideLeadBits(masks: np.ndarray, buckets, domain_bits: int, caseless=None):
     """
-    Get the super-character for a given character position in a pattern.
+    Mask adjustment for strides above 1. The byte before a pattern's first byte is normally a
+    padding byte, whose bits are all cleared. With a stride, that byte may be the only one looked
+    up for the first pattern byte, which then sits in the upper bits of its super-character. So the
+    padding bit is set back in every super-character whose upper bits match no first byte of the
+    bucket. Buckets of 8-byte keys are left alone: that padding byte is in the upper mask word.
+    """
+    if domain_bits <= 8:
+      return
+    high_mask = (1 << (domain_bits - 8)) - 1
+    highs = np.arange(1 << domain_bits) >> 8
+    for b in range(8):
+      if not buckets[b]:
+        continue
+      key_length = len(patternKey(buckets[b][0]))
+      if key_length >= 8:
+        continue
+      firsts = sorted({key[0] & high_mask for i, pat in enumerate(buckets[b]) for key in maskKeys(pat, bool(caseless and caseless[b][i]))})
+      masks[~np.isin(highs, firsts)] |= np.uint64(1 << (key_length * 8 + b))
+
+def paddingBits(pat_length: int, b: int) -> int:
+    """Mask bits of bucket `b` in the padding bytes of a bucket of `pat_length`-byte patterns."""
+    bits = 0
+    for p in range(pat_length, 8):
+      bits |= 1 << (p * 8 + b)
+    return bits
+
+def bucketSuperCharBits(buckets, domain_bits: int, caseless=None):
+    """
+    The (super-character, mask bit) pair of every key character of every bucketed pattern,
+    as two flat arrays. Each pair is a bit that the pattern clears in that super-character's mask.
+    Caseless patterns contribute the pairs of all their case variants (see `caseVariants`).
+    """
+    pats = []
+    pat_buckets = []
+    for b in range(8):
+      for i, pat in enumerate(buckets[b]):
+        keys = maskKeys(pat, bool(caseless and caseless[b][i]))
+        pats += keys
+        pat_buckets += [b] * len(keys)
+    if not pats:
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+    pat_buckets = np.array(pat_buckets, dtype=np.uint64)
+    super_chars, pos_from_right, valid = patternSuperChars(pats, domain_bits)
+
+    clear_bits = pos_from_right * np.uint64(8) + pat_buckets[:, None]
+    return super_chars[valid], clear_bits[valid]
+
+def buildBitCounts(buckets, domain_bits: int, caseless=None) -> np.ndarray:
+    """
+    Number of patterns clearing each mask bit, as a (2^domain_bits, 64) array. A bit may be set
+    back only when its count drops to zero, which lets patterns be removed incrementally.
+    """
+    counts = np.zeros((1 << domain_bits, MASK_WORD_BITS), dtype=np.uint32)
+    super_chars, clear_bits = bucketSuperCharBits(buckets, domain_bits, caseless)
+    np.add.at(counts, (super_chars, clear_bits.astype(np.intp)), 1)
+    return counts
+
+def patternSuperChars(pats: List[bytes], domain_bits: int):
+    """
+    Compute the super-characters of every position of every pattern with array operations.
 
        Args:
-           pat (str): The pattern string.
-           pos (int): The position of the character in the pattern.
+           pats (List[bytes]): Patterns (or keys) of at most 8 bytes.
            domain_bits (int): Number of bits for the domain.
        Returns:
-           str: The super-character.
+           (super_chars, pos_from_right, valid): three (len(pats), 8) arrays. `super_chars[i, pos]`
+           equals `getSuperCharIndex(pats[i], pos, domain_bits)` and `pos_from_right[i, pos]` is
+           `len(pats[i]) - pos - 1`, wherever `valid[i, pos]` (i.e. pos < len(pats[i])).
+    """
+    lengths = np.fromiter((len(pat) for pat in pats), dtype=np.int64, count=len(pats))
+    rows = np.repeat(np.arange(len(pats)), lengths)
+    cols = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    # One extra zero column so that the last character pairs with a null byte
+    codes = np.zeros((len(pats), 9), dtype=np.int64)
+    codes[rows, cols] = np.frombuffer(b''.join(pats), dtype=np.uint8)
+
+    super_chars = (codes[:, :-1] | (codes[:, 1:] << 8)) & ((1 << domain_bits) - 1)
+    positions = np.arange(8)
+    valid = positions < lengths[:, None]
+    pos_from_right = np.where(valid, lengths[:, None] - positions - 1, 0).astype(np.uint64)
+    return super_chars, pos_from_right, valid
+
+def getSuperCharIndex(text, pos: int, domain_bits: int) -> int:
     """
+    Get the super-character for a given character position in a pattern, as an integer
+    index into the mask table.
 
+       Args:
+           text (bytes-like or str): The pattern.
+           pos (int): The byte position in the pattern.
+           domain_bits (int): Number of bits for the domain.
+       Returns:
+           int: The super-character, in [0, 2^domain_bits).
+    """
+
+    text = as_bytes(text)
     if pos < 0 or pos >= len(text):
-      raise ValueError('Position out of bounds in getSuperChar')
+      raise ValueError('Position out of bounds in getSuperCharIndex')
+
+    start = text[pos]
+    end = text[pos+1] if pos + 1 < len(text) else 0
+
+    return (start | (end << 8)) & ((1 << domain_bits) - 1)
 
-    start = ord(text[pos])
-    end = ord(text[pos+1]) if pos + 1 < len(text) else 0
+def getSuperChar(text, pos: int, domain_bits: int) -> str:
+    """
+    Get the super-character for a given character position in a pattern.
 
-    raw = (start | (end << 8)) & ((1 << domain_bits) - 1)
+       Args:
+           text (bytes-like or str): The pattern.
+           pos (int): The byte position in the pattern.
+           domain_bits (int): Number of bits for the domain.
+       Returns:
+           str: The super-character as a string of `domain_bits` bits.
+    """
 
-    return Register(raw, domain_bits).getValue()
\ No newline at end of file
+    return format(getSuperCharIndex(text, pos, domain_bits), '0{}b'.format(domain_bits))
@@ -0,0 +1,79 @@
+from typing import BinaryIO, Iterator, List, Tuple
+
+from .FDR import FDR
+from .utils import as_bytes
+
+READ_CHUNK_BYTES = 1 << 20
+
+
+class FDRStream:
+  """
+    Streaming scan over an FDR engine, in the spirit of Hyperscan's history-buffer streaming.
+
+    Between `feed` calls the stream keeps the absolute offset and the last bytes of the data:
+    one less than the longest pattern. Long literals count in full, so the history exceeds the
+    7 bytes a key needs when the engine has patterns longer than KEY_BYTES. Each chunk is scanned
+    in place; the matches that start in the history and end in the new chunk are found by
+    rescanning the history together with the head of the chunk. This rebuilds the st-mask the previous chunk would have
+    carried, so every match is reported exactly once with its absolute offset.
+    The history length follows the engine: patterns added with `FDR.add_patterns` between chunks are
+    found across every later boundary.
+  """
+  def __init__(self, fdr_engine: FDR):
+    """Open a stream on a compiled engine.
+      Args:
+          fdr_engine (FDR): Engine to scan with.
+    """
+    self.engine = fdr_engine
+    self.history_bytes = self._history_bytes()
+    self.reset()
+
+  def _history_bytes(self) -> int:
+    """Bytes a match can span before the current chunk: one less than the longest pattern."""
+    return max((len(pat) for pat in self.engine.patterns), default=1) - 1
+
+  def reset(self):
+    """Start a new stream at offset 0 with an empty history."""
+    self.offset = 0
+    self.history = b''
+
+  def feed(self, chunk) -> List[Tuple[int, int]]:
+    """Scan the next chunk of the stream.
+      Args:
+          chunk: bytes, bytearray, memoryview, mmap or str (encoded to UTF-8).
+      Returns:
+          List of (position, pattern_index) where position is the absolute byte offset
+          in the stream.
+    """
+    chunk = as_bytes(chunk)
+    matches = []
+    # The engine may have gained or lost patterns since the last chunk
+    self.history_bytes = self._history_bytes()
+
+    # Matches that cross the boundary: start in the history, end in the chunk
+    if self.history:
+      held = len(self.history)
+      window = self.history + bytes(chunk[:self.history_bytes])
+      for start, pat_idx in self.engine.exec_vectorized(window):
+        if start < held and start + len(self.engine.patterns[pat_idx]) > held:
+          matches.append((self.offset - held + start, pat_idx))
+
+    for start, pat_idx in self.engine.exec_vectorized(chunk):
+      matches.append((self.offset + start, pat_idx))
+
+    self.offset += len(chunk)
+    if self.history_bytes:
+      self.history = (self.history + bytes(chunk[-self.history_bytes:]))[-self.history_bytes:]
+    return matches
+
+  def feed_file(self, fh: BinaryIO, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[Tuple[int, int]]:
+    """Scan a binary file object (file, pipe, socket file) in fixed-size chunks, reusing one buffer.
+      Yields (position, pattern_index) with absolute offsets.
+    """
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    while True:
+      n = fh.readinto(buf)
+      if not n:
+        break
+      yield from self.feed(view[:n])
@@ -0,0 +1,47 @@
+from typing import List
+
+# Scan phases, in the order they run
+PHASES = ('layout', 'flood', 'super_chars', 'mask_lookup', 'shift_or', 'bucket_test', 'confirm')
+
+
+class Profiler:
+  """
+    Opt-in per-phase profile of FDR scans.
+
+    An engine with a profiler (`FDR(compiler, profiler=Profiler())`) times every phase of `exec`
+    and `exec_many` and counts its calls, and counts per bucket how often it triggered and how
+    many of those candidates confirmed at least one pattern (hits) or none (misses). Engines
+    without one skip all of this.
+  """
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    self.seconds = {phase: 0.0 for phase in PHASES}
+    self.calls = {phase: 0 for phase in PHASES}
+    self.triggers = [0] * 8
+    self.hits = [0] * 8
+
+  def add(self, phase: str, seconds: float, calls: int = 1):
+    self.seconds[phase] += seconds
+    self.calls[phase] += calls
+
+  def candidate(self, b: int, confirmed: bool):
+    """Count one candidate of bucket `b`."""
+    self.triggers[b] += 1
+    if confirmed:
+      self.hits[b] += 1
+
+  def report(self) -> List[str]:
+    """The profile as printable lines: one per phase that ran, then one per bucket that triggered."""
+    total = sum(self.seconds.values())
+    lines = ['  {:<12} {:>10} {:>12} {:>7}'.format('phase', 'calls', 'time ms', 'share')]
+    for phase in PHASES:
+      if self.calls[phase]:
+        share = self.seconds[phase] / total if total else 0.0
+        lines.append('  {:<12} {:>10} {:>12.2f} {:>7.1%}'.format(phase, self.calls[phase], self.seconds[phase] * 1000.0, share))
+    lines.append('  {:<12} {:>10} {:>12} {:>10}'.format('bucket', 'triggers', 'hits', 'hit rate'))
+    for b in range(8):
+      if self.triggers[b]:
+        lines.append('  {:<12} {:>10} {:>12} {:>10.2%}'.format(b, self.triggers[b], self.hits[b], self.hits[b] / self.triggers[b]))
+    return lines
@@ -7,105 +7,112 @@ from numpy import uint
 class Register:
     """
       Register Simulation
+
+      The bits are held in a single Python int (bit 0 is the least-significant,
+      right-most bit), so the bitwise operators map directly onto native int
+      operations instead of looping over a list of bools.
     """
+    __slots__ = ('length', 'value', 'access')
+
     def __init__(self, val, length: int = 128, access: Literal['left-to-right', 'right-to-left']='right-to-left'):
         # Accept single-character strings as character codes
         self.length = length
         if isinstance(val, str) and len(val) == 1:
             val = ord(val)
-        self.value = to_bool_list(val, length=length)
+        self.value = to_int(val, length=length)
         self.access = access
 
+    def _new(self, value: int) -> 'Register':
+        """Build a register of the same shape without re-parsing `value`."""
+        result = Register.__new__(Register)
+        result.length = self.length
+        result.access = self.access
+        result.value = value
+        return result
+
     def __str__(self):
-        res = ""
-        n = len(self.value)
-        for idx, bit in enumerate(self.value):
-            res += '1' if bit else '0'
-            # insert a space after every 8 bits, except after the last group
-            if (n - 1 - idx) % 8 == 0 and idx != n - 1:
-                res += ' '
-        return res
+        bits = format(self.value, '0{}b'.format(self.length))
+        n = len(bits)
+        # insert a space after every 8 bits (counted from the right), except after the last group
+        head = n % 8
+        groups = [bits[:head]] if head else []
+        groups.extend(bits[i:i + 8] for i in range(head, n, 8))
+        return ' '.join(groups)
     
     def __eq__(self, other: 'Register'):
-        return self.value == other.value
+        return self.length == other.length and self.value == other.value
     
     def getValue(self, type: Literal['str', 'int']='str') -> str | int:
         """
         Returns the bits in the register as a string of bits or as an integer.
         """
         if type == 'str':
-            return ''.join(['1' if b else '0' for b in self.value])
+            return format(self.value, '0{}b'.format(self.length))
         elif type == 'int':
-            int_value = 0
-            for bit in self.value:
-                int_value = (int_value << 1) | (1 if bit else 0)
-            return int_value
+            return self.value
         else:
             raise ValueError('Unsupported type for getValue: {}'.format(type))
         
     def setBit(self, bit: bool, byte_pos: int, bit_pos: int):
         pos = byte_pos * 8 + bit_pos
-        if pos < 0 or pos >= len(self.value):
+        if pos < 0 or pos >= self.length:
             raise ValueError('Bit position out of range')
-        if self.access == 'right-to-left':
-            self.value[len(self.value) - 1 - pos] = bit
+        if self.access != 'right-to-left':
+            pos = self.length - 1 - pos
+        if bit:
+            self.value |= 1 << pos
         else:
-            self.value[pos] = bit
+            self.value &= ~(1 << pos)
 
     def getBit(self, byte_pos: int, bit_pos: int) -> bool:
         pos = byte_pos * 8 + bit_pos
-        if pos < 0 or pos >= len(self.value):
+        if pos < 0 or pos >= self.length:
             raise ValueError('Bit position out of range')
-        if self.access == 'right-to-left':
-            return self.value[len(self.value) - 1 - pos]
-        else:
-            return self.value[pos]
+        if self.access != 'right-to-left':
+            pos = self.length - 1 - pos
+        return bool((self.value >> pos) & 1)
 
     
     def __or__(self, other: 'Register'):   
-        assert(other.length == len(self.value)), 'Registers must be of the same length for OR operation'     
-
-        result = Register(0, length=len(self.value), access=self.access)
-        result.value = [a or b for a, b in zip(self.value, other.value)]
-        return result
+        assert(other.length == self.length), 'Registers must be of the same length for OR operation'     
+        return self._new(self.value | other.value)
     
     def __and__(self, other: 'Register'):
-        assert(other.length == len(self.value)), 'Registers must be of the same length for OR operation'     
-        
-        result = Register(0, length=len(self.value), access=self.access)
-        result.value = [a and b for a, b in zip(self.value, other.value)]
-        return result
+        assert(other.length == self.length), 'Registers must be of the same length for AND operation'     
+        return self._new(self.value & other.value)
     
     def __invert__(self):
-        result = Register(0, length=len(self.value), access=self.access)
-        result.value = [not b for b in self.value]
-        return result
+        return self._new(~self.value & ((1 << self.length) - 1))
     
     def __lshift__(self, count: int):
         if count < 0:
             raise ValueError('Negative shift count not supported')
-        result = Register(0, length=len(self.value), access=self.access)
-        if count >= len(self.value):
-            return result
-        result.value = self.value[count:] + [False] * count
-        return result
+        return self._new((self.value << count) & ((1 << self.length) - 1))
     
     def __rshift__(self, count: int):
         if count < 0:
             raise ValueError('Negative shift count not supported')
-        result = Register(0, length=len(self.value), access=self.access)
-        if count >= len(self.value):
-            return result
-        result.value = [False] * count + self.value[:-count]
-        return result
+        return self._new(self.value >> count)
     
     def __add__(self, value: uint):
-        return Register(self.getValue(type='int')+value, length=len(self.value), access=self.access)
+        return self._new((self.value + int(value)) & ((1 << self.length) - 1))
     
     def __sub__(self, value: uint):
-        return Register(self.getValue(type='int')-value, length=len(self.value), access=self.access)
+        return self._new((self.value - int(value)) & ((1 << self.length) - 1))
 
 
+def to_int(value, length: int = 128) -> int:
+    """
+    Convert value to a non-negative integer holding its `length` least-significant bits.
+    Accepts the same inputs as `to_bool_list`; plain ints take the fast path.
+    """
+    if isinstance(value, int):
+        return value & ((1 << length) - 1)
+    result = 0
+    for bit in to_bool_list(value, length=length):
+        result = (result << 1) | (1 if bit else 0)
+    return result
+
 
 def to_bool_list(value, length: int = 128) -> List[bool]:
     """
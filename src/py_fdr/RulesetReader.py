@@ -0,0 +1,139 @@
+import mmap
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Tuple
+
+import numpy as np
+
+# Size of the chunks scanned for newlines while building the index, and of the
+# regions that are prefetched ahead of the scan
+INDEX_CHUNK_BYTES = 64 * 1024 * 1024
+REGION_BYTES = 16 * 1024 * 1024
+PAGE_BYTES = mmap.PAGESIZE
+
+
+class RulesetReader:
+  """
+    Memory-mapped reader of a rulesets file (one ruleset per line).
+
+    The start offset of every line is computed once and saved next to the file as
+    `<rulesets file>.lines.npy`; it is rebuilt when the rulesets file is newer or has
+    a different size. Lines are returned as zero-copy memoryview slices of the mapping,
+    without the trailing newline, and can be accessed at random by ruleset_index.
+  """
+  def __init__(self, path: str, region_bytes: int = REGION_BYTES):
+    """Open and index a rulesets file.
+      Args:
+          path (str): Path to the rulesets file.
+          region_bytes (int): Size of the regions prefetched ahead of `iter_rulesets`.
+    """
+    self.path = path
+    self.index_path = path + '.lines.npy'
+    self.region_bytes = region_bytes
+    self.size = os.path.getsize(path)
+
+    self.mm = None
+    self.view = memoryview(b'')
+    if self.size > 0:
+      with open(path, 'rb') as fh:
+        self.mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+      self.view = memoryview(self.mm)
+
+    self.offsets = self.loadIndex()
+    self.prefetcher = ThreadPoolExecutor(max_workers=1)
+
+  def loadIndex(self) -> np.ndarray:
+    """Load the line-offset index, rebuilding and saving it if it is missing or stale.
+      Returns:
+          np.ndarray: uint64 array of len(self) + 1 offsets; line i spans [offsets[i], offsets[i+1]).
+    """
+    if os.path.exists(self.index_path) and os.path.getmtime(self.index_path) >= os.path.getmtime(self.path):
+      try:
+        offsets = np.load(self.index_path)
+        if len(offsets) and int(offsets[-1]) == self.size:
+          return offsets
+      except (OSError, ValueError):
+        pass
+
+    offsets = self.buildIndex()
+    try:
+      with open(self.index_path, 'wb') as fh:
+        np.save(fh, offsets)
+    except OSError:
+      # Read-only location: keep the index in memory only
+      pass
+    return offsets
+
+  def buildIndex(self) -> np.ndarray:
+    """Find every line start, scanning the mapping in fixed-size chunks so memory stays bounded."""
+    starts = [np.zeros(1, dtype=np.uint64)]
+    for chunk_start in range(0, self.size, INDEX_CHUNK_BYTES):
+      chunk = np.frombuffer(self.view[chunk_start : chunk_start + INDEX_CHUNK_BYTES], dtype=np.uint8)
+      starts.append(np.flatnonzero(chunk == ord('\n')).astype(np.uint64) + np.uint64(chunk_start + 1))
+      del chunk
+    offsets = np.concatenate(starts)
+    # A final line without a newline still counts; a trailing newline does not start a new line
+    if offsets[-1] != self.size:
+      offsets = np.append(offsets, np.uint64(self.size))
+    return offsets
+
+  def __len__(self) -> int:
+    return len(self.offsets) - 1
+
+  def __getitem__(self, ruleset_index: int) -> memoryview:
+    """The ruleset at line `ruleset_index`, without its line terminator."""
+    if ruleset_index < 0:
+      ruleset_index += len(self)
+    if ruleset_index < 0 or ruleset_index >= len(self):
+      raise IndexError('Ruleset index out of range')
+    start = int(self.offsets[ruleset_index])
+    end = int(self.offsets[ruleset_index + 1])
+    while end > start and self.view[end - 1] in (0x0a, 0x0d):
+      end -= 1
+    return self.view[start:end]
+
+  def prefetch(self, start: int, end: int):
+    """Ask the OS to page in [start, end) of the file, touching the pages where madvise is unavailable."""
+    if self.mm is None or start >= end:
+      return
+    start -= start % PAGE_BYTES
+    if hasattr(self.mm, 'madvise') and hasattr(mmap, 'MADV_WILLNEED'):
+      self.mm.madvise(mmap.MADV_WILLNEED, start, end - start)
+    else:
+      for pos in range(start, end, PAGE_BYTES):
+        self.mm[pos]
+
+  def iter_rulesets(self, start: int = 0, stop: int | None = None) -> Iterator[Tuple[int, memoryview]]:
+    """Yield (ruleset_index, line) for the non-empty, non-comment lines in [start, stop),
+      while the next region of the file is prefetched in the background.
+    """
+    stop = len(self) if stop is None else min(stop, len(self))
+    region_end = 0
+    for idx in range(start, stop):
+      line_start = int(self.offsets[idx])
+      if line_start >= region_end:
+        region_end = line_start + self.region_bytes
+        self.prefetcher.submit(self.prefetch, region_end, min(region_end + self.region_bytes, self.size))
+      line = self[idx]
+      if not line or line[0] == ord('#'):
+        continue
+      yield idx, line
+
+  def close(self):
+    """Unmap the file. Lines returned earlier must not be used afterwards."""
+    self.prefetcher.shutdown(wait=True)
+    self.view.release()
+    if self.mm is not None:
+      try:
+        self.mm.close()
+      except BufferError:
+        # Some lines are still referenced; the mapping is released together with the last of them
+        pass
+      self.mm = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
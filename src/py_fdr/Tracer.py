@@ -0,0 +1,84 @@
+import collections
+import os
+
+from typing import List
+
+# Trace levels: a tracer records the events at or below its level
+TRACE_OFF = 0
+TRACE_INFO = 1   # one event per compile or scan call
+TRACE_DEBUG = 2  # per-pattern and per-candidate events: mask bits, candidates, confirmed matches
+TRACE_STEP = 3   # per-byte events of the register simulation: super-characters, masks, st-mask
+DEFAULT_CAPACITY = 1 << 16
+
+
+class Tracer:
+  """
+    Leveled, sampled tracing into an in-memory ring buffer that is flushed to a log file.
+
+    Call sites ask once per unit of work (a scan or a compile) whether to trace it, and guard
+    every event with that answer, so a disabled tracer formats nothing:
+
+        traced = tracer is not None and tracer.sample(TRACE_DEBUG)
+        ...
+        if traced:
+          tracer.emit(f"Found a match ending at {pos}", indent=2)
+
+    `sample` applies the sampling rate: only that share of the units of work is traced, spread
+    evenly. With a log file, a full buffer is flushed to it, so the file gets every event. Without
+    one, the ring buffer keeps the last `capacity` events; older ones are dropped and counted.
+  """
+  def __init__(self, level: int = TRACE_OFF, sample_rate: float = 1.0, capacity: int = DEFAULT_CAPACITY, log_file: str | None = None):
+    """
+      Args:
+          level (int): Highest level recorded, TRACE_OFF to TRACE_STEP.
+          sample_rate (float): Share of the units of work that are traced, in (0, 1].
+          capacity (int): Number of events the ring buffer holds.
+          log_file (str): File that `flush` appends the events to.
+    """
+    if not 0.0 < sample_rate <= 1.0:
+      raise ValueError('Sample rate must be in (0, 1], got {}'.format(sample_rate))
+    self.level = level
+    self.sample_rate = sample_rate
+    self.log_file = log_file
+    self.buffer = collections.deque(maxlen=capacity)
+    self.dropped = 0
+    self.credit = 0.0
+
+  def enabled(self, level: int) -> bool:
+    return TRACE_OFF < level <= self.level
+
+  def sample(self, level: int) -> bool:
+    """Whether to trace the next unit of work at `level`: the level is enabled and the unit
+    falls in the sample."""
+    if not self.enabled(level):
+      return False
+    self.credit += self.sample_rate
+    if self.credit < 1.0:
+      return False
+    self.credit -= 1.0
+    return True
+
+  def emit(self, *args, indent: int = 0):
+    """Record one event, its arguments joined by spaces like `print`. Only call it behind a
+    `sample` or `enabled` check."""
+    if len(self.buffer) == self.buffer.maxlen:
+      if self.log_file:
+        self.flush()
+      else:
+        self.dropped += 1
+    self.buffer.append(' ' * indent + ' '.join(str(a) for a in args))
+
+  def records(self) -> List[str]:
+    """The buffered events, oldest first."""
+    return list(self.buffer)
+
+  def flush(self):
+    """Append the buffered events to the log file (if any) and empty the buffer."""
+    if self.log_file and self.buffer:
+      dirn = os.path.dirname(self.log_file)
+      if dirn:
+        os.makedirs(dirn, exist_ok=True)
+      with open(self.log_file, 'a', encoding='utf-8') as fh:
+        for message in self.buffer:
+          fh.write(message + '\n')
+    self.buffer.clear()
@@ -12,6 +12,7 @@ if src_path not in sys.path:
     sys.path.insert(0, src_path)
 
 from py_fdr.main import load_patterns, scan_rulesets_file, FDRCompiler, FDR
+from py_fdr.CompileCache import CompileCache
 import os
 import importlib.machinery
 import importlib.util
@@ -68,6 +69,9 @@ def main():
 
     random.seed(1234)
 
+    # Repeated runs draw the same samples, so their engines come from the compile cache
+    cache = CompileCache()
+
     for idx, n in enumerate(pattern_counts, start=1):
         try:
             if use_universe:
@@ -88,11 +92,11 @@ def main():
 
             # compile
             compiler = FDRCompiler(sample)
-            compiler.compile(strategy=1)
+            compiler.compile(strategy=1, cache=cache)
             engine = FDR(compiler)
 
             # scan all rulesets (no max_tests)
-            results, total_matches, total_bytes = scan_rulesets_file(str(rulesets_path), engine, sample, max_tests=0)
+            results, total_matches, total_bytes = scan_rulesets_file(str(rulesets_path), engine, sample, max_tests=0, batch_size=64)
 
             times = [r['time_ms'] for r in results] if results else [0.0]
             avg_time = statistics.mean(times)
@@ -108,9 +112,9 @@ def main():
 
             # save patterns used for this run
             patterns_file_path = out_base / f'patterns_length_{n}.txt'
-            with patterns_file_path.open('w', encoding='utf-8') as pf:
-                for p in sample:
-                    pf.write(p + '\n')
+            with patterns_file_path.open('wb') as pf:
+                for p in compiler.patterns:
+                    pf.write(p + b'\n')
                     
             # write results in the requested single-file form
             results_path = out_base / f'results_length_{n}.txt'
@@ -140,6 +144,7 @@ def main():
                 writer.writerow([n, 'ERROR', 'ERROR', 'ERROR'])
 
     print('Experiment finished')
+    print('Compile cache:', cache.stats())
 
 
 if __name__ == '__main__':
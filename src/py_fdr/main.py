@@ -10,60 +10,71 @@ import sys
 import time
 from typing import List, Tuple
 
-from .FDRCompiler import FDRCompiler
-from .FDR import FDR
-
-
-def load_patterns(path: str, max_patterns: int = 0) -> List[str]:
-	pats: List[str] = []
-	with open(path, 'r', encoding='utf-8') as fh:
-		for line in fh:
-			line = line.rstrip('\n')
-			if not line or line.startswith('#'):
-				continue
-			pats.append(line)
-			if max_patterns and len(pats) >= max_patterns:
-				break
-	return pats
-
-
-def scan_rulesets_file(filepath: str, fdr_engine: FDR, patterns: List[str], max_tests: int = 0):
+from .Autotuner import Autotuner
+from .CompileCache import DEFAULT_CACHE_DIR, CompileCache
+from .FDRCompiler import KEY_BYTES, FDRCompiler
+from .FDR import FDR, scan_batch
+from .Profiler import Profiler
+from .RulesetReader import RulesetReader
+from .utils import load_patterns
+
+
+def scan_rulesets_file(filepath: str, fdr_engine: FDR, patterns: List[bytes], max_tests: int = 0, vectorized: bool = True, batch_size: int = 0):
+	"""Scan every ruleset line of `filepath`.
+	With `batch_size` > 1 (NumPy kernel only), lines are scanned `batch_size` at a time
+	with `FDR.exec_many`, and each line's time_ms is its share of the batch time.
+	"""
 	results = []
+	scan = fdr_engine.exec_vectorized if vectorized else fdr_engine.exec
+	batched = vectorized and batch_size > 1
+	batch = []
 	total_matches = 0
 	total_bytes = 0
 
-	processed = 0
-	with open(filepath, 'r', encoding='utf-8') as fh:
-		for idx, raw in enumerate(fh):
-			line = raw.rstrip('\n')
-			if not line or line.startswith('#'):
-				continue
+	def flush():
+		nonlocal total_matches
+		try:
+			batch_results = scan_batch(fdr_engine, batch)
+		except Exception:
+			print(f"ERROR while processing ruleset indices {batch[0][0]}..{batch[-1][0]}", file=sys.stderr)
+			raise
+		results.extend(batch_results)
+		total_matches += sum(len(r['matches']) for r in batch_results)
+		batch.clear()
 
+	processed = 0
+	with RulesetReader(filepath) as reader:
+		for idx, line in reader.iter_rulesets():
 			# Count this as a processed testcase
 			processed += 1
 
 			total_bytes += len(line)
 
-			try:
-				start = time.perf_counter()
-				matches = fdr_engine.exec(line)
-				end = time.perf_counter()
-			except Exception as e:
-				# Print the testcase that caused the error and re-raise
-				print(f"ERROR while processing ruleset index {idx}: {line}", file=sys.stderr)
-				raise
+			if batched:
+				batch.append((idx, line))
+				if len(batch) >= batch_size:
+					flush()
+			else:
+				try:
+					start = time.perf_counter()
+					matches = scan(line)
+					end = time.perf_counter()
+				except Exception as e:
+					# Print the testcase that caused the error and re-raise
+					print(f"ERROR while processing ruleset index {idx}: {bytes(line)}", file=sys.stderr)
+					raise
 
-			time_ms = (end - start) * 1000.0
+				time_ms = (end - start) * 1000.0
 
-			# matches returned as list of (start_pos, pattern_index)
-			matches = matches or []
+				# matches returned as list of (start_byte_offset, pattern_index)
+				matches = matches or []
 
-			# sort by start position then pattern id
-			matches.sort()
+				# sort by start position then pattern id
+				matches.sort()
 
-			results.append({'ruleset_index': idx, 'matches': matches, 'time_ms': time_ms})
+				results.append({'ruleset_index': idx, 'matches': matches, 'time_ms': time_ms})
 
-			total_matches += len(matches)
+				total_matches += len(matches)
 
 			if (processed) % 100 == 0:
 				print(f"  Scanned {processed} rulesets...")
@@ -72,11 +83,17 @@ def scan_rulesets_file(filepath: str, fdr_engine: FDR, patterns: List[str], max_
 				print(f"  Reached requested --test_num={max_tests}; stopping.")
 				break
 
+		# The last, partial batch holds lines of the mapping, so it is scanned before the reader
+		# closes, and no line stays referenced when it does
+		if batch:
+			flush()
+		line = None
+
 	print(f"  Total rulesets scanned: {len(results)}")
 	return results, total_matches, total_bytes
 
 
-def write_outputs(output_dir: str, patterns_file: str, rulesets_file: str, patterns: List[str], results: List[dict]):
+def write_outputs(output_dir: str, patterns_file: str, rulesets_file: str, patterns: List[bytes], results: List[dict]):
 	os.makedirs(output_dir, exist_ok=True)
 
 	metadata_path = os.path.join(output_dir, 'metadata.txt')
@@ -122,6 +139,14 @@ def main(argv: List[str]):
 	parser.add_argument('--rulesets', required=True, help='Rulesets file')
 	parser.add_argument('--out', required=True, help='Output directory for results')
 	parser.add_argument('--test_num', type=int, default=0, help='Maximum number of tests to run (0 = all)')
+	parser.add_argument('--batch_size', type=int, default=0, help='Scan this many rulesets per exec_many call (0 = one at a time)')
+	parser.add_argument('--engine', help='Compiled engine file: loaded if it exists, otherwise written after compiling')
+	parser.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, help='Compile cache directory')
+	parser.add_argument('--no_cache', action='store_true', help='Always compile, bypassing the compile cache')
+	parser.add_argument('--autotune', type=int, default=0, help='Pick domain_bits and bucket strategy by timing candidates on this many rulesets (0 = off)')
+	parser.add_argument('--simulate', action='store_true', help='Use the step-by-step register simulation instead of the NumPy kernel')
+	parser.add_argument('--profile', action='store_true', help='Time every scan phase and count bucket triggers and confirm hits')
+	parser.add_argument('--estimate', action='store_true', help='Print the estimated native FDR cost of the scan on every architecture')
 
 	args = parser.parse_args(argv)
 
@@ -140,31 +165,51 @@ def main(argv: List[str]):
 
 	print(f'Loaded {len(pattern_strings)} patterns')
 
-	# Filter patterns to <= 8 bytes
-	valid_patterns = [p for p in pattern_strings if len(p) <= 8]
-	filtered_count = len(pattern_strings) - len(valid_patterns)
-	if filtered_count > 0:
-		print(f'Filtered out {filtered_count} patterns exceeding 8-byte limit')
-	print(f'Using {len(valid_patterns)} valid patterns')
-
-	if not valid_patterns:
-		print('ERROR: No valid patterns within 8-byte limit!', file=sys.stderr)
-		return 1
+	# Literals longer than 8 bytes are prefiltered on their last 8 bytes and verified in the confirm stage
+	valid_patterns = pattern_strings
+	long_count = sum(1 for p in valid_patterns if len(p) > KEY_BYTES)
+	if long_count > 0:
+		print(f'{long_count} patterns exceed {KEY_BYTES} bytes and are confirmed in full')
+	print(f'Using {len(valid_patterns)} patterns')
 
-	# Compile
-	print('\nCompiling FDR engine...')
+	# Compile, or load a previously compiled engine
 	compile_start = time.perf_counter()
-	compiler = FDRCompiler(valid_patterns)
-	compiler.compile(strategy=1)
-	fdr_engine = FDR(compiler)
+	if args.engine and os.path.exists(args.engine):
+		print('\nLoading FDR engine from:', args.engine)
+		compiler = FDRCompiler.load(args.engine)
+		# Match indices refer to the patterns the engine was compiled with
+		valid_patterns = compiler.patterns
+	elif args.autotune:
+		print(f'\nAutotuning FDR engine on {args.autotune} rulesets...')
+		with RulesetReader(rulesets_file) as reader:
+			sample = [bytes(line) for _, line in zip(range(args.autotune), (line for _, line in reader.iter_rulesets()))]
+		tuner = Autotuner()
+		compiler = tuner.tune(valid_patterns, sample)
+		for row in tuner.results:
+			print(f"  domain_bits={row['domain_bits']:2d} strategy={row['strategy']} scan {row['scan_ms']:8.2f} ms, confirm rate {row['confirm_rate']:.4f}, false positives {row['false_positive_rate']:.2%}{'  <- chosen' if row is tuner.best else ''}")
+		os.makedirs(output_dir, exist_ok=True)
+		tuner.write(os.path.join(output_dir, 'autotune.txt'))
+		if args.engine:
+			compiler.save(args.engine)
+	else:
+		print('\nCompiling FDR engine...')
+		cache = None if args.no_cache else CompileCache(args.cache_dir)
+		compiler = FDRCompiler(valid_patterns)
+		compiler.compile(strategy=1, cache=cache)
+		if cache is not None:
+			stats = cache.stats()
+			print(f"Compile cache: {'hit' if stats['hits'] else 'miss'} ({stats['entries']} entries, {stats['bytes'] / 1024.0 / 1024.0:.2f} MB in {args.cache_dir})")
+		if args.engine:
+			compiler.save(args.engine)
+	fdr_engine = FDR(compiler, profiler=Profiler() if args.profile else None)
 	compile_end = time.perf_counter()
 	compile_time_ms = (compile_end - compile_start) * 1000.0
-	print(f'SUCCESS: FDR engine compiled in {int(compile_time_ms)} ms\n')
+	print(f'SUCCESS: FDR engine ready in {int(compile_time_ms)} ms\n')
 
 	# Scan rulesets
 	print('Scanning rulesets from:', rulesets_file)
 	scan_start = time.perf_counter()
-	results, total_matches, total_bytes = scan_rulesets_file(rulesets_file, fdr_engine, valid_patterns, max_tests=args.test_num)
+	results, total_matches, total_bytes = scan_rulesets_file(rulesets_file, fdr_engine, valid_patterns, max_tests=args.test_num, vectorized=not args.simulate, batch_size=args.batch_size)
 	scan_end = time.perf_counter()
 	scan_time_ms = (scan_end - scan_start) * 1000.0
 
@@ -183,6 +228,16 @@ def main(argv: List[str]):
 	if scan_time_ms > 0:
 		throughput = (total_bytes / 1024.0 / 1024.0) / (scan_time_ms / 1000.0)
 		print('  Throughput:           ', f"{throughput:.2f} MB/s")
+	if fdr_engine.profiler is not None:
+		print('\nScan profile:')
+		for line in fdr_engine.profiler.report():
+			print(line)
+
+	# Native throughput predicted from the instruction counts of the scan (see CPU.COST_TABLES)
+	if args.estimate:
+		print('\nEstimated native FDR cost:')
+		for arch, est in fdr_engine.cpu.estimate().items():
+			print(f"  {arch:<11} {est['cycles_per_byte']:6.2f} cycles/byte, ~{est['throughput_mb_s']:.0f} MB/s at 3 GHz")
 
 	# Top matched patterns
 	if all_matches:
@@ -195,7 +250,7 @@ def main(argv: List[str]):
 		sorted_patterns.sort(reverse=True)
 
 		for i, (count, pid) in enumerate(sorted_patterns[:10]):
-			print(f"  [{pid}] \"{valid_patterns[pid]}\" - {count} matches")
+			print(f"  [{pid}] \"{valid_patterns[pid].decode('utf-8', 'backslashreplace')}\" - {count} matches")
 
 	# Write outputs
 	print('\nWriting output files to:', output_dir)
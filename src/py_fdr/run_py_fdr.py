@@ -1,25 +1,26 @@
 #!/usr/bin/env python3
-"""Runner: build SimpleFDR from dataset/100_short_patterns.txt, run it
-against each line in dataset/rulesets.txt, and write results to
-output/py_fdr_100_short_patterns/results.txt
+"""Runner: compile dataset/100_short_patterns.txt, run the register
+simulation (`FDR.exec`) against each line in dataset/rulesets.txt, and write
+results to output/py_fdr_100_short_patterns/results.txt
 
-This script intentionally uses the simplified `SimpleFDR` in
-`fdr.py` to produce lightweight, comparable output for analysis.
+The simulation counts its register operations on `engine.cpu`; the estimated
+native cycles per byte of every architecture are printed at the end.
 """
 import os
 import time
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[2]
-# Ensure this script's directory is on sys.path so local module imports work
+# Ensure the package's parent directory is on sys.path so that py_fdr imports work
 import sys
-SCRIPT_DIR = Path(__file__).resolve().parent
-if str(SCRIPT_DIR) not in sys.path:
-    sys.path.insert(0, str(SCRIPT_DIR))
+SRC_DIR = Path(__file__).resolve().parents[1]
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
 DATASET_DIR = ROOT / 'dataset'
 OUTPUT_DIR = ROOT / 'output' / 'py_fdr_100_short_patterns'
 
-from FDR import FDR
+from py_fdr.FDR import FDR
+from py_fdr.FDRCompiler import FDRCompiler
 
 
 def load_patterns(path: Path):
@@ -47,31 +48,21 @@ def main():
     pats = load_patterns(DATASET_DIR / '100_short_patterns.txt')
     rules = load_rulesets(DATASET_DIR / 'rulesets.txt')
 
-    engine = FDR(pats, stride=1, domain_bits=9)
+    compiler = FDRCompiler(pats)
+    compiler.compile(domain_bits=9, stride=1)
+    engine = FDR(compiler)
 
     results = []
 
     for idx, rule in enumerate(rules):
-        hits = []
-
-        def cb(offset, pid):
-            hits.append((offset, pid))
-
         t0 = time.perf_counter()
-        engine.exec(rule, cb)
+        hits = engine.exec(rule)
         t1 = time.perf_counter()
 
         dt_ms = (t1 - t0) * 1000.0
         if idx % 100 == 0:
-            # print progress and a short cpu counter snapshot (if available)
-            counters = getattr(engine, 'cpu', None)
-            counters_str = ''
-            if counters is not None:
-                counters_str = f" cpu_counters={counters.counters}"
-            print(f"Processed ruleset {idx}, matches={len(hits)}, time={dt_ms:.6f} ms{counters_str}")
-            # reset engine counters between large batches
-            if hasattr(engine, 'reset_counters'):
-                engine.reset_counters()
+            # print progress and a short cpu counter snapshot (running totals)
+            print(f"Processed ruleset {idx}, matches={len(hits)}, time={dt_ms:.6f} ms cpu_counters={engine.cpu.counters}")
         results.append((idx, hits, dt_ms))
 
     out_file = OUTPUT_DIR / 'results.txt'
@@ -85,9 +76,11 @@ def main():
         fh.write(f'patterns:{len(pats)}\n')
         fh.write(f'rulesets:{len(rules)}\n')
         fh.write(f'engine_stride:{engine.stride}\n')
-        fh.write(f'engine_domain_bits:{engine.domain}\n')
+        fh.write(f'engine_domain_bits:{engine.domain_bits}\n')
 
     print('Wrote', out_file)
+    for arch, est in engine.cpu.estimate().items():
+        print(f"{arch}: {est['cycles_per_byte']:.2f} cycles/byte, ~{est['throughput_mb_s']:.0f} MB/s")
 
 
 if __name__ == '__main__':
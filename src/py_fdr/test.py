@@ -0,0 +1,803 @@
+import contextlib
+import io
+import mmap
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from .Autotuner import Autotuner
+from .CompileCache import CompileCache
+from .CPU import COST_TABLES, CPU
+from .FDR import FDR, findFloods
+from .FDRCompiler import ENGINE_HEADER, FDRCompiler, getSuperChar, getSuperCharIndex, patternSuperChars
+from .FDRStream import FDRStream
+from .main import main, scan_rulesets_file
+from .Profiler import Profiler
+from .Register import Register, to_bool_list
+from .RulesetReader import RulesetReader
+from .Tracer import TRACE_DEBUG, TRACE_STEP, Tracer
+from .utils import decode_content, load_patterns
+
+
+def bools(reg):
+  """The bits of a register, most significant first, as `to_bool_list` gives them."""
+  return [bit == '1' for bit in reg.getValue()]
+
+
+def referenceMasks(buckets, domain_bits):
+  """The mask table as the dict of 128-bit Registers keyed by super-character bit strings
+  that buildMasks used to return, one Register per possible super-character.
+  """
+  masks = {}
+  for c in range(2 ** domain_bits):
+    masks[Register(c, domain_bits).getValue()] = Register(-1, 128) >> 64
+  for b in range(8):
+    if not buckets[b]:
+      continue
+    for mask in masks.values():
+      for p in range(len(buckets[b][0]), 8):
+        mask.setBit(False, p, b)
+  for b in range(8):
+    for pat in buckets[b]:
+      for pos in range(len(pat)):
+        masks[getSuperChar(pat, pos, domain_bits)].setBit(False, len(pat) - pos - 1, b)
+  return masks
+
+
+def scan(patterns, text, strategy):
+  compiler = FDRCompiler(patterns)
+  compiler.compile(strategy=strategy)
+  engine = FDR(compiler)
+  matches = sorted((pos, engine.patterns[idx]) for pos, idx in engine.exec_vectorized(text))
+  return matches, engine.confirm_rate()
+
+
+class TestRegister(unittest.TestCase):
+  def setUp(self):
+    rng = random.Random(3)
+    self.values = [0, 1, 1 << 63, 1 << 64, (1 << 128) - 1] + [rng.getrandbits(128) for _ in range(50)]
+
+  def test_shifts_cross_the_64_bit_boundary(self):
+    self.assertEqual((Register(1 << 63) << 1).getValue(type='int'), 1 << 64)
+    self.assertEqual((Register(1 << 64) >> 1).getValue(type='int'), 1 << 63)
+    self.assertEqual((Register(0xff << 60) << 8).getValue(type='int'), 0xff << 68)
+    # Bits shifted past bit 127 are dropped
+    self.assertEqual((Register(1 << 127) << 1).getValue(type='int'), 0)
+    self.assertEqual((Register(-1) << 64).getValue(type='int'), ((1 << 64) - 1) << 64)
+    for value in self.values:
+      for count in (0, 1, 8, 63, 64, 65, 127, 128):
+        self.assertEqual(bools(Register(value) << count), to_bool_list(value)[count:] + [False] * count)
+        self.assertEqual((Register(value) >> count).getValue(type='int'), value >> count)
+
+  def test_bitwise_ops_match_bool_lists(self):
+    cpu = CPU()
+    for a, b in zip(self.values, self.values[1:] + self.values[:1]):
+      bits_a, bits_b = to_bool_list(a), to_bool_list(b)
+      ra, rb = Register(a), Register(b)
+      self.assertEqual(bools(ra & rb), [x and y for x, y in zip(bits_a, bits_b)])
+      self.assertEqual(bools(ra | rb), [x or y for x, y in zip(bits_a, bits_b)])
+      self.assertEqual(bools(~ra), [not x for x in bits_a])
+      self.assertEqual(bools(cpu.andn(ra, rb)), [not x and y for x, y in zip(bits_a, bits_b)])
+    self.assertEqual(cpu.counters['andn'], len(self.values))
+
+  def test_bits_and_rendering(self):
+    reg = Register(0)
+    reg.setBit(True, 0, 3)
+    reg.setBit(True, 8, 0)
+    reg.setBit(True, 15, 7)
+    self.assertEqual(reg.getValue(type='int'), (1 << 3) | (1 << 64) | (1 << 127))
+    self.assertTrue(reg.getBit(8, 0))
+    self.assertFalse(reg.getBit(8, 1))
+    reg.setBit(False, 8, 0)
+    self.assertEqual(reg.getValue(type='int'), (1 << 3) | (1 << 127))
+    with self.assertRaises(ValueError):
+      reg.setBit(True, 16, 0)
+    self.assertEqual(str(Register(0x1ff, 12)), '0001 11111111')
+    self.assertEqual(Register('0x0102', 16).getValue(), '0000000100000010')
+    self.assertEqual((Register(-1) + 1).getValue(type='int'), 0)
+    self.assertEqual((Register(0) - 1).getValue(type='int'), (1 << 128) - 1)
+
+
+class TestMaskTable(unittest.TestCase):
+  def setUp(self):
+    rng = random.Random(29)
+    self.patterns = sorted({''.join(rng.choices('abcdefgh', k=rng.randint(1, 8))) for _ in range(60)})
+
+  def test_dense_table_matches_register_dict(self):
+    for domain_bits in (8, 9, 11):
+      compiler = FDRCompiler(self.patterns)
+      compiler.compile(domain_bits=domain_bits, strategy=1)
+      self.assertEqual(compiler.masks.dtype, np.uint64)
+      self.assertEqual(compiler.masks.shape, (2 ** domain_bits,))
+      reference = referenceMasks(compiler.buckets, domain_bits)
+      for c in range(2 ** domain_bits):
+        self.assertEqual(int(compiler.masks[c]), reference[Register(c, domain_bits).getValue()].getValue(type='int'))
+
+  def test_super_char_index(self):
+    for pat in self.patterns:
+      for pos in range(len(pat)):
+        index = getSuperCharIndex(pat, pos, 11)
+        self.assertLess(index, 2 ** 11)
+        self.assertEqual(getSuperChar(pat, pos, 11), format(index, '011b'))
+    with self.assertRaises(ValueError):
+      getSuperCharIndex('abc', 3, 9)
+
+  def test_scans_agree(self):
+    compiler = FDRCompiler(self.patterns)
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    text = 'abcdefgh' * 3 + 'hgfedcba' + 'aabbccdd'
+    self.assertEqual(sorted(engine.exec(text)), sorted(engine.exec_vectorized(text)))
+
+
+class TestVectorizedCompile(unittest.TestCase):
+  def setUp(self):
+    rng = random.Random(31)
+    self.patterns = sorted({''.join(rng.choices('abcd', k=8)) for _ in range(3000)})
+    self.mixed = sorted({''.join(rng.choices('abcdefgh', k=rng.randint(1, 8))) for _ in range(3000)})
+
+  def loopMasks(self, buckets, domain_bits):
+    """The table built one pattern character at a time."""
+    all_ones = (1 << 64) - 1
+    for b in range(8):
+      if buckets[b]:
+        for p in range(len(buckets[b][0]), 8):
+          all_ones &= ~(1 << (p * 8 + b))
+    masks = [all_ones] * (1 << domain_bits)
+    for b in range(8):
+      for pat in buckets[b]:
+        for pos in range(len(pat)):
+          masks[getSuperCharIndex(pat, pos, domain_bits)] &= ~(1 << ((len(pat) - pos - 1) * 8 + b))
+    return masks
+
+  def test_masks_match_character_loop(self):
+    for patterns, strategy in ((self.patterns, 1), (self.patterns, 2), (self.mixed, 1)):
+      for domain_bits in (9, 13):
+        compiler = FDRCompiler(patterns)
+        compiler.compile(domain_bits=domain_bits, strategy=strategy)
+        self.assertEqual(compiler.masks.tolist(), self.loopMasks(compiler.buckets, domain_bits))
+
+  def test_pattern_super_chars(self):
+    pats = [pat.encode() for pat in self.mixed]
+    super_chars, pos_from_right, valid = patternSuperChars(pats, 12)
+    for i, pat in enumerate(self.mixed):
+      self.assertEqual(valid[i].sum(), len(pat))
+      for pos in range(len(pat)):
+        self.assertEqual(super_chars[i, pos], getSuperCharIndex(pat, pos, 12))
+        self.assertEqual(pos_from_right[i, pos], len(pat) - pos - 1)
+
+
+class TestExecMany(unittest.TestCase):
+  def test_no_match_across_payloads(self):
+    patterns = ['abcd', 'cdef', 'xy', 'abcdefgh', 'ghij']
+    # 'abcd' and 'abcdefgh' straddle the first two payloads, 'xy' the next two
+    texts = ['zzab', 'cdefghijkl', 'x', '', 'y', '', 'zabcdz', 'ghijklm', '']
+    for strategy in (1, 3):
+      compiler = FDRCompiler(patterns)
+      compiler.compile(strategy=strategy)
+      engine = FDR(compiler)
+      expected = sorted((p, pos, idx) for p, text in enumerate(texts) for pos, idx in engine.exec(text))
+      self.assertEqual(sorted(engine.exec_many(texts)), expected)
+    self.assertEqual(expected, [(1, 0, 1), (1, 4, 4), (6, 1, 0), (7, 0, 4)])
+    self.assertEqual(engine.exec_many(['', '']), [])
+    self.assertEqual(engine.exec_many([]), [])
+
+  def test_random_payloads_match_exec(self):
+    rng = random.Random(23)
+    patterns = sorted({''.join(rng.choices('ab', k=rng.randint(1, 8))) for _ in range(40)})
+    texts = [''.join(rng.choices('ab', k=rng.choice([0, 0, 1, 3, 7, 8, 9, 17]))) for _ in range(200)]
+    for strategy in (1, 3):
+      compiler = FDRCompiler(patterns)
+      compiler.compile(strategy=strategy)
+      engine = FDR(compiler)
+      expected = sorted((p, pos, idx) for p, text in enumerate(texts) for pos, idx in engine.exec(text))
+      self.assertEqual(sorted(engine.exec_many(texts)), expected)
+
+
+class TestBytesInput(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_decode_content(self):
+    self.assertEqual(decode_content(b'GET|0d 0a|'), b'GET\r\n')
+    self.assertEqual(decode_content(b'|41 42|C|0D0a|D'), b'ABC\r\nD')
+    self.assertEqual(decode_content(b'| 90  90 |'), b'\x90\x90')
+    # No well-formed hex block: kept as is
+    for content in (b'a|b', b'|zz|', b'||', b'|4|', b'plain'):
+      self.assertEqual(decode_content(content), content)
+
+  def test_load_patterns(self):
+    path = os.path.join(self.tmp.name, 'patterns.txt')
+    with open(path, 'wb') as fh:
+      fh.write(b'# comment\r\nGET|20|/\r\n\ncaf\xc3\xa9\n|00 ff|\n')
+    self.assertEqual(load_patterns(path), [b'GET /', 'café'.encode(), b'\x00\xff'])
+    self.assertEqual(load_patterns(path, max_patterns=1), [b'GET /'])
+
+  def test_non_ascii_offsets_are_bytes(self):
+    compiler = FDRCompiler(['café', 'ü', b'\x90\x90\x90', b'\xff'])
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    text = 'über café'.encode() + b'\x90' * 4 + b'\xff'
+    expected = [(0, 1), (6, 0), (11, 2), (12, 2), (15, 3)]
+    self.assertEqual(sorted(engine.exec(text)), expected)
+    self.assertEqual(sorted(engine.exec_vectorized(text)), expected)
+    self.assertEqual(engine.exec_many(['über café', b'\x90\x90\x90']), [(0, 0, 1), (0, 6, 0), (1, 0, 2)])
+
+  def test_buffer_types(self):
+    compiler = FDRCompiler([b'abc', b'\x00\x01', b'xyzw'])
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    data = b'--abc\x00\x01xyzw--abcxyzw\x00\x01'
+    expected = engine.exec_many([data, data[2:9]])
+    self.assertEqual([m[0] for m in expected].count(0), 6)
+    view = memoryview(bytearray(data))
+    path = os.path.join(self.tmp.name, 'payload.bin')
+    with open(path, 'wb') as fh:
+      fh.write(data)
+    with open(path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+      for buffer in (bytearray(data), view, mm):
+        self.assertEqual(engine.exec_many([buffer, view[2:9]]), expected)
+        self.assertEqual(sorted(engine.exec(buffer)), sorted(engine.exec(data)))
+        self.assertEqual(sorted(engine.exec_vectorized(buffer)), sorted(engine.exec(data)))
+
+
+class TestRulesetReader(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmp.name, 'rulesets.txt')
+    self.write(b'GET /index\n# comment\nabc xyz\r\n\nlast line')
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def write(self, data, mtime=None):
+    with open(self.path, 'wb') as fh:
+      fh.write(data)
+    if mtime is not None:
+      os.utime(self.path, (mtime, mtime))
+
+  def lines(self):
+    with RulesetReader(self.path) as reader:
+      return [(idx, bytes(line)) for idx, line in reader.iter_rulesets()]
+
+  def test_index_is_saved_and_reused(self):
+    self.assertEqual(self.lines(), [(0, b'GET /index'), (2, b'abc xyz'), (4, b'last line')])
+    self.assertTrue(os.path.exists(self.path + '.lines.npy'))
+    index_mtime = os.path.getmtime(self.path + '.lines.npy')
+    self.assertEqual(self.lines()[-1], (4, b'last line'))
+    self.assertEqual(os.path.getmtime(self.path + '.lines.npy'), index_mtime)
+
+  def test_stale_index_is_rebuilt(self):
+    self.write(b'one\ntwo\n', mtime=1000)
+    self.assertEqual(self.lines(), [(0, b'one'), (1, b'two')])
+    # Newer rulesets file
+    self.write(b'one\ntwo\nthree\n', mtime=2000)
+    self.assertEqual(self.lines(), [(0, b'one'), (1, b'two'), (2, b'three')])
+    # Same modification time as the index, but a different size
+    index_mtime = os.path.getmtime(self.path + '.lines.npy')
+    self.write(b'uno\n', mtime=index_mtime)
+    self.assertEqual(self.lines(), [(0, b'uno')])
+
+  def test_random_access(self):
+    with RulesetReader(self.path, region_bytes=4) as reader:
+      self.assertEqual(len(reader), 5)
+      self.assertEqual(bytes(reader[2]), b'abc xyz')
+      self.assertEqual(bytes(reader[-1]), b'last line')
+      self.assertEqual(bytes(reader[3]), b'')
+      self.assertEqual([idx for idx, _ in reader.iter_rulesets(1, 4)], [2])
+      with self.assertRaises(IndexError):
+        reader[5]
+
+  def test_empty_file(self):
+    self.write(b'')
+    with RulesetReader(self.path) as reader:
+      self.assertEqual(len(reader), 0)
+      self.assertEqual(list(reader.iter_rulesets()), [])
+
+  def test_batched_scan_includes_last_partial_batch(self):
+    self.write(b''.join(b'abc %d xyz\n' % i for i in range(7)))
+    compiler = FDRCompiler(['abc', 'xyz', '3'])
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    with contextlib.redirect_stdout(io.StringIO()):
+      single = scan_rulesets_file(self.path, engine, compiler.patterns)
+      batched = scan_rulesets_file(self.path, engine, compiler.patterns, batch_size=4)
+    self.assertEqual([r['ruleset_index'] for r in batched[0]], list(range(7)))
+    self.assertEqual([r['matches'] for r in batched[0]], [r['matches'] for r in single[0]])
+    self.assertEqual(batched[1:], single[1:])
+
+
+
+class TestStream(unittest.TestCase):
+  def test_matches_across_chunk_boundaries(self):
+    rng = random.Random(17)
+    # Short keys, 8-byte keys and long literals confirmed past KEY_BYTES
+    patterns = ['ab', 'bca', 'abcdabcd', 'cabbacab', 'abcabcabcabcab', 'bbbbccccaaaabbbbcccc', 'a']
+    text = ''.join(rng.choices('abc', k=400)) + 'bbbbccccaaaabbbbcccc' + 'abcabcabcabcab'
+    compiler = FDRCompiler(patterns)
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    expected = sorted(engine.exec_vectorized(text))
+    self.assertTrue(any(len(engine.patterns[idx]) > 8 for _, idx in expected))
+    data = text.encode()
+    for chunk_size in (1, 2, 7):
+      stream = FDRStream(engine)
+      self.assertEqual(stream.history_bytes, 19)
+      found = []
+      for start in range(0, len(data), chunk_size):
+        found.extend(stream.feed(data[start : start + chunk_size]))
+      self.assertEqual(sorted(found), expected)
+      stream.reset()
+      self.assertEqual(sorted(stream.feed_file(io.BytesIO(data), chunk_size=chunk_size)), expected)
+
+  def test_pattern_added_mid_stream(self):
+    compiler = FDRCompiler(['ab', 'cd'])
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    stream = FDRStream(engine)
+    self.assertEqual(stream.feed(b'xxab'), [(2, 0)])
+    self.assertEqual(stream.history_bytes, 1)
+    # A literal longer than KEY_BYTES, split over the next boundary
+    idx, = engine.add_patterns(['longliteralpattern'])
+    self.assertEqual(stream.feed(b'cd-longlit'), [(4, 1)])
+    self.assertEqual(stream.history_bytes, 17)
+    self.assertEqual(stream.feed(b'eralpatternab'), [(7, idx), (25, 0)])
+
+
+class TestSaveLoad(unittest.TestCase):
+  def setUp(self):
+    rng = random.Random(19)
+    self.patterns = sorted({''.join(rng.choices('abcdefAB', k=rng.randint(1, 8))) for _ in range(150)})
+    self.texts = [''.join(rng.choices('abcdefABCD', k=rng.randint(0, 300))) for _ in range(20)]
+    self.tmp = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmp.name, 'engine.fdr')
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_round_trip(self):
+    long_enough = [pat for pat in self.patterns if len(pat) >= 4]
+    configs = [(self.patterns, False, 9, 1, 1), (self.patterns, True, 11, 1, 3), (long_enough, False, 11, 2, 1), (long_enough, True, 11, 4, 3)]
+    for patterns, caseless, domain_bits, stride, strategy in configs:
+      nocase = [caseless and i % 3 == 0 for i in range(len(patterns))]
+      compiler = FDRCompiler(patterns, nocase=nocase)
+      compiler.compile(domain_bits=domain_bits, strategy=strategy, stride=stride)
+      expected = FDR(compiler).exec_many(self.texts)
+      compiler.save(self.path)
+      loaded = FDRCompiler.load(self.path)
+      self.assertEqual((loaded.stride, loaded.strategy, loaded.domain_bits), (stride, strategy, domain_bits))
+      self.assertEqual(loaded.patterns, compiler.patterns)
+      self.assertEqual(loaded.nocase, compiler.nocase)
+      self.assertEqual(loaded.buckets, compiler.buckets)
+      self.assertTrue((loaded.masks == compiler.masks).all())
+      self.assertEqual(FDR(loaded).exec_many(self.texts), expected)
+      self.assertEqual(FDR(loaded).exec(self.texts[0]), FDR(compiler).exec(self.texts[0]))
+
+  def test_bad_files_are_rejected(self):
+    compiler = FDRCompiler(self.patterns)
+    compiler.compile(domain_bits=9, strategy=1)
+    compiler.save(self.path)
+    with open(self.path, 'rb') as fh:
+      data = fh.read()
+    fields = list(ENGINE_HEADER.unpack_from(data, 0))
+    fields[1] = 99
+    bad_files = [ENGINE_HEADER.pack(*fields) + data[ENGINE_HEADER.size:], b'NOTFDR\x00\x00' + data[8:], data[:10]]
+    for bad in bad_files:
+      with open(self.path, 'wb') as fh:
+        fh.write(bad)
+      with self.assertRaises(ValueError):
+        FDRCompiler.load(self.path)
+
+
+class TestCompileCache(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.patterns = ['abcd', 'bcde', 'xyz', 'hello']
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_miss_then_hit(self):
+    cache = CompileCache(self.tmp.name)
+    first = FDRCompiler(self.patterns)
+    first.compile(domain_bits=10, strategy=1, cache=cache)
+    second = FDRCompiler(self.patterns)
+    second.compile(domain_bits=10, strategy=1, cache=cache)
+    stats = cache.stats()
+    self.assertEqual((stats['misses'], stats['hits'], stats['entries']), (1, 1, 1))
+    self.assertTrue((second.masks == first.masks).all())
+    self.assertEqual(FDR(second).exec('say hello, abcde xyz'), FDR(first).exec('say hello, abcde xyz'))
+    self.assertEqual([name for name in os.listdir(self.tmp.name) if not name.endswith('.fdr')], [])
+
+  def test_key_depends_on_every_parameter(self):
+    cache = CompileCache(self.tmp.name)
+    patterns = [pat.encode() for pat in self.patterns]
+    base = cache.key(patterns, 10, 1)
+    variants = [
+      cache.key(patterns[::-1], 10, 1),
+      cache.key(patterns[:3] + [b'hellp'], 10, 1),
+      cache.key(patterns, 11, 1),
+      cache.key(patterns, 10, 2),
+      cache.key(patterns, 10, 1, 2),
+      cache.key(patterns, 10, 1, 1, [True, False, False, False]),
+    ]
+    self.assertEqual(cache.key(patterns, 10, 1), base)
+    self.assertEqual(len(set(variants + [base])), len(variants) + 1)
+
+  def test_lru_eviction(self):
+    compilers = []
+    for i in range(3):
+      compiler = FDRCompiler(self.patterns[i:])
+      compiler.compile(domain_bits=10, strategy=1)
+      compilers.append(compiler)
+    cache = CompileCache(self.tmp.name, max_bytes=0)
+    keys = [cache.key(c.patterns, 10, 1) for c in compilers]
+    for i in range(2):
+      cache.put(keys[i], compilers[i])
+      os.utime(cache.path(keys[i]), (1000 + i, 1000 + i))
+    # A hit makes the oldest entry the most recently used one
+    self.assertIsNotNone(cache.get(keys[0]))
+    cache.max_bytes = os.path.getsize(cache.path(keys[0])) + os.path.getsize(cache.path(keys[1]))
+    cache.put(keys[2], compilers[2])
+    self.assertTrue(os.path.exists(cache.path(keys[0])))
+    self.assertFalse(os.path.exists(cache.path(keys[1])))
+    self.assertTrue(os.path.exists(cache.path(keys[2])))
+    self.assertEqual(cache.stats()['evictions'], 1)
+
+
+class TestIncremental(unittest.TestCase):
+  def setUp(self):
+    rng = random.Random(13)
+    self.base = sorted({''.join(rng.choices('abcdef', k=rng.randint(2, 12))) for _ in range(200)})
+    self.extra = sorted({''.join(rng.choices('abcdef', k=rng.randint(2, 12))) for _ in range(50)} - set(self.base))
+    self.texts = [''.join(rng.choices('abcdefg', k=rng.randint(0, 300))) for _ in range(30)]
+
+  def found(self, engine):
+    """Matches as (payload, position, pattern) so engines with different indices compare."""
+    return sorted((p, pos, engine.patterns[idx]) for p, pos, idx in engine.exec_many(self.texts))
+
+  def fresh(self, patterns, strategy):
+    compiler = FDRCompiler(patterns)
+    compiler.compile(strategy=strategy)
+    return self.found(FDR(compiler))
+
+  def test_add_matches_fresh_compile(self):
+    for strategy in (1, 3):
+      compiler = FDRCompiler(self.base)
+      compiler.compile(strategy=strategy)
+      engine = FDR(compiler)
+      indices = engine.add_patterns(self.extra)
+      self.assertEqual(indices, list(range(len(self.base), len(self.base) + len(self.extra))))
+      self.assertEqual(self.found(engine), self.fresh(self.base + self.extra, strategy))
+      for text in self.texts[:5]:
+        self.assertEqual(sorted(engine.exec(text)), sorted(engine.exec_vectorized(text)))
+
+  def test_remove_matches_fresh_compile(self):
+    for strategy in (1, 3):
+      compiler = FDRCompiler(self.base + self.extra)
+      compiler.compile(strategy=strategy)
+      engine = FDR(compiler)
+      removed = engine.remove_patterns(self.extra + ['not there'])
+      self.assertEqual(sorted(removed), list(range(len(self.base), len(self.base) + len(self.extra))))
+      self.assertEqual(self.found(engine), self.fresh(self.base, strategy))
+
+  def test_failed_add_leaves_engine_unchanged(self):
+    # Strategy 2 fills every bucket with 4-byte keys, so no bucket can take a 2-byte pattern
+    compiler = FDRCompiler(['abcd', 'bcde', 'cdef', 'defa', 'efab', 'fabc', 'acbd', 'bdac', 'cadb'])
+    compiler.compile(strategy=2)
+    engine = FDR(compiler)
+    before = (list(engine.patterns), engine.masks.copy(), engine.init_state, self.found(engine))
+    with self.assertRaises(ValueError):
+      engine.add_patterns(['dcba', 'ab'])
+    with self.assertRaises(ValueError):
+      engine.add_patterns(['dcba', ''])
+    self.assertEqual(engine.patterns, before[0])
+    self.assertTrue((engine.masks == before[1]).all())
+    self.assertEqual(engine.init_state, before[2])
+    self.assertEqual(self.found(engine), before[3])
+
+  def test_needs_rebalance(self):
+    compiler = FDRCompiler(self.base)
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    self.assertFalse(engine.needs_rebalance())
+    engine.remove_patterns(self.base[:len(self.base) // 5])
+    self.assertFalse(engine.needs_rebalance())
+    engine.remove_patterns(self.base[:len(self.base) // 2])
+    self.assertTrue(engine.needs_rebalance())
+
+
+class TestNocase(unittest.TestCase):
+  def test_nocase_flags_per_pattern(self):
+    patterns = ['GET /', 'Host:', 'user-agent: curl', 'x-API']
+    text = 'get / HTTP/1.1\r\nHOST: a\r\nUser-Agent: CURL\r\nx-api x-API'
+    compiler = FDRCompiler(patterns, nocase=[True, True, True, False])
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    expected = [(0, 0), (16, 1), (25, 2), (49, 3)]
+    self.assertEqual(sorted(engine.exec_vectorized(text)), expected)
+    self.assertEqual(sorted(engine.exec(text)), expected)
+    # One bucket entry per caseless pattern, not one per case variant
+    self.assertEqual(sum(map(len, compiler.buckets)), len(patterns))
+
+  def test_nocase_incremental(self):
+    compiler = FDRCompiler(['abc'])
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    engine.add_patterns(['xyz', 'Abc'], nocase=True)
+    self.assertEqual(sorted(engine.exec_vectorized('ABC abc XyZ')), [(0, 2), (4, 0), (4, 2), (8, 1)])
+    engine.remove_patterns(['Abc'])
+    self.assertEqual(sorted(engine.exec_vectorized('ABC abc XyZ')), [(4, 0), (8, 1)])
+
+
+class TestStride(unittest.TestCase):
+  def test_strides_match_stride_1(self):
+    rng = random.Random(11)
+    patterns = sorted({''.join(rng.choices('abcdef', k=rng.randint(4, 12))) for _ in range(300)})
+    texts = [''.join(rng.choices('abcdef', k=rng.randint(0, 300))) for _ in range(40)]
+    expected = None
+    for stride in (1, 2, 4):
+      for domain_bits in (9, 13):
+        compiler = FDRCompiler(patterns)
+        compiler.compile(domain_bits=domain_bits, strategy=3, stride=stride)
+        matches = sorted(FDR(compiler).exec_many(texts))
+        expected = expected or matches
+        self.assertEqual(matches, expected)
+
+  def test_stride_needs_long_enough_patterns(self):
+    with self.assertRaises(ValueError):
+      FDRCompiler(['abc', 'abcdef']).compile(stride=4)
+
+
+class TestBucketStrategies(unittest.TestCase):
+  def setUp(self):
+    rng = random.Random(7)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz'
+    self.patterns = sorted({''.join(rng.choices(alphabet, k=6)) for _ in range(400)})
+    self.mixed = self.patterns[:200] + sorted({''.join(rng.choices(alphabet, k=rng.randint(2, 8))) for _ in range(200)})
+    self.text = ''.join(rng.choices(alphabet, k=5000))
+    # Workload of experiments/generate_tests.py: 8-character patterns over 'abcd'
+    self.abcd_patterns = sorted({''.join(rng.choices('abcd', k=8)) for _ in range(2000)})
+    self.abcd_text = ''.join(rng.choices('abcd', k=5000))
+
+  def test_cost_model_lowers_confirm_rate(self):
+    by_length, rate_1 = scan(self.patterns, self.text, 1)
+    uniform, rate_2 = scan(self.patterns, self.text, 2)
+    by_cost, rate_3 = scan(self.patterns, self.text, 3)
+    self.assertEqual(by_cost, by_length)
+    self.assertEqual(by_cost, uniform)
+    compiler = FDRCompiler(self.patterns)
+    compiler.compile(strategy=3)
+    self.assertEqual([len(bucket) for bucket in compiler.buckets], [50] * 8)
+    # Each part holds one suffix range, so the 8 parts together fire far less than one bucket
+    self.assertLess(rate_3, rate_1 / 3)
+    self.assertLess(rate_3, rate_2 / 3)
+
+  def test_cost_model_mixed_lengths(self):
+    by_length, rate_1 = scan(self.mixed, self.text, 1)
+    by_cost, rate_3 = scan(self.mixed, self.text, 3)
+    self.assertEqual(by_cost, by_length)
+    self.assertLess(rate_3, rate_1)
+
+  def test_cost_model_small_alphabet(self):
+    # Any part of these patterns fires at almost every byte, and a confirm lookup costs the
+    # same whatever the bucket holds, so the cost model keeps them in one bucket
+    by_length, rate_1 = scan(self.abcd_patterns, self.abcd_text, 1)
+    uniform, rate_2 = scan(self.abcd_patterns, self.abcd_text, 2)
+    by_cost, rate_3 = scan(self.abcd_patterns, self.abcd_text, 3)
+    self.assertEqual(by_cost, by_length)
+    self.assertEqual(by_cost, uniform)
+    compiler = FDRCompiler(self.abcd_patterns)
+    compiler.compile(strategy=3)
+    self.assertEqual([len(bucket) for bucket in compiler.buckets], [len(self.abcd_patterns)] + [0] * 7)
+    self.assertEqual(rate_3, rate_1)
+    self.assertLess(rate_3, rate_2 / 4)
+
+  def test_cost_model_buckets_keep_one_length(self):
+    compiler = FDRCompiler(self.mixed)
+    compiler.compile(strategy=3)
+    for bucket in compiler.buckets:
+      self.assertLessEqual(len({len(pat) for pat in bucket}), 1)
+    self.assertEqual(sorted(pat for bucket in compiler.buckets for pat in bucket), sorted(pat.encode() for pat in self.mixed))
+
+
+class TestConfirm(unittest.TestCase):
+  def test_duplicates_report_every_index(self):
+    compiler = FDRCompiler(['abc', 'xy', 'abc', 'hello'])
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    self.assertEqual(sorted(engine.exec_vectorized('abc hello xy')), [(0, 0), (0, 2), (4, 3), (10, 1)])
+    self.assertEqual(sorted(engine.exec('abc hello xy')), [(0, 0), (0, 2), (4, 3), (10, 1)])
+
+  def test_long_literals(self):
+    patterns = ['GET /index.html', 'index.html', 'html', 'x' * 12]
+    text = 'GET /index.html?q=' + 'x' * 13
+    compiler = FDRCompiler(patterns)
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    expected = [(0, 0), (5, 1), (11, 2), (18, 3), (19, 3)]
+    self.assertEqual(sorted(engine.exec_vectorized(text)), expected)
+    self.assertEqual(sorted(engine.exec(text)), expected)
+    # The key alone must not be reported
+    self.assertEqual(sorted(engine.exec_vectorized('/index.html')), [(1, 1), (7, 2)])
+
+
+class TestAutotuner(unittest.TestCase):
+  def setUp(self):
+    rng = random.Random(37)
+    self.patterns = sorted({''.join(rng.choices('abcdef', k=rng.randint(2, 10))) for _ in range(100)})
+    self.sample = [''.join(rng.choices('abcdefgh', k=rng.randint(0, 200))).encode() for _ in range(30)]
+    self.tmp = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_fastest_row_is_chosen(self):
+    # Fixed scan times: domain_bits=10 with strategy 3 is the fastest candidate
+    class FixedTimes(Autotuner):
+      def measure(self, fdr_engine, sample, sample_bytes):
+        row = Autotuner.measure(self, fdr_engine, sample, sample_bytes)
+        row['scan_ms'] = abs(fdr_engine.domain_bits - 10) + (0 if fdr_engine.compiler.strategy == 3 else 0.5)
+        return row
+
+    tuner = FixedTimes(domain_bits=(9, 10, 11), strategies=(1, 2, 3), repeats=1)
+    compiler = tuner.tune(self.patterns, self.sample)
+    # Strategy 2 needs keys of one length
+    self.assertEqual([(row['strategy'], row['domain_bits']) for row in tuner.results], [(s, d) for s in (1, 3) for d in (9, 10, 11)])
+    self.assertEqual((tuner.best['strategy'], tuner.best['domain_bits']), (3, 10))
+    self.assertEqual((compiler.strategy, compiler.domain_bits), (3, 10))
+
+  def test_measured_results(self):
+    tuner = Autotuner(domain_bits=(8, 12), strategies=(1, 3), repeats=2)
+    compiler = tuner.tune(self.patterns, self.sample)
+    self.assertEqual(len(tuner.results), 4)
+    self.assertIs(tuner.best, min(tuner.results, key=lambda row: row['scan_ms']))
+    self.assertEqual((compiler.strategy, compiler.domain_bits), (tuner.best['strategy'], tuner.best['domain_bits']))
+    expected = FDR(compiler).exec_many(self.sample)
+    for row in tuner.results:
+      self.assertEqual(row['matches'], len(expected))
+      self.assertGreaterEqual(row['false_positive_rate'], 0.0)
+      self.assertLessEqual(row['false_positive_rate'], 1.0)
+
+    path = os.path.join(self.tmp.name, 'autotune.txt')
+    tuner.write(path)
+    with open(path, encoding='utf-8') as fh:
+      lines = [line.rstrip('\n').split('\t') for line in fh]
+    self.assertEqual(lines[0][0], 'domain_bits')
+    self.assertEqual(lines[0][-1], 'chosen')
+    self.assertEqual(len(lines), 5)
+    chosen = [line for line in lines[1:] if line[-1] == '*']
+    self.assertEqual(len(chosen), 1)
+    self.assertEqual((int(chosen[0][0]), int(chosen[0][1])), (tuner.best['domain_bits'], tuner.best['strategy']))
+
+  def test_main_writes_autotune_table(self):
+    patterns_file = os.path.join(self.tmp.name, 'patterns.txt')
+    rulesets_file = os.path.join(self.tmp.name, 'rulesets.txt')
+    with open(patterns_file, 'w', encoding='utf-8') as fh:
+      fh.write('\n'.join(self.patterns) + '\n')
+    with open(rulesets_file, 'wb') as fh:
+      fh.write(b'\n'.join(self.sample) + b'\n')
+    out_dir = os.path.join(self.tmp.name, 'out')
+    with contextlib.redirect_stdout(io.StringIO()):
+      main(['--patterns', patterns_file, '--rulesets', rulesets_file, '--out', out_dir, '--autotune', '10', '--no_cache'])
+    with open(os.path.join(out_dir, 'autotune.txt'), encoding='utf-8') as fh:
+      rows = fh.read().splitlines()[1:]
+    self.assertTrue(rows)
+    self.assertEqual(sum(row.endswith('\t*') for row in rows), 1)
+
+
+class TestFloods(unittest.TestCase):
+  def test_floods_match_full_scan(self):
+    patterns = ['aaaa', 'abab', 'ba', 'GET /', 'abcdabcd', 'bcda', 'a' * 20 + 'b']
+    texts = ['a' * 3000, 'ab' * 2000, 'x' + 'abcd' * 800, 'GET /' + 'a' * 1000 + 'b' + 'ba' * 600, 'short']
+    compiler = FDRCompiler(patterns)
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    flooded = sorted(engine.exec_many(texts))
+    self.assertGreater(engine.flood_bytes, 0)
+    engine.flood_detection = False
+    self.assertEqual(flooded, sorted(engine.exec_many(texts)))
+
+  def test_autotuner_metrics_exclude_floods(self):
+    autotuner = Autotuner(domain_bits=(9,), strategies=(1,), repeats=1)
+    compiler = autotuner.tune(['aaaa', 'GET'], [b'a' * 5000])
+    row = autotuner.best
+    engine = FDR(compiler)
+    engine.exec_many([b'a' * 5000])
+    self.assertEqual(row['matches'], 4997)
+    self.assertGreater(engine.flood_matches, 0)
+    self.assertEqual(engine.scanned_bytes + engine.flood_bytes, 5000)
+    self.assertEqual(row['confirm_rate'], engine.candidates / engine.scanned_bytes)
+    self.assertGreaterEqual(row['false_positive_rate'], 0.0)
+    self.assertLessEqual(row['false_positive_rate'], 1.0)
+    self.assertLessEqual(engine.confirmed, engine.candidates)
+
+  def test_find_floods(self):
+    text = b'x' * 300 + b'ab' * 300 + b'yz'
+    self.assertEqual(findFloods(text, 1), [(0, 300, 1), (300, 900, 2)])
+    self.assertEqual(findFloods(text, 400), [(300, 900, 2)])
+
+
+class TestTracer(unittest.TestCase):
+  def test_levels_and_sampling(self):
+    compiler = FDRCompiler(['abc', 'xy'])
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    tracer = Tracer(level=TRACE_DEBUG, sample_rate=0.5)
+    for _ in range(4):
+      self.assertEqual(sorted(engine.exec('abc xy', tracer=tracer)), [(0, 0), (4, 1)])
+    # Two of the four scans are traced, with a candidate and a match event per match
+    self.assertEqual(len(tracer.records()), 8)
+    self.assertFalse(any('st-mask' in record for record in tracer.records()))
+
+  def test_ring_buffer(self):
+    tracer = Tracer(level=TRACE_STEP, capacity=3)
+    for i in range(5):
+      tracer.emit('event', i)
+    self.assertEqual(tracer.records(), ['event 2', 'event 3', 'event 4'])
+    self.assertEqual(tracer.dropped, 2)
+    tracer.flush()
+    self.assertEqual(tracer.records(), [])
+
+  def test_log_file_keeps_every_event(self):
+    compiler = FDRCompiler(['abc', 'xy'])
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    text = 'abc xy ' * 20
+    with tempfile.TemporaryDirectory() as tmp:
+      full = Tracer(level=TRACE_STEP)
+      engine.exec(text, tracer=full)
+      log_file = os.path.join(tmp, 'scan.log')
+      tracer = Tracer(level=TRACE_STEP, capacity=16, log_file=log_file)
+      engine.exec(text, tracer=tracer)
+      tracer.flush()
+      with open(log_file, encoding='utf-8') as fh:
+        self.assertEqual(fh.read(), ''.join(record + '\n' for record in full.records()))
+      self.assertEqual(tracer.dropped, 0)
+
+
+class TestCPU(unittest.TestCase):
+  def test_kernel_counts_match_simulation(self):
+    rng = random.Random(5)
+    patterns = sorted({''.join(rng.choices('abcdef', k=rng.randint(1, 10))) for _ in range(100)})
+    texts = [''.join(rng.choices('abcdefxyz', k=rng.randint(0, 200))) for _ in range(20)]
+    compiler = FDRCompiler(patterns)
+    compiler.compile(strategy=1)
+    engine = FDR(compiler)
+    for text in texts:
+      engine.exec(text)
+    simulated = dict(engine.cpu.counters)
+    engine.reset_counters()
+    engine.exec_many(texts)
+    self.assertEqual(engine.cpu.counters, simulated)
+    estimate = engine.cpu.estimate()
+    self.assertEqual(set(estimate), set(COST_TABLES))
+    self.assertGreater(estimate['AVX2']['cycles_per_byte'], estimate['AVX512VBMI']['cycles_per_byte'])
+
+
+class TestProfiler(unittest.TestCase):
+  def test_bucket_counts_match_simulation(self):
+    patterns = ['abc', 'xy', 'hello', 'he']
+    texts = ['abc hello xy', 'hexyab', 'abd hx']
+    profiles = []
+    for vectorized in (False, True):
+      compiler = FDRCompiler(patterns)
+      compiler.compile(strategy=1)
+      engine = FDR(compiler, profiler=Profiler())
+      for text in texts:
+        (engine.exec_vectorized if vectorized else engine.exec)(text)
+      profiles.append(engine.profiler)
+    self.assertEqual(profiles[0].triggers, profiles[1].triggers)
+    self.assertEqual(profiles[0].hits, profiles[1].hits)
+    self.assertEqual(sum(profiles[1].hits), 6)
+    self.assertEqual(profiles[1].calls['confirm'], len(texts))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,5 +1,9 @@
 import os
 
+from typing import List
+
+from common.snort_content import decode_content
+
 
 LOG_FILE = None
 
@@ -12,9 +16,8 @@ def setLogFile(path: str):
 
 def LOG(*args, indent: int = 0, log_file: str, **kwargs):
     """
-    Conditional logger. When debug is enabled via `set_debug(True)`,
-    this prints to stdout and optionally appends the same output to
-    `log_file` if provided.
+    Append a message to `log_file`; does nothing without one. For events inside
+    scan or compile loops use a `Tracer`, which formats nothing when disabled.
 
     Parameters:
     - args: values to print (same semantics as built-in `print`).
@@ -23,6 +26,8 @@ def LOG(*args, indent: int = 0, log_file: str, **kwargs):
     - kwargs: forwarded to `print` for stdout (e.g., end, sep).
     """
 
+    if not log_file:
+        return
     prefix = ' ' * indent
     # Build the message string similar to print()
     sep = kwargs.pop('sep', ' ')
@@ -42,3 +47,36 @@ def LOG(*args, indent: int = 0, log_file: str, **kwargs):
         # Avoid raising from logger
         pass
 
+
+
+
+def as_bytes(data):
+    """
+    Return `data` as a byte-addressable buffer without copying it.
+
+    `bytes`, `bytearray` and `mmap` are returned as they are, a `memoryview` is cast
+    to unsigned bytes, and a `str` is encoded to UTF-8 (the only case that copies).
+    Indexing the result gives byte values and `len()` gives its size in bytes.
+    """
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    if isinstance(data, memoryview) and data.format != 'B':
+        return data.cast('B')
+    return data
+
+
+def load_patterns(path: str, max_patterns: int = 0) -> List[bytes]:
+    """
+    Load patterns (one per line, Snort hex blocks allowed) as bytes, skipping blank
+    lines and `#` comments.
+    """
+    pats: List[bytes] = []
+    with open(path, 'rb') as fh:
+        for line in fh:
+            line = line.rstrip(b'\r\n')
+            if not line or line.startswith(b'#'):
+                continue
+            pats.append(decode_content(line))
+            if max_patterns and len(pats) >= max_patterns:
+                break
+    return pats
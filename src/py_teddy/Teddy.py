@@ -0,0 +1,74 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from py_fdr.utils import as_bytes
+
+from .TeddyCompiler import TeddyCompiler
+
+
+class Teddy:
+  def __init__(self, teddy_compiler: TeddyCompiler):
+    """Initialize the Teddy engine with compiled literals.
+      Args:
+          teddy_compiler (TeddyCompiler): Compiled buckets and nibble masks.
+    """
+    self.patterns = teddy_compiler.patterns
+    self.n_masks = teddy_compiler.n_masks
+    self.buckets = teddy_compiler.buckets
+    self.lo_masks = teddy_compiler.lo_masks
+    self.hi_masks = teddy_compiler.hi_masks
+    # Confirm tables, one per bucket: literal bytes -> every pattern index with those bytes,
+    # and the literal lengths to try at a candidate end
+    self.confirm = [{} for _ in self.buckets]
+    for b, ids in enumerate(self.buckets):
+      for idx in ids:
+        self.confirm[b].setdefault(self.patterns[idx], []).append(idx)
+    self.lengths = [sorted({len(self.patterns[idx]) for idx in ids}) for ids in self.buckets]
+
+  def exec_vectorized(self, text) -> List[Tuple[int, int]]:
+    """Scan one payload. Same (position, pattern_index) results as `FDR.exec_vectorized`."""
+    return [(start, pat_idx) for _, start, pat_idx in self.exec_many([text])]
+
+  def exec_many(self, texts: List) -> List[Tuple[int, int, int]]:
+    """Scan a list of payloads in one pass over their concatenation.
+      The nibble lookups and the bucket AND run with NumPy over all bytes at once; a match must
+      start inside the payload it ends in.
+      Args:
+          texts (List): Payloads to scan: bytes, bytearray, memoryview, mmap or str (encoded to UTF-8).
+      Returns:
+          List of (payload_index, position, pattern_index), position being relative to the payload.
+    """
+    texts = [as_bytes(text) for text in texts]
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    total = int(lengths.sum())
+    if total == 0:
+      return []
+    text_starts = np.cumsum(lengths) - lengths
+    buffer = texts[0] if len(texts) == 1 else b''.join(texts)
+    codes = np.frombuffer(buffer, dtype=np.uint8)
+    lo = codes & 0xf
+    hi = codes >> 4
+
+    # Bucket bits still possible for a literal ending at each byte: mask i checks the byte i
+    # positions before the end. Bytes before the start of the buffer accept any literal.
+    candidates = self.lo_masks[0][lo] & self.hi_masks[0][hi]
+    for i in range(1, self.n_masks):
+      candidates[i:] &= (self.lo_masks[i][lo] & self.hi_masks[i][hi])[:-i]
+
+    ends = np.flatnonzero(candidates)
+    payloads = np.searchsorted(text_starts, ends, side='right') - 1
+    starts = text_starts.tolist()
+    matches = []
+    for p, end, bits in zip(payloads.tolist(), ends.tolist(), candidates[ends].tolist()):
+      payload_start = starts[p]
+      while bits:
+        b = (bits & -bits).bit_length() - 1
+        bits &= bits - 1
+        for length in self.lengths[b]:
+          start = end + 1 - length
+          if start < payload_start:
+            break
+          for pat_idx in self.confirm[b].get(bytes(buffer[start : end + 1]), ()):
+            matches.append((p, start - payload_start, pat_idx))
+    return matches
@@ -0,0 +1,122 @@
+from typing import List
+
+import numpy as np
+
+from py_fdr.utils import LOG, as_bytes
+
+# Teddy is meant for small literal sets; larger sets belong to FDR
+MAX_LITERALS = 64
+MAX_MASKS = 4
+N_BUCKETS = 8
+
+"""
+  Packs literals into the 8 Teddy buckets and builds the nibble masks.
+"""
+class TeddyCompiler:
+  def __init__(self, patterns):
+    """Initialize the Teddy compiler with literals.
+      Args:
+          patterns (List[bytes | str]): Literals to compile (at most MAX_LITERALS). Any
+            bytes-like pattern is accepted; str patterns are encoded to UTF-8.
+    """
+    self.patterns = [bytes(as_bytes(pat)) for pat in patterns]
+
+  def compile(self, n_masks: int | None = None, log_file: str | None = None):
+    """
+      Compile the literals into buckets and nibble masks.
+        n_masks (int): Number of trailing literal bytes checked by the masks, 1 to 4.
+          Defaults to 3, or the length of the shortest literal if that is smaller.
+    """
+    if not self.patterns:
+      raise ValueError('No literals to compile')
+    if len(self.patterns) > MAX_LITERALS:
+      raise ValueError('Teddy supports up to {} literals, got {}; use FDR'.format(MAX_LITERALS, len(self.patterns)))
+    if any(len(pat) == 0 for pat in self.patterns):
+      raise ValueError('Literals must not be empty')
+    if n_masks is None:
+      n_masks = min(3, min(map(len, self.patterns)))
+    if not 1 <= n_masks <= MAX_MASKS:
+      raise ValueError('Unsupported number of masks: {}'.format(n_masks))
+
+    self.n_masks = n_masks
+    self.buckets = packBuckets(self.patterns, n_masks)
+    self.lo_masks, self.hi_masks = buildNibbleMasks(self.patterns, self.buckets, n_masks)
+
+    LOG("Compiled Teddy with {} literals into {} buckets and {} masks".format(len(self.patterns), sum(1 for bucket in self.buckets if bucket), n_masks), log_file=log_file)
+
+
+def nibbleSets(pat: bytes, n_masks: int) -> List[int]:
+  """
+  The low and high nibble sets of the last `n_masks` bytes of a literal, last byte first, as
+  16-bit sets: [lo_0, hi_0, lo_1, hi_1, ...]. Positions past the start of the literal accept any nibble.
+  """
+  sets = []
+  for i in range(n_masks):
+    if i < len(pat):
+      c = pat[len(pat) - i - 1]
+      sets += [1 << (c & 0xf), 1 << (c >> 4)]
+    else:
+      sets += [0xffff, 0xffff]
+  return sets
+
+def setHeuristic(sets: List[int], n_lits: int) -> int:
+  """
+  Hyperscan's TeddySet heuristic: the chance that the set fires on random input (the product of
+  its nibble set sizes) times a small fixed cost plus the linear confirm over its literals.
+  """
+  probability = 1
+  for nibbles in sets:
+    probability *= bin(nibbles).count('1')
+  return probability * (2 + n_lits)
+
+def packBuckets(patterns: List[bytes], n_masks: int) -> List[List[int]]:
+  """
+  Greedy bucket packing as in Hyperscan's Teddy compiler: every literal starts in a set of its
+  own, and the pair of sets whose merge costs least is merged until at most 8 sets remain; after
+  that, merges are only made while they lower the cost.
+     Returns:
+         List[List[int]]: 8 buckets of pattern indices.
+  """
+  groups = {}
+  for idx, pat in enumerate(patterns):
+    groups.setdefault(tuple(nibbleSets(pat, n_masks)), []).append(idx)
+  # (nibble sets, pattern indices, heuristic) of every set
+  sets = [(list(nibbles), ids, setHeuristic(nibbles, len(ids))) for nibbles, ids in groups.items()]
+
+  while len(sets) > 1:
+    best = None
+    for i in range(len(sets)):
+      for j in range(i + 1, len(sets)):
+        merged = [a | b for a, b in zip(sets[i][0], sets[j][0])]
+        score = setHeuristic(merged, len(sets[i][1]) + len(sets[j][1]))
+        increase = score - sets[i][2] - sets[j][2]
+        if best is None or increase < best[0]:
+          best = (increase, i, j, merged, score)
+    increase, i, j, merged, score = best
+    if len(sets) <= N_BUCKETS and increase >= 0:
+      break
+    sets[i] = (merged, sorted(sets[i][1] + sets[j][1]), score)
+    del sets[j]
+
+  buckets: List[List[int]] = [[] for _ in range(N_BUCKETS)]
+  for b, (_, ids, _) in enumerate(sets):
+    buckets[b] = ids
+  return buckets
+
+def buildNibbleMasks(patterns: List[bytes], buckets: List[List[int]], n_masks: int):
+  """
+  Build the shuffle masks: for mask i (the i-th byte from the end of a literal), `lo_masks[i, n]`
+  and `hi_masks[i, n]` hold the bits of the buckets that accept low / high nibble n there.
+     Returns:
+         (lo_masks, hi_masks): two (n_masks, 16) uint8 arrays.
+  """
+  lo_masks = np.zeros((n_masks, 16), dtype=np.uint8)
+  hi_masks = np.zeros((n_masks, 16), dtype=np.uint8)
+  nibbles = np.arange(16)
+  for b, ids in enumerate(buckets):
+    for idx in ids:
+      sets = nibbleSets(patterns[idx], n_masks)
+      for i in range(n_masks):
+        lo_masks[i, (sets[2 * i] >> nibbles) & 1 == 1] |= np.uint8(1 << b)
+        hi_masks[i, (sets[2 * i + 1] >> nibbles) & 1 == 1] |= np.uint8(1 << b)
+  return lo_masks, hi_masks
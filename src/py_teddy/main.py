@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Python entrypoint for py-teddy runner.
+Accepts the same CLI as `py_fdr.main` and writes `metadata.txt` and
+`results.txt` to the output directory.
+"""
+import argparse
+import sys
+import time
+from typing import List
+
+from py_fdr.main import scan_rulesets_file, write_outputs
+from py_fdr.utils import load_patterns
+
+from .Teddy import Teddy
+from .TeddyCompiler import MAX_LITERALS, TeddyCompiler
+
+
+def main(argv: List[str]):
+	parser = argparse.ArgumentParser(description='py-teddy runner')
+	parser.add_argument('--patterns', required=True, help='Patterns file')
+	parser.add_argument('--rulesets', required=True, help='Rulesets file')
+	parser.add_argument('--out', required=True, help='Output directory for results')
+	parser.add_argument('--test_num', type=int, default=0, help='Maximum number of tests to run (0 = all)')
+	parser.add_argument('--batch_size', type=int, default=64, help='Scan this many rulesets per exec_many call')
+	parser.add_argument('--masks', type=int, default=None, help='Number of trailing literal bytes checked by the nibble masks (1-4)')
+
+	args = parser.parse_args(argv)
+
+	print('=== py-Teddy String Matcher Application ===\n')
+
+	print('Loading patterns from:', args.patterns)
+	patterns = load_patterns(args.patterns)
+	if not patterns:
+		print('ERROR: No patterns loaded!', file=sys.stderr)
+		return 1
+	if len(patterns) > MAX_LITERALS:
+		print(f'ERROR: Teddy supports up to {MAX_LITERALS} literals, got {len(patterns)}; use py_fdr', file=sys.stderr)
+		return 1
+	print(f'Loaded {len(patterns)} patterns')
+
+	print('\nCompiling Teddy engine...')
+	compile_start = time.perf_counter()
+	compiler = TeddyCompiler(patterns)
+	compiler.compile(n_masks=args.masks)
+	teddy_engine = Teddy(compiler)
+	compile_time_ms = (time.perf_counter() - compile_start) * 1000.0
+	print(f'SUCCESS: Teddy engine ready in {int(compile_time_ms)} ms ({compiler.n_masks} masks)\n')
+
+	print('Scanning rulesets from:', args.rulesets)
+	scan_start = time.perf_counter()
+	results, total_matches, total_bytes = scan_rulesets_file(args.rulesets, teddy_engine, patterns, max_tests=args.test_num, batch_size=args.batch_size)
+	scan_time_ms = (time.perf_counter() - scan_start) * 1000.0
+
+	print('\n=== Results ===')
+	print('  Patterns loaded:      ', len(patterns))
+	print('  Total matches found:  ', total_matches)
+	print('  Bytes scanned:        ', total_bytes)
+	print('  Compilation time:     ', f"{int(compile_time_ms)} ms")
+	print('  Scan time:            ', f"{int(scan_time_ms)} ms")
+	if scan_time_ms > 0:
+		throughput = (total_bytes / 1024.0 / 1024.0) / (scan_time_ms / 1000.0)
+		print('  Throughput:           ', f"{throughput:.2f} MB/s")
+
+	print('\nWriting output files to:', args.out)
+	write_outputs(args.out, args.patterns, args.rulesets, patterns, results)
+
+	print('\nSUCCESS!')
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
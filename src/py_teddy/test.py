@@ -0,0 +1,38 @@
+import random
+import unittest
+
+from py_fdr.FDR import FDR
+from py_fdr.FDRCompiler import FDRCompiler
+
+from .Teddy import Teddy
+from .TeddyCompiler import MAX_LITERALS, TeddyCompiler
+
+
+class TestTeddy(unittest.TestCase):
+  def test_same_results_as_fdr(self):
+    rng = random.Random(5)
+    for alphabet in (b'abcd', bytes(range(256))):
+      patterns = [bytes(rng.choices(alphabet, k=rng.randint(1, 12))) for _ in range(30)]
+      patterns += patterns[:2]
+      texts = [bytes(rng.choices(alphabet, k=rng.randint(0, 300))) for _ in range(40)]
+      teddy_compiler = TeddyCompiler(patterns)
+      teddy_compiler.compile()
+      fdr_compiler = FDRCompiler(patterns)
+      fdr_compiler.compile()
+      self.assertEqual(sorted(Teddy(teddy_compiler).exec_many(texts)), sorted(FDR(fdr_compiler).exec_many(texts)))
+
+  def test_masks(self):
+    patterns = ['GET /', 'POST', 'Host:', 'passwd']
+    text = 'POST /x HTTP/1.1 Host: y GET /etc/passwd'
+    for n_masks in (1, 2, 3, 4):
+      compiler = TeddyCompiler(patterns)
+      compiler.compile(n_masks=n_masks)
+      self.assertEqual(sorted(Teddy(compiler).exec_vectorized(text)), [(0, 1), (17, 2), (25, 0), (34, 3)])
+
+  def test_too_many_literals(self):
+    with self.assertRaises(ValueError):
+      TeddyCompiler([str(i) for i in range(MAX_LITERALS + 1)]).compile()
+
+
+if __name__ == '__main__':
+  unittest.main()